@@ -1,11 +1,10 @@
 import statistics
 import numpy as np
-from collections import defaultdict
-from datetime import datetime, timedelta
-from typing import Any, Dict, List, Tuple
+from abc import ABC, abstractmethod
+from datetime import timedelta
+from typing import Any, Dict, List, Sequence, Tuple
 from coverage import load_coverage
 from data_io import write_series_to_json_file
-from github_api_client import convert_str_to_datetime
 from config import (
     MEMBER_COUNT_SIZES,
     SUPPORTED_LANGUAGE_GROUPS,
@@ -20,43 +19,46 @@ from plot import (
     plot_daily_commits_boxplots,
     plot_project_member_counts_histogram
 )
+from timestamps import SECS_PER_DAY
 from projects import (
     Projects,
     get_member_count_sizes_for_projects,
     load_full_projects,
-    load_original_project_members,
+    load_project_member_counts,
     load_projects
 )
 from workflows import (
-    WorkflowRuns,
-    encode_workflow_runs_path,
-    load_workflow_runs,
-    load_workflows
+    WORKFLOW_RUN_CONCLUSION_CODES,
+    WorkflowRunArrays,
+    load_workflow_run_arrays,
+    load_workflows,
+    open_workflow_runs_store
 )
 
 
-TimedeltaList = List[timedelta]
-TimedeltasByProject = Dict[str, TimedeltaList]
+# Durations are int64 arrays of seconds, only converted to timedeltas for display
+DurationsByProject = Dict[str, np.ndarray]
 
 
 def flatten_list(my_list: List[List[Any]]) -> List[Any]:
     return [item for sublist in my_list for item in sublist]
 
 
-def print_timedelta_stats(subject: str, timedeltas: TimedeltaList, language: str = 'All') -> None:
-    timedeltas_in_secs = [td.total_seconds() for td in timedeltas]
-    delta_avg = sum(timedeltas, timedelta(0)) / len(timedeltas)
-    delta_quantile_50 = np.quantile(timedeltas, 0.50)
-    delta_quantile_75 = np.quantile(timedeltas, 0.75)
-    delta_quantile_90 = np.quantile(timedeltas, 0.90)
-    delta_quantile_95 = np.quantile(timedeltas, 0.95)
-    delta_quantile_99 = np.quantile(timedeltas, 0.99)
-    delta_std_dev = np.std(timedeltas_in_secs)
-    print(f"{subject} stats for {language} projects ({len(timedeltas)} timedeltas):")
+def concatenate_arrays(arrays: Sequence[Any]) -> np.ndarray:
+    return np.concatenate(arrays) if len(arrays) > 0 else np.empty(0, dtype=np.int64)
+
+
+def print_timedelta_stats(subject: str, durations: np.ndarray, language: str = 'All') -> None:
+    delta_avg = timedelta(seconds=int(durations.sum())) / len(durations)
+    delta_quantile_50, delta_quantile_75, delta_quantile_90, delta_quantile_95, \
+        delta_quantile_99 = [timedelta(seconds=q) for q in np.quantile(
+            durations, [0.50, 0.75, 0.90, 0.95, 0.99]).tolist()]
+    delta_std_dev = np.std(durations)
+    print(f"{subject} stats for {language} projects ({len(durations)} timedeltas):")
     print(f"\tAverage: {delta_avg}")
     print(f"\tMedian: {delta_quantile_50}")
-    print(f"\tMax: {max(timedeltas)}")
-    print(f"\tStd Dev: {timedelta(seconds=delta_std_dev)}")
+    print(f"\tMax: {timedelta(seconds=int(durations.max()))}")
+    print(f"\tStd Dev: {timedelta(seconds=float(delta_std_dev))}")
     print(f"\t0.75 Quantile: {delta_quantile_75}")
     print(f"\t0.90 Quantile: {delta_quantile_90}")
     print(f"\t0.95 Quantile: {delta_quantile_95}")
@@ -65,49 +67,49 @@ def print_timedelta_stats(subject: str, timedeltas: TimedeltaList, language: str
 
 
 def print_timedelta_stats_for_all_langs(subject: str, unencoded_projects: Projects,
-                                        timedeltas_by_proj: TimedeltasByProject) -> None:
+                                        durations_by_proj: DurationsByProject) -> None:
     # Print stats about all projects in general
     print_timedelta_stats(
         subject,
-        flatten_list(timedeltas_by_proj.values()),
+        concatenate_arrays(list(durations_by_proj.values())),
         'All'
     )
 
     # Print stats for each language groups
     for language_group in SUPPORTED_LANGUAGE_GROUPS:
-        lang_timedeltas = [
-            timedeltas_by_proj[p['id']]
+        lang_durations = [
+            durations_by_proj[p['id']]
             for p in unencoded_projects
             if SUPPORTED_LANGUAGE_GROUPS_MAP[p['language']] == language_group
         ]
-        lang_timedeltas = flatten_list(lang_timedeltas)
-        print_timedelta_stats(subject, lang_timedeltas, language_group)
+        print_timedelta_stats(subject, concatenate_arrays(lang_durations), language_group)
 
 
-def count_projects_exceeding_thresh(timedeltas_by_proj: TimedeltasByProject,
-                                    timedelta_thresh: timedelta) -> None:
+def count_projects_exceeding_thresh(durations_by_proj: DurationsByProject,
+                                    thresh_secs: float) -> None:
     projects_exceeding_thresh = 0
-    for _, deltas in timedeltas_by_proj.items():
-        if any([delta > timedelta_thresh for delta in deltas]):
+    for durations in durations_by_proj.values():
+        if (durations > thresh_secs).any():
             projects_exceeding_thresh += 1
 
-    exceed_ratio = f"{projects_exceeding_thresh}/{len(timedeltas_by_proj)}"
-    exceed_perc = f"({(projects_exceeding_thresh/len(timedeltas_by_proj))*100:.2f}%)"
-    print(f"{exceed_ratio} {exceed_perc} projects have >= 1 builds exceeding {timedelta_thresh}")
+    exceed_ratio = f"{projects_exceeding_thresh}/{len(durations_by_proj)}"
+    exceed_perc = f"({(projects_exceeding_thresh/len(durations_by_proj))*100:.2f}%)"
+    print(
+        f"{exceed_ratio} {exceed_perc} projects have >= 1 builds exceeding {timedelta(seconds=thresh_secs)}")
 
 
-def convert_timedeltas_to_ints(timedelta_list: TimedeltaList,
-                               units: str = 'hours') -> List[int]:
+def convert_durations_to_ints(durations: np.ndarray, units: str = 'hours') -> np.ndarray:
     denom = 1
     if units == 'hours':
         denom = 3600
     if units == 'minutes':
         denom = 60
-    return [td.seconds//denom for td in timedelta_list]
+    # NOTE: Whole days are dropped, as by `timedelta.seconds`
+    return (durations % SECS_PER_DAY) // denom
 
 
 def build_boxplots_by_size_for_langs(unencoded_projects: Projects,
-                                     values_per_proj: Dict[str, List[int]],
+                                     values_per_proj: Dict[str, Sequence[Any]],
                                      boxplotter: BoxplotterSignature,
                                      img_prefix: str) -> None:
     member_count_sizes = get_member_count_sizes_for_projects(
@@ -123,7 +125,7 @@ def build_boxplots_by_size_for_langs(unencoded_projects: Projects,
                     member_count_sizes[p['id']] == size
                 )
             ]
-            data_per_size[size] = flatten_list(projects_for_lang_size)
+            data_per_size[size] = concatenate_arrays(projects_for_lang_size)
 
         # Produce boxplot for this language group / member count size combo
         boxplotter(language_group, data_per_size,
@@ -131,14 +133,14 @@ def build_boxplots_by_size_for_langs(unencoded_projects: Projects,
 
 
 def build_timedelta_boxplots_by_size_for_langs(unencoded_projects: Projects,
-                                               timedeltas_by_proj: TimedeltasByProject,
+                                               durations_by_proj: DurationsByProject,
                                                boxplotter: BoxplotterSignature,
                                                img_prefix: str,
                                                units: str = 'hours') -> None:
     build_boxplots_by_size_for_langs(
         unencoded_projects,
-        {repo_id: convert_timedeltas_to_ints(timedeltas, units)
-         for repo_id, timedeltas in timedeltas_by_proj.items()},
+        {repo_id: convert_durations_to_ints(durations, units)
+         for repo_id, durations in durations_by_proj.items()},
         boxplotter,
         img_prefix)
 
@@ -159,15 +161,12 @@ def analyze_project_member_count(projects_path: str,
                                  project_membership_count_dist_path: str):
     print("[!] Analyzing project member counts")
 
-    # Get the intersection of original project members' projects and specified projects
-    project_members_df = load_original_project_members()
-    projects_df = load_full_projects(projects_path)
-    project_members_df = project_members_df[
-        project_members_df.repo_id.isin(projects_df.repo_id)
+    # Count the number of members associated to each of the specified projects
+    repo_member_counts = load_project_member_counts()
+    projects_df = load_full_projects(projects_path, columns=['repo_id'])
+    repo_member_counts = repo_member_counts[
+        repo_member_counts.index.isin(projects_df.repo_id)
     ]
-
-    # Count the number of members associated to each project
-    repo_member_counts = project_members_df['repo_id'].value_counts()
     print(f"Members per project mean: {repo_member_counts.mean()}")
     print(f"Members per project median: {repo_member_counts.median()}")
     print(f"Members per project std dev: {repo_member_counts.std()}")
@@ -184,109 +183,6 @@ def analyze_project_member_count(projects_path: str,
     print("[!] Done analyzing project member counts")
 
 
-def analyze_commit_frequency(projects_path: str, workflows_path: str,
-                             workflow_runs_prefix: str, daily_commits_img_prefix: str) -> None:
-    """
-    RQ1: How common is running CI in the master branch but with infrequent commits?
-    To answer this RQ, we build a timeline of commits for each project, by extracting
-    the head commit timestamps in all workflow runs. We ignore commits from the oldest
-    and newest dates, since we may not have collected all runs / commits from these days.
-    We calculate the average daily commit rate for each project, then the average daily
-    commit rate across all projects (to use as a threshold for a project being a
-    'frequent committer'). Finally, we output the proportion of frequent vs. infrequent
-    commiting projects, both in numeric and boxplot form.
-
-    """
-    print('[!] Analyzing project commit frequency')
-
-    projects = load_projects(projects_path, False)
-    workflows_dict = load_workflows(workflows_path)
-
-    avg_daily_commits_by_proj = {}
-    valid_repo_id_strs = []
-
-    # Iterate through each workflow for each project
-    for project in projects:
-        repo_id_str = project['id']
-        project_commits = {}
-
-        for workflow_idx_str, _ in workflows_dict[repo_id_str].items():
-            # Get workflow runs
-            workflow_runs_path = encode_workflow_runs_path(
-                workflow_runs_prefix, repo_id_str, workflow_idx_str)
-            workflow_runs = load_workflow_runs(workflow_runs_path)
-
-            # Across all project workflows, map commit id to commit timestamp
-            for run in workflow_runs:
-                if not run or run is None or not isinstance(run, dict):
-                    print(
-                        f"WARNING: Empty run in {workflow_runs_path}, skipping...")
-                elif 'head_commit' in run and isinstance(run['head_commit'], dict) and 'timestamp' in run['head_commit'] and 'id' in run['head_commit']:
-                    project_commits[run['head_commit']
-                                    ['timestamp']] = run['head_commit']['id']
-                else:
-                    print(
-                        f"WARNING: Empty commit in {workflow_runs_path}, skipping...")
-
-        # Get min / max datetime observed across all commits
-        commit_datetimes = [convert_str_to_datetime(
-            t) for t in project_commits.keys()]
-        min_date, max_date = min(commit_datetimes), max(commit_datetimes)
-
-        # We could be missing commits from the oldest / newest observed date, trim these
-        max_valid_date = (max_date - timedelta(days=1)).replace(
-            hour=23, minute=59, second=59, microsecond=999999)
-        min_valid_date = (min_date + timedelta(days=1)).replace(
-            hour=0, minute=0, second=0, microsecond=0)
-
-        # As long as 1 full day's worth of commits were observed, compute daily averages
-        num_full_days = (max_valid_date - min_valid_date +
-                         timedelta(seconds=1)).days
-        if num_full_days >= 1:
-            num_proj_commits_by_valid_date = defaultdict(int)
-            valid_repo_id_strs.append(repo_id_str)
-            for commit_datetime in commit_datetimes:
-                if commit_datetime >= min_valid_date and commit_datetime <= max_valid_date:
-                    commit_date = str(commit_datetime.date())
-                    num_proj_commits_by_valid_date[commit_date] += 1
-
-            # Calculate project average daily commit rate (some days may be ignored)
-            avg_daily_commits_by_proj[repo_id_str] = sum(
-                num_proj_commits_by_valid_date.values()) / num_full_days
-
-    num_valid_proj = len(valid_repo_id_strs)
-    print('Only commits from fully observed dates will be considered')
-    print(
-        f"{num_valid_proj}/{len(projects)} projects have >= 1 full day of commit history")
-
-    # Calculate average daily commit rate across all projects (some projects may be ignored)
-    avg_daily_commit_rate = sum(
-        avg_daily_commits_by_proj.values()) / len(avg_daily_commits_by_proj)
-    print(
-        f"The frequent commit threshold (average daily commit rate) is {avg_daily_commit_rate:.2f}")
-
-    # Sort out frequent vs. infrequent projects by comparing against average daily commit rate
-    valid_project_is_frequent = {
-        repo_id: avg_daily_commits_by_proj[repo_id] >= avg_daily_commit_rate
-        for repo_id in valid_repo_id_strs
-    }
-    num_frequent = len([f for f in valid_project_is_frequent.values() if f])
-    num_infrequent = len(
-        [f for f in valid_project_is_frequent.values() if not f])
-    print(f"{num_frequent}/{num_valid_proj} ({(num_frequent/num_valid_proj)*100:.2f}%) projects commit frequently")
-    print(f"{num_infrequent}/{num_valid_proj} ({(num_infrequent/num_valid_proj)*100:.2f}%) projects commit infrequently")
-
-    # Produce boxplot for each language group, plotting avg # daily commits per member count size
-    build_repo_val_boxplots_by_size_for_langs(
-        projects,
-        avg_daily_commits_by_proj,
-        plot_daily_commits_boxplots,
-        daily_commits_img_prefix
-    )
-
-    print("[!] Done analyzing project commit frequency")
-
-
 def analyze_coverage(coverage_path: str, coverage_boxplot_img_path: str) -> None:
     """
     RQ2: How common is running a build in a software project with poor test coverage?
@@ -330,8 +226,224 @@ def analyze_coverage(coverage_path: str, coverage_boxplot_img_path: str) -> None
     print('[!] Done analyzing project code coverage')
 
 
-def analyze_broken_build_duration(projects_path: str, workflows_path: str,
-                                  workflow_runs_prefix: str, broken_builds_img_prefix: str) -> None:
+class WorkflowRunsAnalysis(ABC):
+    """
+    An analysis of the workflow runs of every project, fed by `analyze_workflow_runs`. Since
+    every analysis needs the same runs, they are loaded once (as arrays, see
+    `load_workflow_run_arrays`), and each project's runs are passed to `consume_project()` of
+    every analysis. Once all projects have been consumed, `report()`
+    prints statistics and renders plots for the analysis.
+    """
+
+    @abstractmethod
+    def consume_project(self, repo_id_str: str,
+                        workflow_run_arrays_by_idx: Dict[str, WorkflowRunArrays]) -> None:
+        pass
+
+    @abstractmethod
+    def report(self, projects: Projects) -> None:
+        pass
+
+
+def analyze_workflow_runs(projects_path: str, workflows_path: str, workflow_runs_prefix: str,
+                          analyses: List[WorkflowRunsAnalysis]) -> None:
+    """
+    Run several analyses of workflow runs in a single pass, loading the runs of each workflow of
+    each project only once, and passing them to every analysis (see `WorkflowRunsAnalysis`).
+    """
+    print(f"[!] Analyzing workflow runs ({len(analyses)} analyses)")
+
+    projects = load_projects(projects_path, False)
+    workflows_dict = load_workflows(workflows_path)
+    store = open_workflow_runs_store(workflow_runs_prefix)
+
+    # Iterate through each workflow for each project
+    for i, project in enumerate(projects):
+        if i % 100 == 0:
+            print(f"Loading workflow runs ({i}/{len(projects)})...")
+        repo_id_str = project['id']
+        workflow_run_arrays_by_idx = {
+            workflow_idx_str: load_workflow_run_arrays(store, repo_id_str, workflow_idx_str)
+            for workflow_idx_str in workflows_dict[repo_id_str].keys()
+        }
+        for analysis in analyses:
+            analysis.consume_project(repo_id_str, workflow_run_arrays_by_idx)
+    store.close()
+
+    for analysis in analyses:
+        analysis.report(projects)
+
+
+def warn_skipped_runs(num_empty: int, num_incomplete: int) -> None:
+    if num_empty > 0:
+        print(f"WARNING: {num_empty} empty runs, skipping...")
+    if num_incomplete > 0:
+        print(f"WARNING: {num_incomplete} incomplete commits, skipping...")
+
+
+def build_workflow_conclusion_arrays(run_arrays: WorkflowRunArrays) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Extract the creation time, head commit timestamp (both in epoch seconds), and conclusion code
+    (see `WORKFLOW_RUN_CONCLUSION_CODES`) of each completed workflow run into arrays, in the order
+    of the runs.
+    """
+    is_empty = run_arrays['is_empty']
+    is_complete = ~is_empty & run_arrays['has_run_timestamps'] & run_arrays['has_commit_timestamp']
+    warn_skipped_runs(int(is_empty.sum()), int((~is_empty & ~is_complete).sum()))
+    is_used = is_complete & run_arrays['is_completed']
+    return (
+        run_arrays['created_at'][is_used],
+        run_arrays['commit_timestamp'][is_used],
+        run_arrays['conclusion_code'][is_used]
+    )
+
+
+def compute_failure_durations(created_at: np.ndarray, commit_timestamps: np.ndarray,
+                              conclusion_codes: np.ndarray) -> np.ndarray:
+    """
+    Compute the duration (in seconds) of each broken build period of a workflow, in chronological
+    order. Runs are ordered by creation time (keeping only the last run created at any given
+    time). A broken build period is a maximal sequence of unsuccessful runs which is both
+    preceded and followed by a successful run, and lasts from the head commit of its first run
+    to the head commit of its last run. Periods that do not last any time are omitted.
+    """
+    if len(created_at) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    # Order runs chronologically, keeping the last of any runs created at the same time
+    order = np.argsort(created_at, kind='stable')
+    sorted_created_at = created_at[order]
+    is_last_at_time = np.append(sorted_created_at[1:] != sorted_created_at[:-1], True)
+    order = order[is_last_at_time]
+    is_success = conclusion_codes[order] == WORKFLOW_RUN_CONCLUSION_CODES['success']
+    commit_timestamps = commit_timestamps[order]
+
+    # Find where each failure period starts (after a success) and ends (before a success), then
+    # pair each start with the first end at or after it (if any, else the period never ended)
+    period_starts = np.flatnonzero(is_success[:-1] & ~is_success[1:]) + 1
+    period_ends = np.flatnonzero(~is_success[:-1] & is_success[1:])
+    end_positions = np.searchsorted(period_ends, period_starts)
+    has_ended = end_positions < len(period_ends)
+    durations = (commit_timestamps[period_ends[end_positions[has_ended]]] -
+                 commit_timestamps[period_starts[has_ended]])
+    return durations[durations > 0]
+
+
+def build_workflow_duration_arrays(run_arrays: WorkflowRunArrays) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Extract the creation time, last update time (both in epoch seconds), and whether it has
+    completed, of each workflow run into arrays, in the order of the runs.
+    """
+    is_empty = run_arrays['is_empty']
+    is_used = ~is_empty & run_arrays['has_run_timestamps']
+    warn_skipped_runs(int(is_empty.sum()), int((~is_empty & ~is_used).sum()))
+    return (
+        run_arrays['created_at'][is_used],
+        run_arrays['updated_at'][is_used],
+        run_arrays['is_completed'][is_used]
+    )
+
+
+def compute_build_durations(created_at: np.ndarray, updated_at: np.ndarray,
+                            is_completed: np.ndarray) -> np.ndarray:
+    """
+    Compute the duration (in seconds) of each completed workflow run, in the order of the runs.
+    Runs that do not last any time are omitted.
+    """
+    durations = updated_at - created_at
+    return durations[is_completed & (durations > 0)]
+
+
+class CommitFrequencyAnalysis(WorkflowRunsAnalysis):
+    """
+    RQ1: How common is running CI in the master branch but with infrequent commits?
+    To answer this RQ, we build a timeline of commits for each project, by extracting
+    the head commit timestamps in all workflow runs. We ignore commits from the oldest
+    and newest dates, since we may not have collected all runs / commits from these days.
+    We calculate the average daily commit rate for each project, then the average daily
+    commit rate across all projects (to use as a threshold for a project being a
+    'frequent committer'). Finally, we output the proportion of frequent vs. infrequent
+    commiting projects, both in numeric and boxplot form.
+    """
+
+    def __init__(self, daily_commits_img_prefix: str):
+        self.daily_commits_img_prefix = daily_commits_img_prefix
+        self.avg_daily_commits_by_proj = {}
+        self.valid_repo_id_strs = []
+
+    def consume_project(self, repo_id_str: str,
+                        workflow_run_arrays_by_idx: Dict[str, WorkflowRunArrays]) -> None:
+        project_commit_timestamps = []
+
+        for workflow_idx_str, run_arrays in workflow_run_arrays_by_idx.items():
+            # Across all project workflows, collect the timestamp of each head commit
+            is_empty = run_arrays['is_empty']
+            has_commit = ~is_empty & run_arrays['has_commit_timestamp']
+            num_empty, num_without_commit = int(is_empty.sum()), int((~is_empty & ~has_commit).sum())
+            if num_empty > 0:
+                print(
+                    f"WARNING: {num_empty} empty runs in repo {repo_id_str} workflow {workflow_idx_str}, skipping...")
+            if num_without_commit > 0:
+                print(
+                    f"WARNING: {num_without_commit} empty commits in repo {repo_id_str} workflow {workflow_idx_str}, skipping...")
+            project_commit_timestamps.append(run_arrays['commit_timestamp'][has_commit])
+
+        # Get min / max (UTC) day observed across all (distinct) commits, as days since epoch
+        commit_days = np.unique(concatenate_arrays(project_commit_timestamps)) // SECS_PER_DAY
+        min_day, max_day = commit_days.min(), commit_days.max()
+
+        # We could be missing commits from the oldest / newest observed day, trim these
+        min_valid_day, max_valid_day = min_day + 1, max_day - 1
+
+        # As long as 1 full day's worth of commits were observed, compute daily averages
+        num_full_days = int(max_valid_day - min_valid_day + 1)
+        if num_full_days >= 1:
+            self.valid_repo_id_strs.append(repo_id_str)
+            num_valid_commits = int(np.count_nonzero(
+                (commit_days >= min_valid_day) & (commit_days <= max_valid_day)))
+
+            # Calculate project average daily commit rate (some days may be ignored)
+            self.avg_daily_commits_by_proj[repo_id_str] = num_valid_commits / num_full_days
+
+    def report(self, projects: Projects) -> None:
+        print('[!] Analyzing project commit frequency')
+
+        avg_daily_commits_by_proj = self.avg_daily_commits_by_proj
+        valid_repo_id_strs = self.valid_repo_id_strs
+        num_valid_proj = len(valid_repo_id_strs)
+        print('Only commits from fully observed dates will be considered')
+        print(
+            f"{num_valid_proj}/{len(projects)} projects have >= 1 full day of commit history")
+
+        # Calculate average daily commit rate across all projects (some projects may be ignored)
+        avg_daily_commit_rate = sum(
+            avg_daily_commits_by_proj.values()) / len(avg_daily_commits_by_proj)
+        print(
+            f"The frequent commit threshold (average daily commit rate) is {avg_daily_commit_rate:.2f}")
+
+        # Sort out frequent vs. infrequent projects by comparing against average daily commit rate
+        valid_project_is_frequent = {
+            repo_id: avg_daily_commits_by_proj[repo_id] >= avg_daily_commit_rate
+            for repo_id in valid_repo_id_strs
+        }
+        num_frequent = len([f for f in valid_project_is_frequent.values() if f])
+        num_infrequent = len(
+            [f for f in valid_project_is_frequent.values() if not f])
+        print(f"{num_frequent}/{num_valid_proj} ({(num_frequent/num_valid_proj)*100:.2f}%) projects commit frequently")
+        print(f"{num_infrequent}/{num_valid_proj} ({(num_infrequent/num_valid_proj)*100:.2f}%) projects commit infrequently")
+
+        # Produce boxplot for each language group, plotting avg # daily commits per member count size
+        build_repo_val_boxplots_by_size_for_langs(
+            projects,
+            avg_daily_commits_by_proj,
+            plot_daily_commits_boxplots,
+            self.daily_commits_img_prefix
+        )
+
+        print("[!] Done analyzing project commit frequency")
+
+
+class BrokenBuildDurationAnalysis(WorkflowRunsAnalysis):
     """
     RQ3: How common is allowing the build to stay broken for long periods?
     To answer this RQ, we first extract the conclusion (eg. success, failure) and
@@ -344,123 +456,54 @@ def analyze_broken_build_duration(projects_path: str, workflows_path: str,
     project size.
     """
 
-    ConclusionsTimeline = List[Tuple[datetime, Dict[str, Any]]]
-
-    def build_workflow_conclusions(workflow_runs: WorkflowRuns) -> ConclusionsTimeline:
-        workflow_conclusions = {}
-        for run in workflow_runs:
-            if not run or run is None or not isinstance(run, dict):
-                print('WARNING: Empty run, skipping...')
-                continue
-
-            depth1_fields = ['status', 'created_at',
-                             'conclusion', 'head_commit']
-            all_fields_exist = all([f in run for f in depth1_fields])
-            all_fields_exist = all_fields_exist and isinstance(
-                run['head_commit'], dict)
-            all_fields_exist = all_fields_exist and 'timestamp' in run['head_commit']
-            if all_fields_exist:
-                if run['status'] == 'completed':
-                    workflow_conclusions[convert_str_to_datetime(run['created_at'])] = {
-                        'conclusion': run['conclusion'],
-                        'commit_timestamp': convert_str_to_datetime(run['head_commit']['timestamp'])
-                    }
-            else:
-                print('WARNING: Incomplete commit, skipping...')
-        return sorted(workflow_conclusions.items(), key=lambda x: x[0], reverse=False)
-
-    def get_workflow_failure_timedeltas(conclusions: ConclusionsTimeline) -> TimedeltaList:
-        fail_start_conclusion, prev_conclusion = None, None
-        first_success_seen = False
-        failure_timedeltas = []
-
-        # Iterate through conclusions (workflow runs) in ascending chronological order
-        for _, conclusion_obj in conclusions:
-            if conclusion_obj['conclusion'] == 'success':
-                first_success_seen = True
-                # Observing success means a failure period may now be concluded
-                # NOTE: We must be sure that a full failure period has come before
-                if fail_start_conclusion is not None and prev_conclusion is not None:
-                    fail_start_datetime = fail_start_conclusion['commit_timestamp']
-                    fail_end_datetime = prev_conclusion['commit_timestamp']
-
-                    # Add timedelta between failure start / end to results list
-                    if fail_start_datetime < fail_end_datetime:
-                        failure_timedeltas.append(
-                            fail_end_datetime - fail_start_datetime)
-                    # else:
-                    #    print(
-                    #        'WARNING: Failure start timestamp >= end timestamp, skipping...')
-
-                    fail_start_conclusion = None
-            else:
-                # Observing failure means a failure period may now be starting
-                # NOTE: We must be sure this is the first failure in its true sequence
-                if fail_start_conclusion is None and first_success_seen:
-                    fail_start_conclusion = conclusion_obj
-
-            prev_conclusion = conclusion_obj
-        return failure_timedeltas
-
-    print('[!] Analyzing broken build duration')
+    def __init__(self, broken_builds_img_prefix: str):
+        self.broken_builds_img_prefix = broken_builds_img_prefix
+        self.failure_durations_by_proj: DurationsByProject = {}
 
-    projects = load_projects(projects_path, False)
-    workflows_dict = load_workflows(workflows_path)
-
-    failure_timedeltas: TimedeltasByProject = {}
+    def consume_project(self, repo_id_str: str,
+                        workflow_run_arrays_by_idx: Dict[str, WorkflowRunArrays]) -> None:
+        project_failure_durations = []
 
-    # Iterate through each workflow for each project
-    for project in projects:
-        repo_id_str = project['id']
-        project_failure_timedeltas = []
+        for run_arrays in workflow_run_arrays_by_idx.values():
+            # Get workflow run timestamps and their success / failure status
+            conclusion_arrays = build_workflow_conclusion_arrays(run_arrays)
 
-        for workflow_idx_str, _ in workflows_dict[repo_id_str].items():
-            # Get workflow runs
-            workflow_runs_path = encode_workflow_runs_path(
-                workflow_runs_prefix, repo_id_str, workflow_idx_str)
-            workflow_runs = load_workflow_runs(workflow_runs_path)
+            # Get a chronological list of broken build (run failure) durations
+            project_failure_durations.append(compute_failure_durations(*conclusion_arrays))
 
-            # Create timeline of workflow run timestamps and their success / failure status
-            ordered_workflow_conclusions = build_workflow_conclusions(
-                workflow_runs)
+        # Aggregate all workflows' failure durations into the project-level failures dict
+        self.failure_durations_by_proj[repo_id_str] = concatenate_arrays(project_failure_durations)
 
-            # Get a chronological list of broken build (run failure) timedeltas
-            workflow_failure_timedeltas = get_workflow_failure_timedeltas(
-                ordered_workflow_conclusions)
+    def report(self, projects: Projects) -> None:
+        print('[!] Analyzing broken build duration')
 
-            # Aggregate timedeltas for this workflow with those from other workflows
-            project_failure_timedeltas.extend(workflow_failure_timedeltas)
+        # Print timedelta stats
+        failure_durations_by_proj = self.failure_durations_by_proj
+        print_timedelta_stats_for_all_langs(
+            'Broken build duration', projects, failure_durations_by_proj)
 
-        # Add all workflows' failure timedeltas to the project-level failures dict
-        failure_timedeltas[repo_id_str] = project_failure_timedeltas
+        # The third quartile of the overall duration of broken builds is the acceptable threshold
+        all_durations = concatenate_arrays(list(failure_durations_by_proj.values()))
+        failure_thresh_secs = float(np.quantile(all_durations, 0.75))
+        print(
+            f"The broken build duration threshold (3rd quartile) is {timedelta(seconds=failure_thresh_secs)}")
 
-    # Print timedelta stats
-    print_timedelta_stats_for_all_langs(
-        'Broken build duration', projects, failure_timedeltas)
+        # Determine how many projects had at least one build (run) that took longer than threshold
+        count_projects_exceeding_thresh(failure_durations_by_proj, failure_thresh_secs)
 
-    # The third quartile of the overall duration of broken builds is the acceptable threshold
-    all_timedeltas = flatten_list(failure_timedeltas.values())
-    failure_thresh = np.quantile(all_timedeltas, 0.75)
-    print(
-        f"The broken build duration threshold (3rd quartile) is {failure_thresh}")
-
-    # Determine how many projects had at least one build (run) that took longer than threshold
-    count_projects_exceeding_thresh(failure_timedeltas, failure_thresh)
-
-    # Produce boxplot for each language group, plotting # days broken per member count size
-    build_timedelta_boxplots_by_size_for_langs(
-        projects,
-        failure_timedeltas,
-        plot_broken_builds_boxplots,
-        broken_builds_img_prefix,
-        'hours'
-    )
+        # Produce boxplot for each language group, plotting # days broken per member count size
+        build_timedelta_boxplots_by_size_for_langs(
+            projects,
+            failure_durations_by_proj,
+            plot_broken_builds_boxplots,
+            self.broken_builds_img_prefix,
+            'hours'
+        )
 
-    print('[!] Done analyzing broken build duration')
+        print('[!] Done analyzing broken build duration')
 
 
-def analyze_build_duration(projects_path: str, workflows_path: str,
-                           workflow_runs_prefix: str, build_duration_img_prefix: str) -> None:
+class BuildDurationAnalysis(WorkflowRunsAnalysis):
     """
     RQ4: How common are long running builds?
     In order to provide quick feedback, builds should be executed in under 10 minutes.
@@ -470,70 +513,45 @@ def analyze_build_duration(projects_path: str, workflows_path: str,
     all projects, as well as when grouped by programming language and project size.
     """
 
-    def build_workflow_durations(workflow_runs: WorkflowRuns) -> TimedeltaList:
-        workflow_durations = []
-        for run in workflow_runs:
-            if not run or run is None or not isinstance(run, dict):
-                print('WARNING: Empty run, skipping...')
-                continue
-
-            depth1_fields = ['status', 'created_at', 'updated_at']
-            all_fields_exist = all([f in run for f in depth1_fields])
-            if all_fields_exist:
-                if run['status'] == 'completed':
-                    run_start = convert_str_to_datetime(run['created_at'])
-                    run_end = convert_str_to_datetime(run['updated_at'])
-                    if run_start < run_end:
-                        workflow_durations.append(run_end - run_start)
-                    # else:
-                    #    print('WARNING: Run start time >= end time, skipping...')
-            else:
-                print('WARNING: Incomplete commit, skipping...')
-        return workflow_durations
-
-    print('[!] Analyzing build duration')
+    def __init__(self, build_duration_img_prefix: str, duration_thresh_mins: int = 10):
+        self.build_duration_img_prefix = build_duration_img_prefix
+        self.duration_thresh_mins = duration_thresh_mins
+        self.workflow_durations_by_proj: DurationsByProject = {}
 
-    projects = load_projects(projects_path, False)
-    workflows_dict = load_workflows(workflows_path)
+    def consume_project(self, repo_id_str: str,
+                        workflow_run_arrays_by_idx: Dict[str, WorkflowRunArrays]) -> None:
+        project_workflow_durations = []
 
-    duration_thresh_mins = 10
-    duration_thresh_timedelta = timedelta(minutes=duration_thresh_mins)
-    workflow_durations_by_proj: TimedeltasByProject = {}
-    print(
-        f"Identifying builds that do not execute in under {duration_thresh_mins} minutes")
+        # Get duration of each workflow run, aggregate across all proj workflows
+        for run_arrays in workflow_run_arrays_by_idx.values():
+            project_workflow_durations.append(compute_build_durations(
+                *build_workflow_duration_arrays(run_arrays)))
 
-    # Iterate through each workflow for each project
-    for project in projects:
-        repo_id_str = project['id']
-        project_workflow_durations = []
+        self.workflow_durations_by_proj[repo_id_str] = concatenate_arrays(project_workflow_durations)
 
-        for workflow_idx_str, _ in workflows_dict[repo_id_str].items():
-            # Get workflow runs
-            workflow_runs_path = encode_workflow_runs_path(
-                workflow_runs_prefix, repo_id_str, workflow_idx_str)
-            workflow_runs = load_workflow_runs(workflow_runs_path)
-
-            # Get duration of each workflow run, aggregate across all proj workflows
-            workflow_durations = build_workflow_durations(workflow_runs)
-            project_workflow_durations.extend(workflow_durations)
-
-        workflow_durations_by_proj[repo_id_str] = project_workflow_durations
-
-    # Print timedelta stats
-    print_timedelta_stats_for_all_langs(
-        'Build duration', projects, workflow_durations_by_proj)
-
-    # Determine how many projects had at least one build (run) that took longer than threshold
-    count_projects_exceeding_thresh(
-        workflow_durations_by_proj, duration_thresh_timedelta)
-
-    # Produce boxplot for each language group, plotting build duration per member count size
-    build_timedelta_boxplots_by_size_for_langs(
-        projects,
-        workflow_durations_by_proj,
-        plot_build_duration_boxplots,
-        build_duration_img_prefix,
-        'minutes'
-    )
+    def report(self, projects: Projects) -> None:
+        print('[!] Analyzing build duration')
+
+        duration_thresh_secs = self.duration_thresh_mins * 60
+        workflow_durations_by_proj = self.workflow_durations_by_proj
+        print(
+            f"Identifying builds that do not execute in under {self.duration_thresh_mins} minutes")
+
+        # Print timedelta stats
+        print_timedelta_stats_for_all_langs(
+            'Build duration', projects, workflow_durations_by_proj)
+
+        # Determine how many projects had at least one build (run) that took longer than threshold
+        count_projects_exceeding_thresh(
+            workflow_durations_by_proj, duration_thresh_secs)
+
+        # Produce boxplot for each language group, plotting build duration per member count size
+        build_timedelta_boxplots_by_size_for_langs(
+            projects,
+            workflow_durations_by_proj,
+            plot_build_duration_boxplots,
+            self.build_duration_img_prefix,
+            'minutes'
+        )
 
-    print('[!] Done analyzing build duration')
+        print('[!] Done analyzing build duration')
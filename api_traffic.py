@@ -0,0 +1,243 @@
+"""
+All API traffic (ie. every request sent by `base_api_client.send_request`) can be recorded into an
+archive, then replayed from it, so that the experiment can be rerun offline, deterministically,
+and without waiting on the network or rate limits. The mode is selected by the `api_traffic_mode`
+environment variable: `record` sends every request as usual and archives its response, `replay`
+serves every response from the archive instead (a request missing from the archive raises
+`ReplayMissError`), and if it is unset, API traffic is left untouched.
+
+Responses are archived by request, ie. by method, URL and params. GraphQL queries are batched
+adaptively (see `github_api_client.run_graphql_queries_batched`), so a replayed batch rarely
+matches a recorded one. The result of each aliased field of a GraphQL query is therefore archived
+on its own, and a response to any batch of archived fields is reassembled on replay. Rate limited
+responses are never archived, and the HTTP cache is bypassed while recording or replaying (since a
+`304 Not Modified` response is useless without the cache entry it refers to).
+
+The archive consists of an append-only data file of zlib-compressed entries, each holding the
+status, (rate limit related) headers and body of a response, and an append-only index of JSON
+lines, mapping the hash of each request to the position of its entry in the data file. If a
+request is archived several times, its last entry is used. On replay, the whole data file is
+read into memory, so responses are served at memory speed. Example `data/api_traffic/index.jsonl`:
+
+{"key": "3f2a...", "offset": 0, "length": 1532}
+{"key": "9bc0...", "offset": 1532, "length": 211}
+...
+"""
+
+import hashlib
+import os
+import re
+import time
+import zlib
+from json import JSONDecodeError, dumps, loads
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+from config import API_TRAFFIC_FOLDER
+
+API_TRAFFIC_MODES = ['record', 'replay']
+API_TRAFFIC_MODE = os.environ.get('api_traffic_mode') or None
+if API_TRAFFIC_MODE is not None and API_TRAFFIC_MODE not in API_TRAFFIC_MODES:
+    raise ValueError(
+        f"Invalid api_traffic_mode '{API_TRAFFIC_MODE}', expected one of {API_TRAFFIC_MODES}")
+API_TRAFFIC_DATA_PATH = f"{API_TRAFFIC_FOLDER}/responses.bin"
+API_TRAFFIC_INDEX_PATH = f"{API_TRAFFIC_FOLDER}/index.jsonl"
+
+# Only these response headers are archived, since no others are used
+ARCHIVED_HEADERS = ['Content-Type', 'Retry-After', 'X-RateLimit-Limit', 'X-RateLimit-Remaining',
+                    'X-RateLimit-Reset', 'X-RateLimit-Resource']
+
+GRAPHQL_FIELD_NAME_REGEX = re.compile(r"^(\w+)\s*(?::|\(|\{)")
+
+_api_traffic_lock = Lock()
+_api_traffic_index: Optional[Dict[str, Tuple[int, int]]] = None
+_api_traffic_data: Optional[bytes] = None
+
+
+class ReplayMissError(Exception):
+    """Raised when replaying a request that was never archived."""
+
+
+def encode_api_traffic_key(method: str, url: str, params: Optional[Dict[str, Any]] = None,
+                           body: Optional[Any] = None) -> str:
+    """
+    Encode the archive key for a request, ie. a hash of its method, URL, params and body (eg. a
+    single field of a GraphQL query). A hex digest str is returned.
+    """
+    key = dumps([method, url, sorted((params or {}).items()), body], default=str)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def split_graphql_query_fields(query: str) -> Optional[List[Tuple[str, str]]]:
+    """
+    Split a GraphQL query of the form `{ field1 { ... } alias2: field2(...) { ... } ... }` into its
+    top-level fields. A list of tuples is returned, containing the alias (or name) and the text
+    (with whitespace collapsed) of each field, or `None` if the query is not of this form.
+    """
+    query = query.strip()
+    if not (query.startswith('{') and query.endswith('}')):
+        return None
+
+    fields, depth, field_start, in_str, is_escaped = [], 0, 1, False, False
+    for i in range(1, len(query) - 1):
+        char = query[i]
+        if in_str:
+            in_str = is_escaped or char != '"'
+            is_escaped = not is_escaped and char == '\\'
+        elif char == '"':
+            in_str = True
+        elif char in '({':
+            depth += 1
+        elif char in ')}':
+            depth -= 1
+            if depth < 0:
+                return None
+            if depth == 0 and char == '}':
+                field_text = ' '.join(query[field_start:i + 1].split())
+                name_match = GRAPHQL_FIELD_NAME_REGEX.match(field_text)
+                if name_match is None:
+                    return None
+                fields.append((name_match.group(1), field_text))
+                field_start = i + 1
+
+    if depth != 0 or query[field_start:-1].strip() != '':
+        return None
+    return fields
+
+
+def encode_api_traffic_entry(status_code: int, headers: Dict[str, str], body: bytes) -> bytes:
+    """Encode a response as a compressed archive entry (a JSON line of metadata, then the body)."""
+    meta = dumps({'status': status_code, 'headers': headers}).encode('utf-8')
+    return zlib.compress(meta + b'\n' + body)
+
+
+def decode_api_traffic_entry(entry: bytes) -> Tuple[int, Dict[str, str], bytes]:
+    meta, body = zlib.decompress(entry).split(b'\n', 1)
+    meta = loads(meta)
+    return meta['status'], meta['headers'], body
+
+
+def append_to_api_traffic(entries: Dict[str, bytes]) -> None:
+    """
+    Append encoded entries (a dict mapping key to entry) to the archive. Entries are written to
+    the data file before the index, so the index never refers to a partially written entry.
+    """
+    with _api_traffic_lock:
+        os.makedirs(API_TRAFFIC_FOLDER, exist_ok=True)
+        index_lines = []
+        with open(API_TRAFFIC_DATA_PATH, 'ab') as data_file:
+            offset = data_file.tell()
+            for key, entry in entries.items():
+                data_file.write(entry)
+                index_lines.append(
+                    dumps({'key': key, 'offset': offset, 'length': len(entry)}) + '\n')
+                offset += len(entry)
+        with open(API_TRAFFIC_INDEX_PATH, 'a') as index_file:
+            index_file.writelines(index_lines)
+
+
+def load_api_traffic() -> Tuple[Dict[str, Tuple[int, int]], bytes]:
+    """
+    Load the archive index (a dict mapping key to the offset and length of its entry) and the
+    whole data file into memory, once. A partially written last index line is ignored.
+    """
+    global _api_traffic_index, _api_traffic_data
+    with _api_traffic_lock:
+        if _api_traffic_index is None:
+            index = {}
+            if os.path.isfile(API_TRAFFIC_INDEX_PATH):
+                with open(API_TRAFFIC_INDEX_PATH) as index_file:
+                    for line in index_file:
+                        try:
+                            entry = loads(line)
+                        except JSONDecodeError:
+                            print(f"WARNING: Ignoring incomplete entry in {API_TRAFFIC_INDEX_PATH}")
+                            continue
+                        index[entry['key']] = (entry['offset'], entry['length'])
+            data = b''
+            if os.path.isfile(API_TRAFFIC_DATA_PATH):
+                with open(API_TRAFFIC_DATA_PATH, 'rb') as data_file:
+                    data = data_file.read()
+            print(f"Loaded {len(index)} archived API responses from {API_TRAFFIC_FOLDER}")
+            _api_traffic_index, _api_traffic_data = index, data
+        return _api_traffic_index, _api_traffic_data
+
+
+def get_from_api_traffic(key: str) -> Optional[Tuple[int, Dict[str, str], bytes]]:
+    """Return the archived status, headers and body for a key, or `None` if it was never archived."""
+    index, data = load_api_traffic()
+    if key not in index:
+        return None
+    offset, length = index[key]
+    return decode_api_traffic_entry(data[offset:offset + length])
+
+
+def build_response(url: str, status_code: int, headers: Dict[str, str], body: bytes) -> Response:
+    res = Response()
+    res.url = url
+    res.status_code = status_code
+    res.headers = CaseInsensitiveDict(headers)
+    res.encoding = 'utf-8'
+    res._content = body
+    return res
+
+
+def record_api_traffic(method: str, url: str, res: Response,
+                       params: Optional[Dict[str, Any]] = None,
+                       json: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+    """
+    Archive the response to a request. The result of each field of a (successful) GraphQL query
+    is archived separately, while any other response is archived as a whole.
+    """
+    fields = split_graphql_query_fields(json['query']) \
+        if json is not None and isinstance(json.get('query'), str) else None
+    if fields is None:
+        headers = {name: res.headers[name] for name in ARCHIVED_HEADERS if name in res.headers}
+        append_to_api_traffic({
+            encode_api_traffic_key(method, url, params, json):
+                encode_api_traffic_entry(res.status_code, headers, res.content)
+        })
+        return
+
+    try:
+        res_json = res.json() if res.status_code == 200 else None
+    except ValueError:
+        res_json = None
+    data = res_json.get('data') if isinstance(res_json, dict) else None
+    if not isinstance(data, dict):
+        return
+    append_to_api_traffic({
+        encode_api_traffic_key(method, url, params, field_text): encode_api_traffic_entry(
+            200, {}, dumps(data[name]).encode('utf-8'))
+        for name, field_text in fields if name != 'rateLimit' and name in data
+    })
+
+
+def replay_api_traffic(method: str, url: str, params: Optional[Dict[str, Any]] = None,
+                       json: Optional[Dict[str, Any]] = None, **kwargs: Any) -> Response:
+    """
+    Serve the archived response to a request. A GraphQL query is answered with the archived
+    results of all of its fields, along with a `rateLimit` that never delays subsequent queries
+    (if requested). Raises `ReplayMissError` if any part of the request was never archived.
+    """
+    fields = split_graphql_query_fields(json['query']) \
+        if json is not None and isinstance(json.get('query'), str) else None
+    if fields is None:
+        archived = get_from_api_traffic(encode_api_traffic_key(method, url, params, json))
+        if archived is None:
+            raise ReplayMissError(f"{method} {url} (params {params}) was never recorded")
+        return build_response(url, *archived)
+
+    data = {}
+    for name, field_text in fields:
+        if name == 'rateLimit':
+            reset_at = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+            data[name] = {'cost': 1, 'remaining': 5000, 'resetAt': reset_at}
+            continue
+        archived = get_from_api_traffic(encode_api_traffic_key(method, url, params, field_text))
+        if archived is None:
+            raise ReplayMissError(f"{method} {url} field {name} was never recorded")
+        data[name] = loads(archived[2])
+    return build_response(
+        url, 200, {'Content-Type': 'application/json'}, dumps({'data': data}).encode('utf-8'))
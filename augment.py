@@ -6,35 +6,49 @@
 #
 
 import os
-from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Any, Dict, List
+from base_api_client import ApiRequestError
 from branches import load_default_branches
 from coverage import save_coverage
 from coveralls_api_client import get_latest_coveralls_report_in_date_range
 from data_io import read_dict_from_json_file
-from projects import load_projects, load_projects_and_partition
-from workflows import encode_workflow_runs_path, load_workflow_runs, load_workflows
+from metrics import record_rows
+from projects import load_projects
+from workflows import (
+    are_workflow_fetch_params_current,
+    count_workflow_runs,
+    encode_workflow_runs_store_path,
+    get_stored_workflow_fetch_params,
+    import_legacy_workflow_runs,
+    load_workflow_runs,
+    load_workflows,
+    open_workflow_runs_store,
+    save_workflow_runs
+)
 from config import (
     MAX_GITHUB_RESULTS_PER_PAGE,
     NUM_PAGES,
-    NUM_PARTITIONS_DEFAULT_BRANCH,
+    NUM_WORKFLOW_RUN_WORKERS,
     NUM_WORKFLOW_RUNS,
     SUPPORTED_LANGUAGE_GROUPS_MAP
 )
 from github_api_client import (
-    convert_str_to_datetime,
-    get_default_branch_for_repos_partitioned,
+    get_default_branch_for_repos_batched,
     get_runs_for_workflow
 )
+from timestamps import SECS_PER_DAY
 
 
-def encode_coveralls_report_path(project_coverage_prefix: str, repo_id: str) -> str:
+def encode_coveralls_report_path(project_coverage_prefix: str, repo_id: str,
+                                 min_report_date: int, max_report_date: int) -> str:
     """
-    Encode a path for the Coveralls report corresponding to a given project. Produces a path
-    of the form `data/project_coverage_repo123.json`, which indicates that the file contains
-    the Coveralls coverage report for repo 123.
+    Encode a path for the Coveralls report corresponding to a given project and date range (in
+    epoch seconds). Produces a path of the form `data/project_coverage_repo123_1000_2000.json`,
+    which indicates that the file contains the latest Coveralls coverage report for repo 123
+    created between 1000 and 2000, so a report is never reused once the range changes.
     """
-    return f"{project_coverage_prefix}_repo{repo_id}.json"
+    return f"{project_coverage_prefix}_repo{repo_id}_{min_report_date}_{max_report_date}.json"
 
 
 def verify_projects_have_augmented_data(projects: List[Dict[str, str]],
@@ -85,10 +99,9 @@ def get_default_branches_for_projects(projects_path: str, default_branches_path_
             f"[!] {default_branches_output_path} already exists, skipping...")
         return
 
-    partitioned_projects = load_projects_and_partition(
-        projects_path, NUM_PARTITIONS_DEFAULT_BRANCH)
-    get_default_branch_for_repos_partitioned(
-        partitioned_projects, NUM_PARTITIONS_DEFAULT_BRANCH, default_branches_path_prefix)
+    projects = load_projects(projects_path)
+    branch_names = get_default_branch_for_repos_batched(projects, default_branches_path_prefix)
+    record_rows(len(projects), len(branch_names))
     print(
         f"[!] Wrote default branch names file to {default_branches_output_path}")
     print(f"[!] Done retrieving default branch names")
@@ -102,26 +115,91 @@ def get_workflow_runs(projects_path: str, workflows_path: str, default_branches_
     projects, workflows_dict, default_branches_dict = load_projects_workflows_branches(
         projects_path, workflows_path, default_branches_path)
 
-    # Get workflow runs for all workflows in all projects
-    # NOTE: This will take a while, and may likely require restarting due to GitHub API rate limits
-    for i, project in enumerate(projects):
-        print(f"Getting workflow runs for project {i+1}/{len(projects)}")
+    # Find all workflows whose runs we haven't already retrieved with the current parameters (ie.
+    # not in the store yet, or stored for a different workflow file at the same index, a different
+    # branch, or a different number of runs), so an interrupted or stale run of this stage resumes
+    # rather than starting over
+    store = open_workflow_runs_store(workflow_runs_prefix)
+    stored_fetch_params = get_stored_workflow_fetch_params(store)
+    pending_workflows = []
+    for project in projects:
         for workflow_idx_str, workflow in workflows_dict[project['id']].items():
-            # Get workflow runs for this workflow if we haven't already
-            runs_output_path = encode_workflow_runs_path(
-                workflow_runs_prefix, project['id'], workflow_idx_str)
-            if not os.path.isfile(runs_output_path):
-                get_runs_for_workflow(
-                    project['owner'],
-                    project['name'],
-                    default_branches_dict[project['id']],
-                    workflow['name'],
-                    runs_output_path,
-                    NUM_PAGES,
-                    MAX_GITHUB_RESULTS_PER_PAGE
-                )
-
-    print('[!] Done retrieving workflow runs (no summarized file was written)')
+            key = (project['id'], workflow_idx_str)
+            fetch_params = {
+                'workflow_name': workflow['name'],
+                'branch': default_branches_dict[project['id']],
+                'num_pages': NUM_PAGES,
+                'per_page': MAX_GITHUB_RESULTS_PER_PAGE
+            }
+            if key in stored_fetch_params and \
+                    are_workflow_fetch_params_current(stored_fetch_params[key], fetch_params):
+                continue
+            if key not in stored_fetch_params:
+                try:
+                    if import_legacy_workflow_runs(store, workflow_runs_prefix, project['id'],
+                                                   workflow_idx_str, fetch_params) is not None:
+                        continue
+                except ValueError as e:
+                    # Refetch the runs instead of importing malformed ones
+                    print(f"WARNING: Could not import runs for repo {project['id']} workflow {workflow_idx_str} ({e})")
+            pending_workflows.append((project, workflow_idx_str, fetch_params))
+
+    # Get workflow runs for all pending workflows, using a pool of concurrent workers, and store
+    # the runs of each workflow as soon as they have all been retrieved
+    print(
+        f"Getting workflow runs for {len(pending_workflows)} workflows ({NUM_WORKFLOW_RUN_WORKERS} workers)")
+    num_runs_retrieved, num_failed = 0, 0
+    with ThreadPoolExecutor(max_workers=NUM_WORKFLOW_RUN_WORKERS) as executor:
+        futures = {
+            executor.submit(
+                get_runs_for_workflow,
+                project['owner'],
+                project['name'],
+                fetch_params['branch'],
+                fetch_params['workflow_name'],
+                None,
+                fetch_params['num_pages'],
+                fetch_params['per_page']
+            ): (project['id'], workflow_idx_str, fetch_params)
+            for project, workflow_idx_str, fetch_params in pending_workflows
+        }
+        try:
+            for i, future in enumerate(as_completed(futures)):
+                repo_id, workflow_idx_str, fetch_params = futures[future]
+                try:
+                    workflow_runs = future.result()
+                except ApiRequestError as e:
+                    # Leave the workflow out of the store, so it is retried on the next run
+                    print(f"WARNING: Could not get runs for repo {repo_id} workflow {workflow_idx_str} ({e})")
+                    num_failed += 1
+                    continue
+                try:
+                    save_workflow_runs(store, repo_id, workflow_idx_str, workflow_runs, fetch_params)
+                except ValueError as e:
+                    # Runs with malformed timestamps can't be stored, so the workflow is retried on
+                    # the next run as well
+                    print(f"WARNING: Could not store runs for repo {repo_id} workflow {workflow_idx_str} ({e})")
+                    num_failed += 1
+                    continue
+                num_runs_retrieved += len(workflow_runs)
+                if (i+1) % 100 == 0:
+                    print(
+                        f"Got workflow runs for {i+1}/{len(pending_workflows)} workflows")
+        except BaseException:
+            # Don't start any queued requests if a worker failed (or we were interrupted)
+            for future in futures:
+                future.cancel()
+            raise
+        finally:
+            store.close()
+
+    record_rows(len(pending_workflows), num_runs_retrieved)
+    if num_failed > 0:
+        print(
+            f"ERROR: Could not get runs for {num_failed}/{len(pending_workflows)} workflows (rerun to retry them), aborting!")
+        exit()
+    print(
+        f"[!] Done retrieving workflow runs (stored in {encode_workflow_runs_store_path(workflow_runs_prefix)})")
 
 
 def get_coveralls_info(projects_path: str, workflows_path: str, default_branches_path: str,
@@ -136,6 +214,9 @@ def get_coveralls_info(projects_path: str, workflows_path: str, default_branches
     projects, workflows_dict, default_branches_dict = load_projects_workflows_branches(
         projects_path, workflows_path, default_branches_path)
 
+    store = open_workflow_runs_store(workflow_runs_prefix)
+    fetched_workflows = count_workflow_runs(store)
+
     # Get Coveralls report for each project
     for i, project in enumerate(projects):
         print(
@@ -144,38 +225,34 @@ def get_coveralls_info(projects_path: str, workflows_path: str, default_branches
         # Get SHAs (identifiers) for the head commits of every workflow run
         proj_commits = {}
         for workflow_idx_str, _ in workflows_dict[project['id']].items():
-            workflow_runs_path = encode_workflow_runs_path(
-                workflow_runs_prefix, project['id'], workflow_idx_str)
-            if not os.path.isfile(workflow_runs_path):
+            if (project['id'], workflow_idx_str) not in fetched_workflows:
                 print(
-                    f"ERROR: Workflow runs file does not exist at {workflow_runs_path}, aborting!")
+                    f"ERROR: Workflow runs for repo {project['id']} workflow {workflow_idx_str} were never retrieved, aborting!")
                 exit()
 
-            workflow_runs = load_workflow_runs(workflow_runs_path)
+            workflow_runs = load_workflow_runs(store, project['id'], workflow_idx_str)
             for run in workflow_runs:
                 proj_commits[run['created_at']] = run['head_sha']
 
         # Sort the commit SHAs by workflow run date (get newest commits first)
         ordered_proj_commits = sorted(
             proj_commits.items(),
-            key=lambda x: convert_str_to_datetime(x[0]),
+            key=lambda x: x[0],
             reverse=True
         )
 
-        coveralls_report_filename = encode_coveralls_report_path(
-            project_coverage_prefix, project['id'])
-        report = {}
-
         if len(ordered_proj_commits) == 0:
             print(
                 f"ERROR: No commits found for project id {project['id']}, aborting!")
             exit()
-        elif not os.path.isfile(coveralls_report_filename):
-            # Get the latest Coveralls report created within 7 days before the latest build run
-            max_report_date = convert_str_to_datetime(
-                ordered_proj_commits[0][0])
-            min_report_date = max_report_date - timedelta(days=7)
 
+        # Get the latest Coveralls report created within 7 days before the latest build run
+        max_report_date = int(ordered_proj_commits[0][0])
+        min_report_date = max_report_date - 7 * SECS_PER_DAY
+        coveralls_report_filename = encode_coveralls_report_path(
+            project_coverage_prefix, project['id'], min_report_date, max_report_date)
+
+        if not os.path.isfile(coveralls_report_filename):
             report = get_latest_coveralls_report_in_date_range(
                 project['owner'],
                 project['name'],
@@ -185,7 +262,7 @@ def get_coveralls_info(projects_path: str, workflows_path: str, default_branches
                 output_filename=coveralls_report_filename
             )
         else:
-            # Report has already been retrieved, read it from disk
+            # Report has already been retrieved for this date range, read it from disk
             report = read_dict_from_json_file(coveralls_report_filename)
 
         # Aggregate coverage by programming language group
@@ -197,6 +274,8 @@ def get_coveralls_info(projects_path: str, workflows_path: str, default_branches
             reports_found_by_lang[language_group].append(
                 report['covered_percent'])
 
+    store.close()
+    record_rows(len(projects), reports_found)
     print(
         f"Found Coveralls reports for {reports_found}/{len(projects)} projects")
 
@@ -1,8 +1,27 @@
+import hashlib
+import os
 import time
-from json import JSONDecodeError
-from typing import Any, Dict, Optional
-from requests import get, post, packages
-from data_io import OutputFile, write_dict_to_json_file
+from json import JSONDecodeError, dumps, loads
+from threading import BoundedSemaphore, Lock
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse
+from requests import RequestException, Response, Session, packages
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from config import (
+    HTTP_CACHE_FOLDER,
+    HTTP_POOL_SIZE,
+    MAX_IN_FLIGHT_REQUESTS,
+    RATE_LIMIT_RESERVE,
+    RATE_LIMIT_WINDOW_SECS,
+    SECONDARY_RATE_LIMIT_WAIT_SECS,
+    USE_HTTP_CACHE
+)
+from api_traffic import API_TRAFFIC_MODE, ReplayMissError, record_api_traffic, replay_api_traffic
+from data_io import OutputFile, read_dict_from_json_file, write_dict_to_json_file
+from metrics import record_graphql_cost, record_request
+from timestamps import parse_iso8601_timestamp
 
 # Disable certificate validation warnings
 packages.urllib3.disable_warnings()
@@ -13,6 +32,299 @@ OptionalAny = Optional[Any]
 OptionalParams = Optional[Dict[str, str]]
 
 
+class ApiRequestError(Exception):
+    """Raised when an API request still fails after exhausting all of its retries."""
+
+# One pooled keep-alive session per host (eg. api.github.com, coveralls.io), shared by all clients
+_sessions: Dict[str, Session] = {}
+_sessions_lock = Lock()
+_num_handshakes: Dict[str, int] = {}
+
+# Global limit on the number of requests in flight at once, across all threads
+_in_flight_requests = BoundedSemaphore(MAX_IN_FLIGHT_REQUESTS)
+
+
+def _record_handshake(host: str, port: Optional[int]) -> None:
+    with _sessions_lock:
+        key = f"{host}:{port}"
+        _num_handshakes[key] = _num_handshakes.get(key, 0) + 1
+
+
+class CountingHTTPConnection(HTTPConnection):
+    def connect(self):
+        _record_handshake(self.host, self.port)
+        super().connect()
+
+
+class CountingHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        _record_handshake(self.host, self.port)
+        super().connect()
+
+
+class CountingHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = CountingHTTPConnection
+
+
+class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = CountingHTTPSConnection
+
+
+def get_session(url: str) -> Session:
+    """
+    Return the pooled keep-alive session for the host of a given URL, creating it on first use.
+    Each session keeps up to `HTTP_POOL_SIZE` open connections, so that consecutive requests to
+    the same host reuse an existing TCP / TLS connection instead of performing a new handshake.
+    """
+    host = urlparse(url).netloc
+    with _sessions_lock:
+        if host not in _sessions:
+            session = Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+            adapter.poolmanager.pool_classes_by_scheme = {
+                'http': CountingHTTPConnectionPool,
+                'https': CountingHTTPSConnectionPool
+            }
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _sessions[host] = session
+        return _sessions[host]
+
+
+def get_session_stats() -> Dict[str, Dict[str, int]]:
+    """
+    Return connection reuse counts for every pooled session, keyed by host. For each host, the
+    number of requests sent, the number of connections opened (ie. TCP / TLS handshakes performed),
+    and the number of requests that reused an already open connection are reported. Example return value:
+    ```
+    {
+        'api.github.com': {'requests': 1200, 'connections': 4, 'reused': 1196},
+        ...
+    }
+    ```
+    """
+    stats = {}
+    with _sessions_lock:
+        for host, session in _sessions.items():
+            num_requests, num_connections = 0, 0
+            for adapter in set(session.adapters.values()):
+                pools = adapter.poolmanager.pools
+                for pool_key in pools.keys():
+                    pool = pools[pool_key]
+                    num_requests += pool.num_requests
+                    num_connections += _num_handshakes.get(f"{pool.host}:{pool.port}", 0)
+            stats[host] = {
+                'requests': num_requests,
+                'connections': num_connections,
+                'reused': num_requests - num_connections
+            }
+    return stats
+
+
+def print_session_stats() -> None:
+    for host, host_stats in get_session_stats().items():
+        print(
+            f"{host}: {host_stats['requests']} requests over {host_stats['connections']} connections ({host_stats['reused']} reused)")
+
+
+def send_request(method: str, url: str, **kwargs) -> Response:
+    """
+    Send an HTTP request through the pooled session for the URL's host. Safe to call from many
+    threads at once, however no more than `MAX_IN_FLIGHT_REQUESTS` will be in flight at a time.
+    Depending on `api_traffic_mode`, responses are also recorded, or replayed instead of sending
+    the request at all (see `api_traffic.py`).
+    """
+    if API_TRAFFIC_MODE == 'replay':
+        return replay_api_traffic(method, url, **kwargs)
+    with _in_flight_requests:
+        res = get_session(url).request(method, url, **kwargs)
+    if API_TRAFFIC_MODE == 'record' and not is_rate_limited(res):
+        record_api_traffic(method, url, res, **kwargs)
+    return res
+
+
+class RateLimitBudget:
+    """
+    Tracks the remaining budget of a single API rate limit (eg. the REST or GraphQL limit of one
+    GitHub token), as last reported by the API. Before each request, `wait_for_turn()` paces the
+    caller so that the budget is spent evenly over the rate limit window, and sleeps until the
+    limit resets once the budget is exhausted. Budgets that have never been reported (eg. for
+    Coveralls, which has no rate limit headers) never delay requests.
+    """
+
+    def __init__(self):
+        self.limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+        self.reset_at: Optional[float] = None
+        self.last_cost = 1
+        self.next_request_at = 0.0
+        self.lock = Lock()
+
+    def update(self, remaining: int, reset_at: float, limit: Optional[int] = None,
+               cost: Optional[int] = None) -> None:
+        with self.lock:
+            self.remaining, self.reset_at = remaining, reset_at
+            if limit is not None:
+                self.limit = limit
+            if cost is not None:
+                self.last_cost = max(cost, 1)
+
+    def update_from_headers(self, headers: Dict[str, str]) -> None:
+        """Update the budget from the `X-RateLimit-*` headers of a REST response, if present."""
+        if 'X-RateLimit-Remaining' in headers and 'X-RateLimit-Reset' in headers:
+            limit = headers.get('X-RateLimit-Limit')
+            self.update(
+                int(headers['X-RateLimit-Remaining']),
+                float(headers['X-RateLimit-Reset']),
+                int(limit) if limit is not None else None
+            )
+
+    def update_from_graphql(self, rate_limit: Dict[str, Any]) -> None:
+        """Update the budget from the `rateLimit { cost remaining resetAt }` field of a query."""
+        reset_at = parse_iso8601_timestamp(rate_limit['resetAt'])
+        self.update(rate_limit['remaining'], reset_at, cost=rate_limit['cost'])
+
+    def headroom(self) -> float:
+        """Return the remaining budget, or infinity if it is unknown or has since been reset."""
+        with self.lock:
+            if self.remaining is None or self.reset_at is None or time.time() >= self.reset_at:
+                return float('inf')
+            return self.remaining
+
+    def seconds_until_reset(self) -> float:
+        with self.lock:
+            if self.reset_at is None:
+                return float(RATE_LIMIT_WINDOW_SECS)
+            return max(self.reset_at - time.time(), 0) + 1
+
+    def wait_for_turn(self) -> None:
+        with self.lock:
+            now = time.time()
+            if self.remaining is None or self.reset_at is None or now >= self.reset_at:
+                # Nothing is known about the current window, so don't delay the request
+                start_at = now
+            elif self.remaining - self.last_cost < RATE_LIMIT_RESERVE:
+                # Budget is exhausted, wait for the rate limit window to reset
+                start_at = self.reset_at + 1
+                print(
+                    f"WARNING: Rate limit budget exhausted, sleeping {start_at - now:.0f}s until it resets...")
+            else:
+                # Only pace requests once we are spending faster than the window is elapsing
+                secs_until_reset = self.reset_at - now
+                budget_frac = self.remaining / self.limit if self.limit else 1
+                if budget_frac < secs_until_reset / RATE_LIMIT_WINDOW_SECS:
+                    spacing = secs_until_reset * self.last_cost / self.remaining
+                    start_at = max(now, self.next_request_at)
+                    self.next_request_at = start_at + spacing
+                else:
+                    start_at = now
+
+                # Optimistically spend the budget, until the response reports the actual amount
+                self.remaining -= self.last_cost
+
+        if start_at > now:
+            time.sleep(start_at - now)
+
+
+_rate_limit_budgets: Dict[Tuple[str, Any, str], RateLimitBudget] = {}
+_rate_limit_budgets_lock = Lock()
+
+
+def get_rate_limit_budget(url: str, auth: OptionalAny = None,
+                          resource: str = 'core') -> RateLimitBudget:
+    """
+    Return the rate limit budget shared by all requests to the URL's host, using the given auth
+    credentials, for the given rate limit resource (eg. `core` for REST, `graphql` for GraphQL).
+    """
+    key = (urlparse(url).netloc, auth, resource)
+    with _rate_limit_budgets_lock:
+        if key not in _rate_limit_budgets:
+            _rate_limit_budgets[key] = RateLimitBudget()
+        return _rate_limit_budgets[key]
+
+
+def is_rate_limited(res: Response) -> bool:
+    """
+    Return whether a request was rejected due to a (primary or secondary) rate limit. GitHub
+    does not always send a `Retry-After` header with a secondary rate limit, in which case it is
+    recognized by its message.
+    """
+    if res.status_code == 429:
+        return True
+    if res.status_code != 403:
+        return False
+    return 'Retry-After' in res.headers or \
+        res.headers.get('X-RateLimit-Remaining') == '0' or \
+        b'secondary rate limit' in res.content.lower()
+
+
+def get_rate_limited_wait(res: Response, budget: RateLimitBudget) -> Optional[float]:
+    """
+    Return the number of seconds to wait before retrying a request that was rejected due to a
+    (primary or secondary) rate limit, or `None` if the request was not rate limited. Without any
+    indication of when to retry, a secondary rate limit is waited out for at least
+    `SECONDARY_RATE_LIMIT_WAIT_SECS`.
+    """
+    if not is_rate_limited(res):
+        return None
+    if 'Retry-After' in res.headers:
+        return float(res.headers['Retry-After'])
+    if res.headers.get('X-RateLimit-Remaining') == '0':
+        return budget.seconds_until_reset()
+    return SECONDARY_RATE_LIMIT_WAIT_SECS
+
+
+def count_rest_rate_limit_spent(res: Response) -> int:
+    """
+    Return the REST rate limit budget spent by a request, ie. 1 if the response reports a rate
+    limit, unless it is a `304 Not Modified` response to a conditional request (which is free).
+    """
+    return int('X-RateLimit-Remaining' in res.headers and res.status_code != 304)
+
+
+def is_graphql_rate_limited(res_json: Any) -> bool:
+    errors = res_json.get('errors') if isinstance(res_json, dict) else None
+    return isinstance(errors, list) and any(
+        isinstance(e, dict) and e.get('type') == 'RATE_LIMITED' for e in errors)
+
+
+def encode_http_cache_path(url: str, params: OptionalParams = None) -> str:
+    """
+    Encode the path of the HTTP cache entry for a GET request to a given URL with given params.
+    Produces a path of the form `data/http_cache/ab/ab12...ef.json`, where the filename is a hash
+    of the URL and params (entries are spread across subfolders by the first 2 hash characters).
+    """
+    key = dumps([url, sorted((params or {}).items())], default=str)
+    key_hash = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    return f"{HTTP_CACHE_FOLDER}/{key_hash[:2]}/{key_hash}.json"
+
+
+def load_http_cache_entry(cache_path: str) -> Optional[Dict[str, Any]]:
+    """
+    Load a cached response (ie. its `etag`, `last_modified` and `body`) from the HTTP cache, or
+    return `None` if the response has not been cached.
+    """
+    if not os.path.isfile(cache_path):
+        return None
+    try:
+        return read_dict_from_json_file(cache_path)
+    except JSONDecodeError:
+        print(f"WARNING: HTTP cache entry {cache_path} is corrupt, ignoring...")
+        return None
+
+
+def save_http_cache_entry(cache_path: str, url: str, params: OptionalParams,
+                          res: Response, body: str) -> None:
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    write_dict_to_json_file({
+        'url': url,
+        'params': params,
+        'etag': res.headers.get('ETag'),
+        'last_modified': res.headers.get('Last-Modified'),
+        'body': body
+    }, cache_path)
+
+
 def get_from_url(url: str, output_filename: OutputFile = None,
                  auth: OptionalAny = None, params: OptionalParams = None,
                  allow_json_decode_error: bool = False) -> Dict[Any, Any]:
@@ -21,11 +333,71 @@ def get_from_url(url: str, output_filename: OutputFile = None,
     a dict, which is written to an output file (if provided), then returned. If the response may
     not be in JSON format (perhaps it is HTML, which means parsing will throw JSONDecodeError),
     set `allow_json_decode_error=True` to return an empty dict, otherwise JSONDecodeError will
-    be raised. 
+    be raised. Server errors (5xx) are retried up to `RETRY_COUNT` times, after which the error
+    response is returned like any other. Replaying a request that was never recorded raises
+    `ApiRequestError`.
+
+    Responses carrying an `ETag` or `Last-Modified` header are stored in an on-disk HTTP cache
+    (see `HTTP_CACHE_FOLDER`). When the same URL and params are requested again, the request is
+    made conditional, and the cached body is reused if the server replies `304 Not Modified`
+    (which GitHub does not count against the rate limit). The HTTP cache is bypassed while API
+    traffic is being recorded or replayed.
     """
-    res = get(url, auth=auth, params=params, verify=False, timeout=30)
+    use_http_cache = USE_HTTP_CACHE and API_TRAFFIC_MODE is None
+    cache_path = encode_http_cache_path(url, params) if use_http_cache else None
+    cache_entry = load_http_cache_entry(cache_path) if cache_path is not None else None
+    headers = {}
+    if cache_entry is not None:
+        if cache_entry['etag'] is not None:
+            headers['If-None-Match'] = cache_entry['etag']
+        if cache_entry['last_modified'] is not None:
+            headers['If-Modified-Since'] = cache_entry['last_modified']
+
+    budget = get_rate_limit_budget(url, auth)
+    counter = 0
+    while True:
+        budget.wait_for_turn()
+        try:
+            res = send_request('GET', url, auth=auth, params=params, headers=headers,
+                               verify=False, timeout=30)
+        except ReplayMissError as e:
+            # NOTE: Retrying cannot help, the response will never be in the archive
+            raise ApiRequestError(f"GET {url} failed: {e}")
+        except RequestException as e:
+            # NOTE: Connections occassionally fail, attempt a few retries
+            counter += 1
+            if counter > RETRY_COUNT:
+                raise e
+            print(f"An error occurred, retrying ({counter}/{RETRY_COUNT})...")
+            time.sleep(counter*3)
+            continue
+
+        budget.update_from_headers(res.headers)
+        record_request('GET', url, len(res.content), res.status_code >= 400,
+                       count_rest_rate_limit_spent(res))
+        rate_limited_wait = get_rate_limited_wait(res, budget)
+        if rate_limited_wait is not None:
+            print(f"WARNING: GET {url} was rate limited, sleeping {rate_limited_wait:.0f}s...")
+            time.sleep(rate_limited_wait)
+        elif res.status_code >= 500 and counter < RETRY_COUNT:
+            # NOTE: Server errors are usually transient, attempt a few retries
+            counter += 1
+            print(
+                f"WARNING: GET {url} returned {res.status_code}, retrying ({counter}/{RETRY_COUNT})...")
+            time.sleep(counter*3)
+        else:
+            break
+
+    if res.status_code == 304 and cache_entry is not None:
+        body = cache_entry['body']
+    else:
+        body = res.content.decode('utf-8', errors='replace')
+        has_validator = 'ETag' in res.headers or 'Last-Modified' in res.headers
+        if cache_path is not None and res.status_code == 200 and has_validator:
+            save_http_cache_entry(cache_path, url, params, res, body)
+
     try:
-        res_json = res.json()
+        res_json = loads(body)
     except JSONDecodeError as e:
         if allow_json_decode_error:
             res_json = {}
@@ -37,24 +409,47 @@ def get_from_url(url: str, output_filename: OutputFile = None,
 
 
 def post_to_url(url: str, json: Dict[str, Any], auth: OptionalAny,
-                output_filename: OutputFile = None) -> Any:
+                output_filename: OutputFile = None, retry_count: int = RETRY_COUNT) -> Any:
+    """
+    Execute a GraphQL query (POST request) to a given URL, and return the deserialized response
+    body. If the query requests the `rateLimit` field, it is used to pace subsequent queries, and
+    removed from the response data before it is written to the output file (if provided).
+    Rate limited queries are retried once the limit resets, without counting against retries.
+    Failed queries are retried up to `retry_count` times, after which `ApiRequestError` is raised.
+    """
+    budget = get_rate_limit_budget(url, auth, 'graphql')
+
     # NOTE: GitHub API calls occassionally fail a few times in a row, attempt a few retries
     counter = 0
-    while counter <= RETRY_COUNT:
+    while True:
         try:
-            res = post(url, json=json, auth=auth)
-            res_json = res.json()
+            budget.wait_for_turn()
+            res = send_request('POST', url, json=json, auth=auth)
+            budget.update_from_headers(res.headers)
+            record_request('POST', url, len(res.content), res.status_code >= 400)
+            rate_limited_wait = get_rate_limited_wait(res, budget)
+            res_json = res.json() if rate_limited_wait is None else None
+            if rate_limited_wait is None and is_graphql_rate_limited(res_json):
+                rate_limited_wait = budget.seconds_until_reset()
+            if rate_limited_wait is not None:
+                print(f"WARNING: POST {url} was rate limited, sleeping {rate_limited_wait:.0f}s...")
+                time.sleep(rate_limited_wait)
+                continue
+
             if res_json is None or not('data' in res_json) or res_json['data'] is None:
                 raise ValueError(f"POST {url} res_json['data'] is missing: {res_json}")
+            rate_limit = res_json['data'].pop('rateLimit', None)
+            if rate_limit is not None:
+                budget.update_from_graphql(rate_limit)
+                record_graphql_cost(rate_limit['cost'])
             write_dict_to_json_file(res_json, output_filename)
             return res_json
+        except ReplayMissError as e:
+            # NOTE: Retrying cannot help, the response will never be in the archive
+            raise ApiRequestError(f"POST {url} failed: {e}")
         except Exception as e:
             counter += 1
-            if counter > RETRY_COUNT:
-                print('ERROR: Exhausted retries, printing exception and exiting...')
-                print(e)
-                exit()
-            else:
-                print(f"An error occurred, retrying ({counter}/{RETRY_COUNT})...")
-                time.sleep(counter*3)
-
+            if counter > retry_count:
+                raise ApiRequestError(f"POST {url} failed after {retry_count} retries: {e}")
+            print(f"An error occurred, retrying ({counter}/{retry_count})...")
+            time.sleep(counter*3)
@@ -0,0 +1,273 @@
+"""
+Microbenchmarks of the analysis kernels (see `analyze.py`), run against synthetic workflow run
+timelines rather than collected data. For each combination of total number of runs, number of
+projects and failure rate, runs are spread unevenly over the projects (and over 1-3 workflows per
+project), and each kernel is timed on them:
+
+- `build_workflow_durations`: `BuildDurationAnalysis.consume_project` for every project, ie.
+  `build_workflow_duration_arrays` and `compute_build_durations` for every workflow
+- `get_workflow_failure_timedeltas`: `BrokenBuildDurationAnalysis.consume_project` for every
+  project, ie. `build_workflow_conclusion_arrays` and `compute_failure_durations` for every workflow
+- `print_timedelta_stats`: over all build durations, and all broken build durations
+- `build_boxplots_by_size_for_langs`: `build_timedelta_boxplots_by_size_for_langs` over all build
+  durations, and all broken build durations (without rendering any plots)
+
+Kernels are timed in a first pass. The peak memory of each kernel (ie. the most memory held at
+once by its outputs so far plus its working memory) is measured in a second, slower pass using
+`tracemalloc`. The runs of a project are generated just before they are analyzed, so neither the
+time nor the memory taken by generating them is included. Results are written to a JSON file.
+Usage:
+```
+python benchmark_analyze.py --num-runs 1000 100000 10000000 --num-projects 1000 --failure-rates 0.1 0.3
+```
+"""
+
+import argparse
+import itertools
+import os
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from contextlib import contextmanager, redirect_stdout
+from typing import Any, Dict, Iterator, List
+
+# NOTE: The GHTorrent path is read when `projects` is imported, although no GHTorrent files are
+# read by these benchmarks
+os.environ.setdefault('ghtorrent_path', '')
+
+from analyze import (
+    BrokenBuildDurationAnalysis,
+    BuildDurationAnalysis,
+    build_timedelta_boxplots_by_size_for_langs,
+    concatenate_arrays,
+    print_timedelta_stats
+)
+from config import PROJECT_MEMBER_COUNTS_PATH, RESULTS_FOLDER, SUPPORTED_LANGUAGES
+from data_io import write_dict_to_json_file
+from projects import Projects
+from workflows import WORKFLOW_RUN_CONCLUSION_CODES, WorkflowRunArrays
+
+BENCHMARK_NUM_RUNS = [1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+BENCHMARK_NUM_PROJECTS = [1_000]
+BENCHMARK_FAILURE_RATES = [0.2]
+BENCHMARK_MAX_WORKFLOWS_PER_PROJECT = 3
+BENCHMARK_END_SECS = 1614988800  # 2021-03-06T00:00:00Z
+
+KERNEL_NAMES = [
+    'build_workflow_durations',
+    'get_workflow_failure_timedeltas',
+    'print_timedelta_stats',
+    'build_boxplots_by_size_for_langs'
+]
+
+
+class KernelMeasurement:
+    """
+    Accumulates the time taken by every call of a kernel, or, while `tracemalloc` is tracing,
+    the peak memory held by the kernel, ie. the memory still held from its previous calls plus
+    the peak memory allocated during the current call.
+    """
+
+    def __init__(self):
+        self.secs = 0.0
+        self.retained_bytes = 0
+        self.peak_bytes = 0
+
+    @contextmanager
+    def measure(self) -> Iterator[None]:
+        is_tracing = tracemalloc.is_tracing()
+        if is_tracing:
+            # NOTE: Only allocations made after clearing are traced, ie. those of this call
+            tracemalloc.clear_traces()
+        start_secs = time.perf_counter()
+        yield
+        self.secs += time.perf_counter() - start_secs
+        if is_tracing:
+            current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+            self.peak_bytes = max(self.peak_bytes, self.retained_bytes + peak_bytes)
+            self.retained_bytes += current_bytes
+
+
+def generate_projects(num_projects: int, seed: int) -> Projects:
+    """Generate unencoded projects (ie. with repo_id strs `1` to `num_projects`), in any language."""
+    rng = np.random.default_rng(seed)
+    languages = rng.choice(SUPPORTED_LANGUAGES, num_projects)
+    return [
+        {'id': str(i + 1), 'owner': 'benchmark', 'name': f"project{i + 1}", 'language': language}
+        for i, language in enumerate(languages.tolist())
+    ]
+
+
+def write_member_count_index(projects: Projects, seed: int) -> None:
+    """
+    Write a member count index for the given projects to `PROJECT_MEMBER_COUNTS_PATH` (relative
+    to the working folder), such that every member count size is represented.
+    """
+    rng = np.random.default_rng(seed)
+    repo_ids = np.array([int(p['id']) for p in projects], dtype=np.int64)
+    member_counts = np.minimum(rng.geometric(0.3, len(repo_ids)) + 1, 50)
+    os.makedirs(os.path.dirname(PROJECT_MEMBER_COUNTS_PATH), exist_ok=True)
+    np.save(PROJECT_MEMBER_COUNTS_PATH, np.column_stack((repo_ids, member_counts)))
+
+
+def split_num_runs(num_runs: int, num_projects: int, seed: int) -> np.ndarray:
+    """Split a number of runs unevenly (ie. some projects are far more active) over projects."""
+    rng = np.random.default_rng(seed)
+    return rng.multinomial(num_runs, rng.dirichlet(np.full(num_projects, 0.5)))
+
+
+def generate_workflow_run_arrays(num_runs: int, failure_rate: float,
+                                 rng: np.random.Generator) -> WorkflowRunArrays:
+    """
+    Generate the runs of a single workflow, newest first, in the same format as they are loaded
+    from the workflow runs store (see `load_workflow_run_arrays`). Each run fails with the given
+    probability, and a few runs are still in progress.
+    """
+    gaps = rng.exponential(rng.uniform(3600, 3 * 86400), num_runs).astype(np.int64) + 60
+    created_at = BENCHMARK_END_SECS - np.cumsum(gaps)
+    updated_at = created_at + rng.lognormal(5.5, 0.8, num_runs).astype(np.int64)
+    commit_timestamps = created_at - rng.integers(1, 120, num_runs)
+    is_failure = rng.random(num_runs) < failure_rate
+    is_completed = rng.random(num_runs) >= 0.01
+    conclusion_codes = np.where(
+        is_failure, WORKFLOW_RUN_CONCLUSION_CODES['failure'], WORKFLOW_RUN_CONCLUSION_CODES['success'])
+    return {
+        'is_empty': np.zeros(num_runs, dtype=bool),
+        'is_completed': is_completed,
+        'conclusion_code': np.where(is_completed, conclusion_codes, -1).astype(np.int8),
+        'has_run_timestamps': np.ones(num_runs, dtype=bool),
+        'created_at': created_at,
+        'updated_at': updated_at,
+        'has_commit_timestamp': np.ones(num_runs, dtype=bool),
+        'commit_timestamp': commit_timestamps
+    }
+
+
+def generate_project_workflow_runs(num_runs: int, failure_rate: float, seed: int,
+                                   project_idx: int) -> Dict[str, WorkflowRunArrays]:
+    """Generate the runs of each workflow of a project, spread over 1-3 workflows."""
+    rng = np.random.default_rng([seed, project_idx])
+    num_workflows = int(rng.integers(1, BENCHMARK_MAX_WORKFLOWS_PER_PROJECT + 1))
+    num_runs_by_workflow = rng.multinomial(num_runs, np.full(num_workflows, 1 / num_workflows))
+    return {
+        str(i): generate_workflow_run_arrays(int(n), failure_rate, rng)
+        for i, n in enumerate(num_runs_by_workflow.tolist())
+    }
+
+
+def measure_kernels(projects: Projects, num_runs_by_project: np.ndarray, failure_rate: float,
+                    seed: int) -> Dict[str, KernelMeasurement]:
+    """Run every kernel once over all projects, measuring each kernel (see `KernelMeasurement`)."""
+    measurements = {name: KernelMeasurement() for name in KERNEL_NAMES}
+    build_duration_analysis = BuildDurationAnalysis(None)
+    broken_build_analysis = BrokenBuildDurationAnalysis(None)
+
+    for i, (project, num_runs) in enumerate(zip(projects, num_runs_by_project.tolist())):
+        workflow_run_arrays_by_idx = generate_project_workflow_runs(
+            num_runs, failure_rate, seed, i)
+        with measurements['build_workflow_durations'].measure():
+            build_duration_analysis.consume_project(project['id'], workflow_run_arrays_by_idx)
+        with measurements['get_workflow_failure_timedeltas'].measure():
+            broken_build_analysis.consume_project(project['id'], workflow_run_arrays_by_idx)
+        del workflow_run_arrays_by_idx
+
+    for durations_by_proj in [build_duration_analysis.workflow_durations_by_proj,
+                              broken_build_analysis.failure_durations_by_proj]:
+        all_durations = concatenate_arrays(list(durations_by_proj.values()))
+        if len(all_durations) > 0:
+            with measurements['print_timedelta_stats'].measure():
+                print_timedelta_stats('Benchmark', all_durations)
+        del all_durations
+        with measurements['build_boxplots_by_size_for_langs'].measure():
+            build_timedelta_boxplots_by_size_for_langs(
+                projects, durations_by_proj, lambda language, data, output_filename: None,
+                'benchmark', 'minutes')
+    return measurements
+
+
+def run_analyze_benchmark(num_runs: int, num_projects: int, failure_rate: float, seed: int,
+                          measure_memory: bool = True) -> Dict[str, Any]:
+    """
+    Benchmark every kernel against the given number of runs, spread over the given number of
+    projects (at most one project per run). Example return value:
+    ```
+    {
+        'num_runs': 100000,
+        'num_projects': 1000,
+        'failure_rate': 0.2,
+        'kernels': {
+            'build_workflow_durations': {'secs': 0.41, 'runs_per_sec': 243902.4, 'peak_mem_bytes': 4849664},
+            ...
+        }
+    }
+    ```
+    """
+    num_projects = min(num_projects, num_runs)
+    print(
+        f"[!] Benchmarking analysis kernels at {num_runs} runs, {num_projects} projects, {failure_rate} failure rate")
+    projects = generate_projects(num_projects, seed)
+    num_runs_by_project = split_num_runs(num_runs, num_projects, seed)
+
+    with tempfile.TemporaryDirectory() as work_folder:
+        cwd = os.getcwd()
+        os.chdir(work_folder)
+        try:
+            write_member_count_index(projects, seed)
+            with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                timings = measure_kernels(projects, num_runs_by_project, failure_rate, seed)
+                memory_usages = None
+                if measure_memory:
+                    tracemalloc.start()
+                    try:
+                        memory_usages = measure_kernels(
+                            projects, num_runs_by_project, failure_rate, seed)
+                    finally:
+                        tracemalloc.stop()
+        finally:
+            os.chdir(cwd)
+
+    kernels = {}
+    print(f"{'kernel':<36}{'time':>11}{'peak mem':>12}")
+    for name in KERNEL_NAMES:
+        secs = timings[name].secs
+        kernels[name] = {
+            'secs': round(secs, 4),
+            'runs_per_sec': round(num_runs / secs, 1) if secs > 0 else None,
+            'peak_mem_bytes': memory_usages[name].peak_bytes if memory_usages is not None else None
+        }
+        peak_mem_mb = f"{kernels[name]['peak_mem_bytes'] / 2**20:.1f}MB" \
+            if measure_memory else '-'
+        print(f"{name:<36}{secs:>10.4f}s{peak_mem_mb:>12}")
+    print()
+
+    return {
+        'num_runs': num_runs,
+        'num_projects': num_projects,
+        'failure_rate': failure_rate,
+        'kernels': kernels
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the analysis kernels')
+    parser.add_argument('--num-runs', type=int, nargs='+', default=BENCHMARK_NUM_RUNS)
+    parser.add_argument('--num-projects', type=int, nargs='+', default=BENCHMARK_NUM_PROJECTS)
+    parser.add_argument('--failure-rates', type=float, nargs='+', default=BENCHMARK_FAILURE_RATES)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--skip-memory', action='store_true',
+                        help="Don't measure peak memory (which takes a second, slower pass)")
+    parser.add_argument('--output', default=None, help='Path of the JSON results file')
+    args = parser.parse_args()
+
+    output_path = args.output or \
+        f"{RESULTS_FOLDER}/benchmark_analyze_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    results: List[Dict[str, Any]] = [
+        run_analyze_benchmark(num_runs, num_projects, failure_rate, args.seed,
+                              not args.skip_memory)
+        for num_runs, num_projects, failure_rate in itertools.product(
+            args.num_runs, args.num_projects, args.failure_rates)
+    ]
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    write_dict_to_json_file({'seed': args.seed, 'runs': results}, output_path)
+    print(f"Wrote benchmark results to {output_path}")
@@ -0,0 +1,182 @@
+"""
+End-to-end benchmark of the whole experiment, run against synthetic fixtures rather than GHTorrent
+and the real APIs. For each scale (ie. number of GHTorrent projects), a synthetic GHTorrent
+snapshot is generated (see `fixtures.py`), a stub API server is started (see `stub_server.py`),
+and `main.py` is run from scratch in its own working folder. The performance report of each run
+(see `metrics.py`) is summarized as the throughput of each stage, and all summaries are written to
+a single JSON file. Usage:
+```
+python benchmark_pipeline.py --scales 1000 10000 100000 --latency-scale 1.0
+```
+"""
+
+import argparse
+import glob
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+from config import RESULTS_FOLDER
+from data_io import read_dict_from_json_file, write_dict_to_json_file
+from fixtures import generate_ghtorrent_fixture
+
+BENCHMARK_SCALES = [1_000, 10_000, 100_000]
+BENCHMARK_WORK_FOLDER = 'benchmark_pipeline'
+BENCHMARK_STUB_PORT = 8800
+BENCHMARK_STUB_STARTUP_SECS = 10
+
+PACKAGE_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+
+def wait_for_port(port: int, timeout_secs: float) -> None:
+    """Wait until a server is accepting connections on a localhost port."""
+    deadline = time.time() + timeout_secs
+    while True:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            if time.time() >= deadline:
+                raise
+            time.sleep(0.1)
+
+
+def summarize_metrics_report(report: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Summarize the performance report of a run as the throughput of each stage, ie. the number of
+    rows (eg. projects) and requests it processed per second. Example return value:
+    ```
+    [
+        {
+            'name': 'filter_forked_projects',
+            'wall_secs': 1.2,
+            'cpu_secs': 1.1,
+            'rows_in': 40000,
+            'rows_out': 32000,
+            'rows_per_sec': 33333.3,
+            'requests': 0,
+            'requests_per_sec': 0.0,
+            'bytes_downloaded': 0
+        },
+        ...
+    ]
+    ```
+    """
+    summary = []
+    for stage in report['stages']:
+        wall_secs = max(stage['wall_secs'], 0.001)
+        num_requests = sum(r['count'] for r in stage['requests'].values())
+        summary.append({
+            'name': stage['name'],
+            'wall_secs': stage['wall_secs'],
+            'cpu_secs': stage['cpu_secs'],
+            'rows_in': stage['rows_in'],
+            'rows_out': stage['rows_out'],
+            'rows_per_sec': round(stage['rows_in'] / wall_secs, 1)
+            if stage['rows_in'] is not None else None,
+            'requests': num_requests,
+            'requests_per_sec': round(num_requests / wall_secs, 1),
+            'bytes_downloaded': stage['bytes_downloaded']
+        })
+    return summary
+
+
+def print_stage_summary(num_projects: int, summary: List[Dict[str, Any]]) -> None:
+    print(f"[!] Throughput per stage at {num_projects} projects")
+    print(f"{'stage':<40}{'wall (s)':>10}{'cpu (s)':>10}{'rows in':>10}{'rows/s':>12}{'reqs/s':>10}")
+    for stage in summary:
+        rows_in = stage['rows_in'] if stage['rows_in'] is not None else '-'
+        rows_per_sec = stage['rows_per_sec'] if stage['rows_per_sec'] is not None else '-'
+        print(
+            f"{stage['name']:<40}{stage['wall_secs']:>10}{stage['cpu_secs']:>10}{rows_in:>10}{rows_per_sec:>12}{stage['requests_per_sec']:>10}")
+    print()
+
+
+def run_pipeline_benchmark(num_projects: int, work_folder: str, port: int, seed: int,
+                           latency_scale: float) -> Dict[str, Any]:
+    """
+    Run the whole experiment from scratch against a synthetic fixture of the given number of
+    projects, in the given (emptied) working folder. The output of `main.py` is written to
+    `main.log` in the working folder. A dict summarizing the run is returned.
+    """
+    print(f"[!] Benchmarking the experiment at {num_projects} projects in {work_folder}")
+    shutil.rmtree(work_folder, ignore_errors=True)
+    ghtorrent_folder = os.path.join(work_folder, 'ghtorrent')
+    generate_ghtorrent_fixture(ghtorrent_folder, num_projects, seed)
+
+    stub_server = subprocess.Popen([
+        sys.executable, os.path.join(PACKAGE_FOLDER, 'stub_server.py'),
+        '--port', str(port), '--seed', str(seed), '--latency-scale', str(latency_scale)
+    ], stdout=subprocess.DEVNULL)
+    try:
+        wait_for_port(port, BENCHMARK_STUB_STARTUP_SECS)
+        stub_url = f"http://127.0.0.1:{port}"
+        env = dict(
+            os.environ,
+            ghtorrent_path=f"{os.path.abspath(ghtorrent_folder)}/",
+            api_username='benchmark',
+            api_password='benchmark',
+            github_base_url=stub_url,
+            coveralls_base_url=stub_url
+        )
+        start_secs = time.perf_counter()
+        with open(os.path.join(work_folder, 'main.log'), 'w') as log_file:
+            exit_code = subprocess.call(
+                [sys.executable, '-u', os.path.join(PACKAGE_FOLDER, 'main.py')],
+                cwd=work_folder, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+        wall_secs = time.perf_counter() - start_secs
+    finally:
+        stub_server.terminate()
+        stub_server.wait()
+
+    report_paths = sorted(glob.glob(os.path.join(work_folder, RESULTS_FOLDER, 'metrics_*.json')))
+    if exit_code != 0 or len(report_paths) == 0:
+        print(f"ERROR: Experiment at {num_projects} projects failed, see {work_folder}/main.log")
+        return {'num_projects': num_projects, 'wall_secs': wall_secs, 'failed': True}
+
+    summary = summarize_metrics_report(read_dict_from_json_file(report_paths[-1]))
+    print_stage_summary(num_projects, summary)
+    return {
+        'num_projects': num_projects,
+        'wall_secs': round(wall_secs, 3),
+        'failed': False,
+        'stages': summary
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the whole experiment against synthetic fixtures')
+    parser.add_argument('--scales', type=int, nargs='+', default=BENCHMARK_SCALES,
+                        help='Numbers of GHTorrent projects to benchmark')
+    parser.add_argument('--work-folder', default=BENCHMARK_WORK_FOLDER,
+                        help='Folder in which each run gets its own (emptied) working folder')
+    parser.add_argument('--port', type=int, default=BENCHMARK_STUB_PORT)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency-scale', type=float, default=1.0,
+                        help='Factor by which to scale the latency of the stub API')
+    parser.add_argument('--output', default=None, help='Path of the JSON results file')
+    args = parser.parse_args()
+
+    output_path = args.output or \
+        f"{RESULTS_FOLDER}/benchmark_pipeline_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    results = {
+        'seed': args.seed,
+        'latency_scale': args.latency_scale,
+        'runs': [
+            run_pipeline_benchmark(
+                num_projects,
+                os.path.join(args.work_folder, f"projects_{num_projects}"),
+                args.port,
+                args.seed,
+                args.latency_scale
+            )
+            for num_projects in args.scales
+        ]
+    }
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    write_dict_to_json_file(results, output_path)
+    print(f"Wrote benchmark results to {output_path}")
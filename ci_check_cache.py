@@ -0,0 +1,62 @@
+"""
+Workflows are checked for CI usage (see `workflows.get_workflows_using_ci`) based only on their
+YAML text, and many projects share identical workflows (eg. copied from starter workflows). The
+result of checking each distinct (normalized) workflow text is therefore cached, in an
+append-only file of JSON lines, where each line holds the hash of a workflow text, whether it uses
+CI, and which build tools its run commands use (see `run_commands.BUILD_TOOL_CMDS`). Results
+depend on the build command regex, so each set of regex is cached in its own file, named by its
+fingerprint. Example `data/ci_check_cache/5d41402abc4b2a76.jsonl`:
+
+{"key": "3f2a...", "uses_ci": true, "build_tools": ["npm"]}
+{"key": "9bc0...", "uses_ci": false, "build_tools": []}
+...
+"""
+
+import hashlib
+import json
+import os
+from typing import Any, Dict
+from config import CI_CHECK_CACHE_FOLDER
+from run_commands import BUILD_TOOL_CMDS
+
+CICheckCache = Dict[str, Dict[str, Any]]
+
+# Identifies the current set of build command regex (and the build tool each belongs to)
+BUILD_TOOL_CMDS_FINGERPRINT = hashlib.sha256(
+    json.dumps(BUILD_TOOL_CMDS, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def encode_ci_check_cache_key(workflow_text: str) -> str:
+    """Encode the cache key for a (normalized) workflow text. A hex digest str is returned."""
+    return hashlib.sha256(workflow_text.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+def encode_ci_check_cache_path() -> str:
+    return f"{CI_CHECK_CACHE_FOLDER}/{BUILD_TOOL_CMDS_FINGERPRINT}.jsonl"
+
+
+def load_ci_check_cache() -> CICheckCache:
+    """
+    Load all cached results for the current build command regex into a dict mapping cache key to
+    result. A partially written last line (eg. if execution was interrupted) is ignored.
+    """
+    cache = {}
+    cache_path = encode_ci_check_cache_path()
+    if os.path.isfile(cache_path):
+        with open(cache_path) as infile:
+            for line in infile:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"WARNING: Ignoring incomplete entry in {cache_path}")
+                    continue
+                cache[entry.pop('key')] = entry
+    return cache
+
+
+def append_to_ci_check_cache(results: CICheckCache) -> None:
+    """Append results (a dict mapping cache key to result) to the cache for the current regex."""
+    os.makedirs(CI_CHECK_CACHE_FOLDER, exist_ok=True)
+    with open(encode_ci_check_cache_path(), 'a') as outfile:
+        for key, result in results.items():
+            outfile.write(json.dumps({'key': key, **result}) + '\n')
@@ -3,13 +3,35 @@ import math
 DATA_FOLDER = 'data'
 RESULTS_FOLDER = 'results'
 NUM_MEMBER_PARTITIONS = 10
-NUM_WORKFLOW_PARTITIONS = 1500
-NUM_YAML_PARTITIONS = 100
-NUM_PARTITIONS_DEFAULT_BRANCH = 60
+NUM_SCAN_WORKERS = 8
+NUM_CI_CHECK_WORKERS = 8
+CI_CHECK_SHARD_SIZE = 500
+PROJECTS_FILE_FORMAT = 'parquet'  # Either 'parquet', 'feather' or 'csv'
+PROJECT_MEMBER_COUNTS_PATH = f"{DATA_FOLDER}/project_member_counts.npy"
+PROJECT_MEMBER_COUNTS_SOURCE_PATH = f"{DATA_FOLDER}/project_member_counts_source.json"
+PROJECT_MEMBERS_CHUNK_SIZE = 10_000_000
+WORKFLOW_BATCH_SIZE = 300
+YAML_BATCH_SIZE = 400
+DEFAULT_BRANCH_BATCH_SIZE = 100
+GRAPHQL_MIN_BATCH_SIZE = 1
+GRAPHQL_MAX_BATCH_SIZE = 2000
+GRAPHQL_TARGET_LATENCY_SECS = 5
+GRAPHQL_MAX_QUERY_COST = 100
 NUM_WORKFLOW_RUNS = 500
 NUM_REQUIRED_WORKFLOW_RUNS = 100
 MAX_GITHUB_RESULTS_PER_PAGE = 100
 NUM_PAGES = NUM_WORKFLOW_RUNS / MAX_GITHUB_RESULTS_PER_PAGE
+HTTP_POOL_SIZE = 10
+USE_HTTP_CACHE = True
+HTTP_CACHE_FOLDER = f"{DATA_FOLDER}/http_cache"
+GRAPHQL_CACHE_FOLDER = f"{DATA_FOLDER}/graphql_cache"
+CI_CHECK_CACHE_FOLDER = f"{DATA_FOLDER}/ci_check_cache"
+API_TRAFFIC_FOLDER = f"{DATA_FOLDER}/api_traffic"
+MAX_IN_FLIGHT_REQUESTS = 10
+NUM_WORKFLOW_RUN_WORKERS = 10
+RATE_LIMIT_WINDOW_SECS = 3600
+RATE_LIMIT_RESERVE = 10
+SECONDARY_RATE_LIMIT_WAIT_SECS = 60
 
 MEMBER_COUNT_SIZES = [
     'Very Small', 'Small', 'Medium', 'Large', 'Very Large'
@@ -1,11 +1,10 @@
 import os
-from datetime import datetime
 from typing import Any, Dict
 from base_api_client import get_from_url
 from data_io import OutputFile, write_dict_to_json_file
+from timestamps import parse_iso8601_timestamps
 
 COVERALLS_BASE_URL = os.environ['coveralls_base_url']
-COVERALLS_DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
 
 
 def get_from_coveralls(slug: str, output_filename: OutputFile = None):
@@ -55,13 +54,13 @@ def get_coveralls_report_for_github_repo(owner: str, repo: str, page: int = 1,
 
 
 def get_latest_coveralls_report_in_date_range(owner: str, repo: str, branch: str,
-                                              min_date: datetime, max_date: datetime,
+                                              min_date: int, max_date: int,
                                               max_pages: int = 10,
                                               output_filename: OutputFile = None) -> Dict[str, Any]:
     """
     Get the latest Coveralls code coverage report created for a given GitHub repo within a
-    given time period. A dict is returned, which will be empty if no such report exists. Example
-    return value:
+    given time period (in epoch seconds, inclusive). A dict is returned, which will be empty if
+    no such report exists. Example return value:
     ```
     {
         "created_at": "2018-01-30T20:05:10Z",
@@ -90,10 +89,9 @@ def get_latest_coveralls_report_in_date_range(owner: str, repo: str, branch: str
             if 'builds' in reports and len(reports['builds']) > 0:
                 # Since page / build list traversal is chronologically descending, return first match
                 # Only consider builds for the specified branch and date range
-                for build in reports['builds']:
-                    build_date = datetime.strptime(
-                        build['created_at'], COVERALLS_DATE_FORMAT)
-
+                build_dates = parse_iso8601_timestamps(
+                    [build['created_at'] for build in reports['builds']]).tolist()
+                for build, build_date in zip(reports['builds'], build_dates):
                     if build_date >= min_date:
                         if build['branch'] == branch and build_date <= max_date:
                             return build
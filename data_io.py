@@ -1,15 +1,31 @@
 import json
+import os
+import re
+import threading
 import yaml
 import pandas as pd
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 OutputFile = Optional[str]
 
+# Size of each read when incrementally reading a JSON file (see `iter_items_from_json_file`)
+JSON_READ_CHUNK_SIZE = 1 << 20
+JSON_WHITESPACE_REGEX = re.compile(r"[ \t\n\r]*")
+JSON_DELIMITERS = ' \t\n\r,:]}'
+
+# Parse YAML with libyaml when PyYAML was built with it, since it is much faster than the pure
+# Python loader (which is still used to re-parse any YAML that libyaml rejects)
+YAML_BASE_LOADER = getattr(yaml, 'CBaseLoader', yaml.BaseLoader)
+
 
 def write_dict_to_json_file(res_json: Any, output_filename: OutputFile = None) -> None:
+    # NOTE: Write to a temporary file first, so an interrupted write never leaves a partial file
+    # behind (many stages skip work whose output file already exists)
     if output_filename is not None:
-        with open(output_filename, 'w') as f:
+        temp_filename = f"{output_filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_filename, 'w') as f:
             json.dump(res_json, f)
+        os.replace(temp_filename, output_filename)
 
 
 def read_dict_from_json_file(json_file_path: str) -> Dict:
@@ -17,6 +33,87 @@ def read_dict_from_json_file(json_file_path: str) -> Dict:
         return json.load(infile)
 
 
+def write_items_to_json_file(items: Iterable[Tuple[str, Any]],
+                             output_filename: OutputFile = None) -> None:
+    """
+    Incrementally write (key, value) pairs as the items of a single top-level JSON object. The
+    file is identical to the one written by `write_dict_to_json_file` for a dict of the same
+    items, but only one value is held in memory at a time (ie. if `items` is a generator).
+    """
+    if output_filename is not None:
+        temp_filename = f"{output_filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_filename, 'w') as f:
+            f.write('{')
+            for i, (key, value) in enumerate(items):
+                f.write(f"{', ' if i > 0 else ''}{json.dumps(key)}: {json.dumps(value)}")
+            f.write('}')
+        os.replace(temp_filename, output_filename)
+
+
+def iter_items_from_json_file(json_file_path: str) -> Iterator[Tuple[str, Any]]:
+    """
+    Incrementally read a JSON file containing a single top-level object (eg. one written by
+    `write_dict_to_json_file`), yielding its (key, value) pairs in order. Only the value being
+    decoded is held in memory, rather than the entire object.
+    """
+    decoder = json.JSONDecoder()
+    with open(json_file_path) as infile:
+        buf, pos = infile.read(JSON_READ_CHUNK_SIZE), 0
+
+        def read_more(read_size: int = JSON_READ_CHUNK_SIZE) -> bool:
+            # Discard the consumed part of the buffer, then append the next part of the file
+            nonlocal buf, pos
+            more = infile.read(read_size)
+            buf, pos = buf[pos:] + more, 0
+            return len(more) > 0
+
+        def skip_to_token() -> str:
+            nonlocal pos
+            while True:
+                pos = JSON_WHITESPACE_REGEX.match(buf, pos).end()
+                if pos < len(buf):
+                    return buf[pos]
+                if not read_more():
+                    raise json.JSONDecodeError('Unexpected end of file', buf, pos)
+
+        def expect_token(tokens: str) -> str:
+            nonlocal pos
+            token = skip_to_token()
+            if token not in tokens:
+                raise json.JSONDecodeError(f"Expecting one of '{tokens}'", buf, pos)
+            pos += 1
+            return token
+
+        def decode_value() -> Any:
+            # A value must be followed by a delimiter, else it may have been cut off mid-read (eg.
+            # `12` may be the start of `12.5e3`)
+            nonlocal pos
+            skip_to_token()
+            read_size = JSON_READ_CHUNK_SIZE
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buf, pos)
+                    if end < len(buf) and buf[end] in JSON_DELIMITERS:
+                        pos = end
+                        return value
+                except json.JSONDecodeError:
+                    pass
+                if not read_more(read_size):
+                    value, pos = decoder.raw_decode(buf, pos)
+                    return value
+                read_size *= 2
+
+        expect_token('{')
+        if skip_to_token() == '}':
+            return
+        while True:
+            key = decode_value()
+            expect_token(':')
+            yield key, decode_value()
+            if expect_token(',}') == '}':
+                return
+
+
 def write_str_to_yaml_file(res_yaml: str, output_filename: OutputFile = None) -> None:
     if output_filename is not None:
         with open(output_filename, 'w') as outfile:
@@ -24,6 +121,13 @@ def write_str_to_yaml_file(res_yaml: str, output_filename: OutputFile = None) ->
 
 
 def read_dict_from_yaml_str(yaml_str: str) -> Optional[Dict[str, Any]]:
+    if YAML_BASE_LOADER is not yaml.BaseLoader:
+        try:
+            yaml_dict = yaml.load(yaml_str, Loader=YAML_BASE_LOADER)
+            return yaml_dict if type(yaml_dict) is dict else None
+        except yaml.YAMLError:
+            pass
+
     try:
         yaml_dict = yaml.load(yaml_str, Loader=yaml.BaseLoader)
         if type(yaml_dict) is dict:
@@ -42,14 +146,42 @@ def write_df_to_csv_file(df: pd.DataFrame, output_filename: OutputFile = None,
 
 
 def read_df_from_csv_file(csv_file_path: str, column_names: Optional[List[str]] = None,
-                          expect_index_col: Optional[bool] = False) -> pd.DataFrame:
+                          expect_index_col: Optional[bool] = False,
+                          columns: Optional[List[str]] = None,
+                          dtype: Optional[Dict[str, str]] = None) -> pd.DataFrame:
     return pd.read_csv(
         csv_file_path,
         index_col=expect_index_col,
-        names=column_names
+        names=column_names,
+        usecols=columns,
+        dtype=dtype
     )
 
 
+def write_df_to_parquet_file(df: pd.DataFrame, output_filename: OutputFile = None) -> None:
+    if output_filename is not None:
+        temp_filename = f"{output_filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+        df.to_parquet(temp_filename, index=False)
+        os.replace(temp_filename, output_filename)
+
+
+def read_df_from_parquet_file(parquet_file_path: str,
+                              columns: Optional[List[str]] = None) -> pd.DataFrame:
+    return pd.read_parquet(parquet_file_path, columns=columns)
+
+
+def write_df_to_feather_file(df: pd.DataFrame, output_filename: OutputFile = None) -> None:
+    if output_filename is not None:
+        temp_filename = f"{output_filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+        df.reset_index(drop=True).to_feather(temp_filename)
+        os.replace(temp_filename, output_filename)
+
+
+def read_df_from_feather_file(feather_file_path: str,
+                              columns: Optional[List[str]] = None) -> pd.DataFrame:
+    return pd.read_feather(feather_file_path, columns=columns)
+
+
 def write_series_to_json_file(series: pd.Series, output_filename: OutputFile = None,
                               write_index_col: Optional[bool] = True) -> None:
     if output_filename is not None:
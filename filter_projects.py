@@ -6,38 +6,53 @@
 #
 
 import os
-from typing import List
+import numpy as np
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
 from branches import load_default_branches
 from config import (
     NUM_MEMBER_PARTITIONS,
     NUM_REQUIRED_WORKFLOW_RUNS,
-    NUM_WORKFLOW_PARTITIONS,
-    NUM_YAML_PARTITIONS
+    NUM_SCAN_WORKERS,
+    WORKFLOW_BATCH_SIZE
 )
+from metrics import record_rows
 from github_api_client import (
-    combine_partitioned_workflow_filenames,
-    get_workflow_files_partitioned,
-    get_workflows_for_repos
+    build_graphql_query_workflow_filenames,
+    get_workflow_files_batched,
+    import_legacy_graphql_responses,
+    parse_graphql_query_workflow_filenames,
+    run_graphql_queries_batched
 )
 from projects import (
-    GHTORRENT_PATH,
     NULL_SYMBOL,
+    PROJECTS_SPLIT_PATHS,
     load_full_projects,
-    load_original_project_members,
+    load_project_member_counts,
     load_projects,
-    load_projects_and_partition,
     save_full_projects_df
 )
 from workflows import (
-    encode_workflow_runs_path,
+    count_workflow_runs,
     get_workflows_using_ci,
-    load_workflow_runs,
     load_workflows,
+    open_workflow_runs_store,
     save_workflows
 )
 
 
+def filter_projects_split(projects_path: str, repo_ids: np.ndarray) -> Tuple[int, pd.DataFrame]:
+    """
+    Load a single GHTorrent projects split, retaining only projects whose repo_id is in the given
+    array. Runs in a worker process, so that only the (much smaller) filtered projects need to be
+    sent back. A tuple is returned, containing the number of projects in the split and the
+    filtered projects.
+    """
+    projects_df = load_full_projects(projects_path, quiet=True)
+    return projects_df.shape[0], projects_df[projects_df.repo_id.isin(repo_ids)]
+
+
 def get_initial_projects(output_projects_path: str):
     print("[!] Building initial set of projects by cross-referencing project members")
 
@@ -46,43 +61,33 @@ def get_initial_projects(output_projects_path: str):
         return
 
     # Load project_members and determine project membership count
-    project_members_df = load_original_project_members()
-    repo_member_counts = project_members_df['repo_id'].value_counts()
+    repo_member_counts = load_project_member_counts()
 
     # Filter out projects that don't have more than a single member (which is most)
     repos_gte2 = repo_member_counts[repo_member_counts >= 2]
     repos_gte2 = repos_gte2.index.values
-    project_members_df = project_members_df[project_members_df.repo_id.isin(
-        repos_gte2)]
     num_removed = len(repo_member_counts) - len(repos_gte2)
     print(
         f"Removed {num_removed}/{len(repo_member_counts)} projects that have < 2 members")
 
-    filtered_projects_df = None
-    ghtorrent_projects_count = 0
-
-    for i in range(NUM_MEMBER_PARTITIONS):
-        # Load current partition of GHTorrent projects
-        print(
-            f"Loading GHTorrent projects (partition {i+1}/{NUM_MEMBER_PARTITIONS})...")
-        projects_path = f"{GHTORRENT_PATH}projects_split{i}.csv"
-        projects_df = load_full_projects(projects_path, quiet=True)
-        ghtorrent_projects_count += projects_df.shape[0]
-
-        # Remove projects whom do not have adequate project membership
-        projects_df = projects_df[projects_df.repo_id.isin(
-            project_members_df['repo_id'])]
-
-        # Add to running DataFrame
-        if filtered_projects_df is not None:
-            filtered_projects_df = pd.concat(
-                [filtered_projects_df, projects_df])
-        else:
-            filtered_projects_df = projects_df
-
+    # Load all partitions of GHTorrent projects in parallel, removing projects whom do not have
+    # adequate project membership
+    num_workers = min(NUM_SCAN_WORKERS, NUM_MEMBER_PARTITIONS)
+    print(
+        f"Loading {NUM_MEMBER_PARTITIONS} GHTorrent project partitions ({num_workers} workers)...")
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        results = list(executor.map(
+            filter_projects_split,
+            PROJECTS_SPLIT_PATHS,
+            [repos_gte2] * len(PROJECTS_SPLIT_PATHS)
+        ))
+
+    ghtorrent_projects_count = sum(count for count, _ in results)
+    filtered_projects_df = pd.concat([projects_df for _, projects_df in results])
     print(f"[!] {ghtorrent_projects_count} GHTorrent projects were reduced to {filtered_projects_df.shape[0]}")
+    record_rows(ghtorrent_projects_count, filtered_projects_df.shape[0])
 
-    # Concatenate all partitioned projects that passed the filter
+    # Save all partitioned projects that passed the filter
     save_full_projects_df(filtered_projects_df, output_projects_path)
     print(f"[!] Done building initial set of projects")
 
@@ -100,6 +105,7 @@ def filter_forked_projects(input_projects_path: str, output_projects_path: str):
     projects_df = projects_df[projects_df['forked_from'] == NULL_SYMBOL]
     print(
         f"{num_projects_before} projects were reduced to {projects_df.shape[0]}")
+    record_rows(num_projects_before, projects_df.shape[0])
     save_full_projects_df(projects_df, output_projects_path)
     print("[!] Done filtering out forked projects")
 
@@ -121,6 +127,7 @@ def filter_projects_by_lang(supported_languages: List[str], input_projects_path:
 
     print(
         f"{num_projects_before} projects were reduced to {projects_df.shape[0]}")
+    record_rows(num_projects_before, projects_df.shape[0])
     save_full_projects_df(projects_df, output_projects_path)
     print("[!] Done filtering out projects that use an unsupported language")
 
@@ -135,25 +142,20 @@ def filter_by_workflow_files(input_projects_path: str, output_projects_path: str
             f"[!] {output_projects_path} and {output_workflows_path} already exist, skipping...")
         return
 
-    # Partition the projects, then query for workflows contained in the projects of each partition
-    repos_partitions = load_projects_and_partition(
-        input_projects_path, NUM_WORKFLOW_PARTITIONS)
+    # Query for workflows contained in each project, in batches (skipping those already cached)
+    repos = load_projects(input_projects_path)
+    print(f"Finding GitHub Actions workflows in {len(repos)} projects...")
+    import_legacy_graphql_responses(output_workflows_prefix, repos, 'workflow_filenames')
+    query_response = run_graphql_queries_batched(
+        repos,
+        lambda r: build_graphql_query_workflow_filenames(r['id'], r['owner'], r['name']),
+        WORKFLOW_BATCH_SIZE,
+        'workflow_filenames'
+    )
 
-    # Get workflows for projects in each partition, if not already cached
-    for i in range(0, len(repos_partitions)):
-        print(
-            f"Finding GitHub Actions workflows in projects (partition {i+1}/{NUM_WORKFLOW_PARTITIONS})...")
-        actions_output_path = f"{output_workflows_prefix}_split{i}.json"
-        if not os.path.isfile(actions_output_path):
-            repos_partition = repos_partitions[i]
-            get_workflows_for_repos(
-                repos_partition.tolist(), actions_output_path)
-
-    # Parse and combine responses
-    query_responses = [
-        f"{output_workflows_prefix}_split{i}.json" for i in range(NUM_WORKFLOW_PARTITIONS)]
-    project_workflows_dict = combine_partitioned_workflow_filenames(
-        query_responses)
+    # Parse the combined response
+    project_workflows_dict = parse_graphql_query_workflow_filenames(
+        query_response)
 
     # Load full version of unpartitioned input projects
     projects_df = load_full_projects(input_projects_path, quiet=True)
@@ -167,6 +169,7 @@ def filter_by_workflow_files(input_projects_path: str, output_projects_path: str
         f"There are {len(remaining_repo_ids)} projects with at least 1 GitHub Actions workflow")
     print(
         f"{num_projects_before} projects were reduced to {projects_df.shape[0]}")
+    record_rows(num_projects_before, projects_df.shape[0])
 
     # Write the remaining projects and their found workflows to output files
     save_full_projects_df(projects_df, output_projects_path)
@@ -190,30 +193,28 @@ def filter_by_using_ci(input_projects_path: str, output_projects_path: str,
     project_workflows_dict = load_workflows(input_workflow_filenames_path)
 
     # Create augmented dict containing workflow YAML filename and text content
-    get_workflow_files_partitioned(
+    get_workflow_files_batched(
         projects_df,
         project_workflows_dict,
-        NUM_YAML_PARTITIONS,
         yaml_workflows_json_prefix
     )
 
-    # Create new filtered workflows dict, omitting workflows that don't actually use CI
+    # Write new filtered workflows, omitting workflows that don't actually use CI
     print('Retrieved all workflow YAML contents, checking for CI usage...')
-    ci_project_workflows_dict = get_workflows_using_ci(
-        f"{yaml_workflows_json_prefix}.json")
+    ci_repo_ids = get_workflows_using_ci(
+        f"{yaml_workflows_json_prefix}.json", output_workflows_path)
 
     # Create new filtered projects df, omitting projects that no longer have any valid workflows
-    remaining_repo_ids = [int(repo_id)
-                          for repo_id in ci_project_workflows_dict.keys()]
+    remaining_repo_ids = [int(repo_id) for repo_id in ci_repo_ids]
     projects_df = projects_df[projects_df.repo_id.isin(remaining_repo_ids)]
     print(
         f"There are {len(remaining_repo_ids)} projects using GitHub Actions for CI")
 
-    save_workflows(ci_project_workflows_dict, output_workflows_path)
     save_full_projects_df(projects_df, output_projects_path)
 
     print(
         f"{num_projects_before} projects were reduced to {projects_df.shape[0]}")
+    record_rows(num_projects_before, projects_df.shape[0])
     print("[!] Done filtering out projects that don't use GitHub Actions for CI")
 
 
@@ -236,6 +237,7 @@ def filter_by_default_branch_existence(input_projects_path: str, output_projects
         [int(repo_id) for repo_id in default_branches_dict.keys()])]
     print(
         f"{num_projects_before} projects were reduced to {projects_df.shape[0]}")
+    record_rows(num_projects_before, projects_df.shape[0])
 
     # Write the remaining projects and their found workflows to output files
     save_full_projects_df(projects_df, output_projects_path)
@@ -255,6 +257,9 @@ def filter_by_workflow_run_history(input_projects_path: str, output_projects_pat
 
     projects = load_projects(input_projects_path, False)
     workflows_dict = load_workflows(input_workflows_path)
+    store = open_workflow_runs_store(workflow_runs_prefix)
+    workflow_run_counts = count_workflow_runs(store)
+    store.close()
     repo_ids_to_keep = []
 
     # Iterate through each workflow for each project
@@ -265,12 +270,10 @@ def filter_by_workflow_run_history(input_projects_path: str, output_projects_pat
         workflow_ids_to_remove = []
         repo_id_str = project['id']
         for workflow_idx_str, _ in workflows_dict[repo_id_str].items():
-            workflow_runs_path = encode_workflow_runs_path(
-                workflow_runs_prefix, repo_id_str, workflow_idx_str)
-            workflow_runs = load_workflow_runs(workflow_runs_path)
+            num_workflow_runs = workflow_run_counts[(repo_id_str, workflow_idx_str)]
 
             # Mark workflow for removal if unsufficient workflow runs exist for it
-            if len(workflow_runs) < NUM_REQUIRED_WORKFLOW_RUNS:
+            if num_workflow_runs < NUM_REQUIRED_WORKFLOW_RUNS:
                 workflow_ids_to_remove.append(workflow_idx_str)
 
         # Remove workflows that were flagged
@@ -289,6 +292,7 @@ def filter_by_workflow_run_history(input_projects_path: str, output_projects_pat
     projects_df = projects_df[projects_df.repo_id.isin(repo_ids_to_keep)]
     print(
         f"{num_projects_before} projects were reduced to {projects_df.shape[0]}")
+    record_rows(num_projects_before, projects_df.shape[0])
 
     # Write the remaining projects and workflows dict to JSON
     # NOTE: Useless workflow runs are not removed from disk
@@ -0,0 +1,335 @@
+"""
+Synthetic fixtures for exercising the whole experiment without GHTorrent or API access. A
+synthetic GHTorrent snapshot (ie. `projects_split{i}.csv` and `project_members.csv`) is written by
+`generate_ghtorrent_fixture`, and the GitHub / Coveralls data of each synthetic project (its
+default branch, workflow files, workflow runs and Coveralls builds) is derived on demand from its
+repo_id by the stub API server (see `stub_server.py`). Every project is named `project{repo_id}`,
+so that the stub server can recognize it from its owner and name alone. All data is derived from
+a seed, so the same seed always produces the same fixture.
+
+The proportions of projects that are forked, use an unsupported language, have a single member,
+lack workflows or CI, have too few workflow runs or lack Coveralls reports are chosen such that
+each filter stage removes a realistic share of the projects.
+"""
+
+import os
+import random
+import time
+import numpy as np
+import pandas as pd
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+from config import NUM_MEMBER_PARTITIONS, NUM_REQUIRED_WORKFLOW_RUNS
+from data_io import write_df_to_csv_file
+
+# NOTE: Same as `projects.NULL_SYMBOL`, which can't be imported without a real GHTorrent path
+NULL_SYMBOL = "\\N"
+
+FIXTURE_LANGUAGES = ['Java', 'JavaScript', 'TypeScript', 'Ruby', 'C', 'C++', 'Python',
+                     'Go', 'PHP', 'C#', 'Shell', NULL_SYMBOL]
+FIXTURE_LANGUAGE_WEIGHTS = [12, 20, 6, 5, 3, 4, 14, 5, 8, 5, 3, 15]
+FIXTURE_FORKED_FRAC = 0.2
+FIXTURE_SINGLE_MEMBER_FRAC = 0.6
+FIXTURE_MAX_MEMBERS = 60
+FIXTURE_DUPLICATE_MEMBER_FRAC = 0.05
+FIXTURE_MISSING_REPO_FRAC = 0.03
+FIXTURE_NO_WORKFLOWS_FRAC = 0.5
+FIXTURE_FEW_RUNS_FRAC = 0.25
+FIXTURE_MAX_WORKFLOW_RUNS = 800
+FIXTURE_COVERALLS_FRAC = 0.3
+FIXTURE_MAX_COVERALLS_BUILDS = 100
+
+# The last workflow run of every workflow happens shortly before the GHTorrent snapshot date
+FIXTURE_END_SECS = 1614988800  # 2021-03-06T00:00:00Z
+
+# Workflow files, by filename, of which each project has a few. Only some of them use CI.
+FIXTURE_WORKFLOW_TEXTS = {
+    'ci.yml': """name: CI
+on: [push, pull_request]
+jobs:
+  build:
+    runs-on: ubuntu-latest
+    steps:
+      - uses: actions/checkout@v2
+      - uses: actions/setup-node@v2
+        with:
+          node-version: 14
+      - run: npm ci
+      - run: npm test
+""",
+    'build.yml': """name: Build
+on:
+  push:
+    branches: [ main, master ]
+jobs:
+  build:
+    runs-on: ubuntu-latest
+    steps:
+    - uses: actions/checkout@v2
+    - name: Set up JDK 11
+      uses: actions/setup-java@v2
+      with:
+        java-version: '11'
+        distribution: 'adopt'
+    - name: Build with Gradle
+      run: ./gradlew build
+""",
+    'maven.yml': """name: Java CI with Maven
+on: [push]
+jobs:
+  build:
+    runs-on: ubuntu-latest
+    steps:
+    - uses: actions/checkout@v2
+    - uses: actions/setup-java@v1
+      with:
+        java-version: 1.8
+    - run: mvn -B package --file pom.xml
+""",
+    'python-package.yml': """name: Python package
+on: [push]
+jobs:
+  build:
+    runs-on: ubuntu-latest
+    strategy:
+      matrix:
+        python-version: [3.7, 3.8, 3.9]
+    steps:
+    - uses: actions/checkout@v2
+    - uses: actions/setup-python@v2
+      with:
+        python-version: ${{ matrix.python-version }}
+    - run: |
+        python -m pip install --upgrade pip
+        pip install -r requirements.txt
+    - run: pytest
+""",
+    'ruby.yml': """name: Ruby
+on: [push]
+jobs:
+  test:
+    runs-on: ubuntu-latest
+    steps:
+    - uses: actions/checkout@v2
+    - uses: ruby/setup-ruby@v1
+      with:
+        ruby-version: 2.7
+    - run: bundle install
+    - run: bundle exec rake
+""",
+    'cmake.yml': """name: CMake
+on: [push]
+jobs:
+  build:
+    runs-on: ubuntu-latest
+    steps:
+    - uses: actions/checkout@v2
+    - run: cmake -B build
+    - run: make -C build
+""",
+    'release.yml': """name: Release
+on:
+  push:
+    tags: ['v*']
+jobs:
+  release:
+    runs-on: ubuntu-latest
+    steps:
+      - uses: actions/checkout@v2
+      - uses: softprops/action-gh-release@v1
+""",
+    'codeql-analysis.yml': """name: CodeQL
+on: [push]
+jobs:
+  analyze:
+    runs-on: ubuntu-latest
+    steps:
+    - uses: actions/checkout@v2
+    - uses: github/codeql-action/init@v1
+    - uses: github/codeql-action/analyze@v1
+""",
+    'greetings.yml': """name: Greetings
+on: [pull_request, issues]
+jobs:
+  greeting:
+    runs-on: ubuntu-latest
+    steps:
+    - uses: actions/first-interaction@v1
+      with:
+        repo-token: ${{ secrets.GITHUB_TOKEN }}
+        issue-message: 'Thanks for reporting!'
+""",
+    'README.md': 'These workflows build and release the project.\n'
+}
+FIXTURE_WORKFLOW_WEIGHTS = [16, 10, 6, 10, 4, 4, 8, 8, 4, 1]
+
+
+def encode_fixture_date(epoch_secs: int) -> str:
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(epoch_secs))
+
+
+def generate_ghtorrent_fixture(output_folder: str, num_projects: int, seed: int = 0) -> None:
+    """
+    Write a synthetic GHTorrent snapshot of the given number of projects to the given folder,
+    ie. `NUM_MEMBER_PARTITIONS` files `projects_split{i}.csv`, and `project_members.csv`. Both are
+    header-less CSV, with the same columns as GHTorrent.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(output_folder, exist_ok=True)
+
+    # Projects, with repo_ids spread out (like GHTorrent) rather than contiguous
+    repo_ids = np.sort(rng.choice(num_projects * 10, num_projects, replace=False)) + 1
+    owner_ids = rng.integers(1, max(num_projects // 2, 2), num_projects)
+    languages = rng.choice(
+        FIXTURE_LANGUAGES, num_projects,
+        p=np.array(FIXTURE_LANGUAGE_WEIGHTS) / sum(FIXTURE_LANGUAGE_WEIGHTS))
+    is_forked = rng.random(num_projects) < FIXTURE_FORKED_FRAC
+    forked_from = np.where(is_forked, rng.choice(repo_ids, num_projects).astype(str), NULL_SYMBOL)
+    created_secs = FIXTURE_END_SECS - rng.integers(30, 3000, num_projects) * 86400
+    created_at = pd.to_datetime(created_secs, unit='s').strftime('%Y-%m-%d %H:%M:%S')
+    projects_df = pd.DataFrame({
+        'repo_id': repo_ids,
+        'url': [f"https://api.github.com/repos/user{owner_id}/project{repo_id}"
+                for owner_id, repo_id in zip(owner_ids, repo_ids)],
+        'owner_id': owner_ids,
+        'name': [f"project{repo_id}" for repo_id in repo_ids],
+        'descriptor': 'A synthetic project',
+        'language': languages,
+        'created_at': created_at,
+        'forked_from': forked_from,
+        'deleted': 0,
+        'updated_at': created_at,
+        'dummy': NULL_SYMBOL
+    })
+    for i, split_idxs in enumerate(np.array_split(np.arange(num_projects), NUM_MEMBER_PARTITIONS)):
+        write_df_to_csv_file(
+            projects_df.iloc[split_idxs], f"{output_folder}/projects_split{i}.csv")
+
+    # Project members, where most projects only have a single member, and some memberships are
+    # duplicated (as in GHTorrent)
+    member_counts = np.where(
+        rng.random(num_projects) < FIXTURE_SINGLE_MEMBER_FRAC,
+        1,
+        np.minimum(rng.geometric(0.15, num_projects) + 1, FIXTURE_MAX_MEMBERS)
+    )
+    member_repo_ids = np.repeat(repo_ids, member_counts)
+    member_user_ids = rng.integers(1, num_projects * 5, len(member_repo_ids))
+    duplicates = rng.random(len(member_repo_ids)) < FIXTURE_DUPLICATE_MEMBER_FRAC
+    members_df = pd.DataFrame({
+        'repo_id': np.concatenate([member_repo_ids, member_repo_ids[duplicates]]),
+        'user_id': np.concatenate([member_user_ids, member_user_ids[duplicates]]),
+        'created_at': '2020-01-01 00:00:00'
+    }).sample(frac=1, random_state=seed)
+    write_df_to_csv_file(members_df, f"{output_folder}/project_members.csv")
+
+    print(
+        f"Wrote {num_projects} projects and {members_df.shape[0]} project members to {output_folder}")
+
+
+@lru_cache(maxsize=4096)
+def get_fixture_repo(seed: int, repo_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Derive the GitHub / Coveralls data of a synthetic project, or return `None` if the project
+    no longer exists on GitHub. Example return value:
+    ```
+    {
+        'default_branch': 'main',
+        'workflow_filenames': ['ci.yml', 'release.yml'],
+        'failure_frac': 0.12,
+        'mean_run_interval_secs': 21600,
+        'has_coveralls': True
+    }
+    ```
+    """
+    rng = random.Random(f"{seed}:{repo_id}")
+    if rng.random() < FIXTURE_MISSING_REPO_FRAC:
+        return None
+
+    workflow_filenames = []
+    if rng.random() >= FIXTURE_NO_WORKFLOWS_FRAC:
+        num_workflows = rng.randint(1, 4)
+        workflow_filenames = list(dict.fromkeys(rng.choices(
+            list(FIXTURE_WORKFLOW_TEXTS.keys()), FIXTURE_WORKFLOW_WEIGHTS, k=num_workflows)))
+
+    return {
+        'default_branch': rng.choice(['main', 'master', 'master', 'develop', None]),
+        'workflow_filenames': workflow_filenames,
+        'failure_frac': rng.uniform(0.02, 0.4),
+        'mean_run_interval_secs': rng.randint(3600, 3 * 86400),
+        'has_coveralls': rng.random() < FIXTURE_COVERALLS_FRAC
+    }
+
+
+@lru_cache(maxsize=1024)
+def get_fixture_workflow_runs(seed: int, repo_id: int, workflow_filename: str) -> List[Dict[str, Any]]:
+    """
+    Derive the push-triggered workflow runs (on the default branch) of a workflow of a synthetic
+    project, newest first, in the same format as the GitHub API. Runs are spaced by exponentially
+    distributed intervals, and a random share of them fail.
+    """
+    repo = get_fixture_repo(seed, repo_id)
+    if repo is None or workflow_filename not in repo['workflow_filenames']:
+        return []
+
+    rng = random.Random(f"{seed}:{repo_id}:{workflow_filename}")
+    if rng.random() < FIXTURE_FEW_RUNS_FRAC:
+        num_runs = rng.randint(0, NUM_REQUIRED_WORKFLOW_RUNS - 1)
+    else:
+        num_runs = rng.randint(NUM_REQUIRED_WORKFLOW_RUNS, FIXTURE_MAX_WORKFLOW_RUNS)
+
+    runs, created_secs = [], FIXTURE_END_SECS - rng.randint(0, 86400)
+    for i in range(num_runs):
+        commit_secs = created_secs - rng.randint(1, 120)
+        duration_secs = int(rng.lognormvariate(5.5, 0.8))
+        sha = '%040x' % rng.getrandbits(160)
+        conclusion = 'failure' if rng.random() < repo['failure_frac'] else 'success'
+        runs.append({
+            'id': repo_id * 100000 + num_runs - i,
+            'name': workflow_filename,
+            'head_branch': repo['default_branch'],
+            'head_sha': sha,
+            'run_number': num_runs - i,
+            'event': 'push',
+            'status': 'completed',
+            'conclusion': conclusion,
+            'created_at': encode_fixture_date(created_secs),
+            'updated_at': encode_fixture_date(created_secs + duration_secs),
+            'head_commit': {
+                'id': sha,
+                'message': f"Commit {num_runs - i}",
+                'timestamp': encode_fixture_date(commit_secs)
+            }
+        })
+        created_secs -= int(rng.expovariate(1 / repo['mean_run_interval_secs'])) + 60
+    return runs
+
+
+def get_fixture_coveralls_builds(seed: int, repo_id: int) -> List[Dict[str, Any]]:
+    """
+    Derive the Coveralls builds of a synthetic project, newest first, in the same format as the
+    Coveralls API. Builds are reported for the most recent commits of the project's first
+    workflow. An empty list is returned if the project does not use Coveralls.
+    """
+    repo = get_fixture_repo(seed, repo_id)
+    if repo is None or not repo['has_coveralls'] or len(repo['workflow_filenames']) == 0:
+        return []
+
+    rng = random.Random(f"{seed}:{repo_id}:coveralls")
+    covered_percent = rng.uniform(40, 98)
+    workflow_runs = get_fixture_workflow_runs(seed, repo_id, repo['workflow_filenames'][0])
+    return [
+        {
+            'created_at': run['updated_at'],
+            'url': None,
+            'commit_message': run['head_commit']['message'],
+            'branch': repo['default_branch'],
+            'committer_name': 'Synthetic Committer',
+            'committer_email': 'committer@example.com',
+            'commit_sha': run['head_sha'],
+            'repo_name': f"project{repo_id}",
+            'badge_url': 'https://s3.amazonaws.com/assets.coveralls.io/badges/coveralls_80.svg',
+            'coverage_change': 0.0,
+            'covered_percent': round(min(covered_percent + rng.uniform(-2, 2), 100), 2)
+        }
+        for run in workflow_runs[:FIXTURE_MAX_COVERALLS_BUILDS]
+    ]
@@ -1,36 +1,81 @@
+import glob
+import itertools
+import math
 import os
+import time
 import pandas as pd
-import numpy as np
-from datetime import datetime
-from typing import Any, Dict, List, Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 from requests.utils import quote
-from base_api_client import OptionalParams, get_from_url, post_to_url
+from base_api_client import (
+    RETRY_COUNT,
+    ApiRequestError,
+    OptionalAny,
+    OptionalParams,
+    get_from_url,
+    get_rate_limit_budget,
+    post_to_url
+)
+from config import (
+    DEFAULT_BRANCH_BATCH_SIZE,
+    GRAPHQL_MAX_BATCH_SIZE,
+    GRAPHQL_MAX_QUERY_COST,
+    GRAPHQL_MIN_BATCH_SIZE,
+    GRAPHQL_TARGET_LATENCY_SECS,
+    YAML_BATCH_SIZE
+)
 from branches import save_default_branches
-from data_io import OutputFile, read_dict_from_json_file, write_dict_to_json_file
+from data_io import (
+    OutputFile,
+    read_dict_from_json_file,
+    write_dict_to_json_file,
+    write_items_to_json_file
+)
+from graphql_cache import (
+    GraphQLCacheOffsets,
+    append_to_graphql_cache,
+    encode_graphql_cache_key,
+    encode_graphql_cache_path,
+    iter_graphql_cache_results,
+    load_graphql_cache_offsets
+)
 from projects import decode_repo_and_workflow_key, decode_repo_key, encode_repo_and_workflow_key
-from workflows import WorkflowFilenameDict, WorkflowInfoDict, save_workflows
+from workflows import WorkflowFilenameDict
 
 API_USERNAME = os.environ['api_username']
 API_PASSWORD = os.environ['api_password']
 GITHUB_BASE_URL = os.environ['github_base_url']
-GITHUB_DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
-AUTH = (API_USERNAME, API_PASSWORD)
+GITHUB_GRAPHQL_URL = f"{GITHUB_BASE_URL}/graphql"
+
+# NOTE: Multiple tokens may be given as a comma-separated list, to pool their rate limits
+GITHUB_CREDENTIALS = [
+    (API_USERNAME, token.strip()) for token in API_PASSWORD.split(',') if token.strip()
+]
+if len(GITHUB_CREDENTIALS) == 0:
+    raise ValueError(
+        "Invalid api_password, expected a GitHub personal access token (or a comma-separated list of tokens)")
 
 
 def build_dup_workflow_warning(repo_id, workflow_filename):
     return f"WARNING: Workflow file {workflow_filename} from repo with ID {repo_id} has already been retrieved, will replace."
 
 
-def build_dup_branch_name_warning(repo_id):
-    return f"WARNING: Default branch name for repo with ID {repo_id} has already been retrieved, will replace."
-
-
-def convert_str_to_datetime(date_str: str) -> datetime:
-    return datetime.strptime(date_str, GITHUB_DATE_FORMAT)
+def select_github_auth(resource: str = 'core') -> Tuple[str, str]:
+    """
+    Return the GitHub credentials (username, token) whose rate limit budget for the given
+    resource (ie. `core` for REST, `graphql` for GraphQL) currently has the most headroom.
+    Credentials whose budget is not yet known are preferred, so every token is put to use.
+    """
+    return max(
+        GITHUB_CREDENTIALS,
+        key=lambda auth: get_rate_limit_budget(
+            GITHUB_BASE_URL, auth, resource).headroom()
+    )
 
 
 def get_from_github(slug: str, output_filename: OutputFile = None, params: OptionalParams = None):
-    return get_from_url(f"{GITHUB_BASE_URL}{slug}", output_filename, AUTH, params)
+    return get_from_url(f"{GITHUB_BASE_URL}{slug}", output_filename, select_github_auth(), params)
 
 
 def get_from_github_paged(slug: str, per_page: int, max_pages: int,
@@ -42,27 +87,26 @@ def get_from_github_paged(slug: str, per_page: int, max_pages: int,
     results per page) and `max_pages` (maximum number of pages to execute) are also required. An
     optional `res_key` can be provided to extract the aggregated response objects 1 layer deep in
     the json (ie. res[res_key]), else the response will be assumed to be an array of objects to be
-    aggregated.
+    aggregated. If the first page reports the `total_count` of results (eg. workflow runs), all
+    remaining pages are requested concurrently, otherwise pages are requested one at a time.
+    Raises `ApiRequestError` if any page returns an error other than 'Not Found'.
     """
     full_url = f"{GITHUB_BASE_URL}{slug}"
 
     def execute_request_for_page(page: int):
-        params_with_page = params if params is not None else {}
+        params_with_page = dict(params) if params is not None else {}
         params_with_page['per_page'] = per_page
         params_with_page['page'] = page
         return get_from_url(
             url=full_url,
             output_filename=None,
-            auth=AUTH,
+            auth=select_github_auth(),
             params=params_with_page
         )
 
-    page, all_responses = 1, []
-    while page <= max_pages:
-        # Get workflow runs for current page
-        page_res = execute_request_for_page(page)
-
+    def get_results_for_page(page: int, page_res: Any) -> List[Any]:
         # Check for unexpected omission of res_key in res body, if specified
+        # NOTE: Pages may be requested by worker threads, so errors are raised rather than exiting
         if res_key is not None and res_key not in page_res:
             if 'message' in page_res:
                 # We skip 'Not Found' errors, add empty list in case previous pages were non-empty
@@ -71,38 +115,225 @@ def get_from_github_paged(slug: str, per_page: int, max_pages: int,
                         f"WARNING: GET {full_url} (page {page}) returned 'Not Found', skipping...")
                     page_res[res_key] = []
                 else:
-                    print(
-                        f"ERROR: GET {full_url} (page {page}) returned message: {page_res['message']}, aborting...")
-                    exit()
+                    raise ApiRequestError(
+                        f"GET {full_url} (page {page}) returned message: {page_res['message']}")
             else:
-                print(
-                    f"ERROR: Response to GET {full_url} (page {page}) is missing key '{res_key}', aborting...")
-                print(page_res)
-                exit()
-
-        # Add workflow runs to the running list
-        page_workflow_runs = page_res[res_key] if res_key is not None else page_res
-        all_responses.extend(page_workflow_runs)
-
-        # Stop paging when we recieve less results than the page size requested
-        if len(page_workflow_runs) < per_page:
-            break
-        page += 1
+                raise ApiRequestError(
+                    f"Response to GET {full_url} (page {page}) is missing key '{res_key}': {page_res}")
+
+        return page_res[res_key] if res_key is not None else page_res
+
+    # Get results for the first page, which may tell us how many pages there are in total
+    first_page_res = execute_request_for_page(1)
+    all_responses = list(get_results_for_page(1, first_page_res))
+    total_count = first_page_res.get('total_count') if isinstance(first_page_res, dict) else None
+
+    # Stop paging when we recieve less results than the page size requested
+    if len(all_responses) >= per_page and max_pages >= 2:
+        if total_count is not None:
+            # Request all remaining pages concurrently, then combine them in order
+            num_pages = min(math.ceil(total_count / per_page), int(max_pages))
+            remaining_pages = range(2, num_pages + 1)
+            if len(remaining_pages) > 0:
+                with ThreadPoolExecutor(max_workers=len(remaining_pages)) as executor:
+                    for page_results in executor.map(
+                        lambda page: get_results_for_page(page, execute_request_for_page(page)),
+                        remaining_pages
+                    ):
+                        all_responses.extend(page_results)
+        else:
+            page = 2
+            while page <= max_pages:
+                page_results = get_results_for_page(page, execute_request_for_page(page))
+                all_responses.extend(page_results)
+                if len(page_results) < per_page:
+                    break
+                page += 1
 
     # Now that all results have been aggregated, write results to JSON file
     write_dict_to_json_file(all_responses, output_filename)
     return all_responses
 
 
-def run_graphql_query(query: str, output_filename: OutputFile = None):
+def run_graphql_query(query: str, output_filename: OutputFile = None, auth: OptionalAny = None,
+                      retry_count: int = RETRY_COUNT):
     return post_to_url(
-        f"{GITHUB_BASE_URL}/graphql",
+        GITHUB_GRAPHQL_URL,
         {'query': query},
-        AUTH,
-        output_filename
+        auth if auth is not None else select_github_auth('graphql'),
+        output_filename,
+        retry_count
     )
 
 
+class AdaptiveBatchSizer:
+    """
+    Chooses how many aliased queries to combine into each GraphQL request. After each successful
+    request, the batch size is scaled towards the size expected to take
+    `GRAPHQL_TARGET_LATENCY_SECS` and cost at most `GRAPHQL_MAX_QUERY_COST` points (growing by at
+    most 2x at a time). After a failed request, the batch size is halved. If both halves of a
+    failed batch then succeed, the failure is attributed to the batch size rather than a specific
+    query, so the batch size will never again grow to that size.
+    """
+
+    def __init__(self, initial_batch_size: int):
+        self.max_batch_size = GRAPHQL_MAX_BATCH_SIZE
+        self.batch_size = self.clamp(initial_batch_size)
+
+    def clamp(self, batch_size: float) -> int:
+        return int(max(GRAPHQL_MIN_BATCH_SIZE, min(batch_size, self.max_batch_size)))
+
+    def record_success(self, batch_size: int, latency_secs: float, cost: int) -> None:
+        scale = min(
+            GRAPHQL_TARGET_LATENCY_SECS / max(latency_secs, 0.001),
+            GRAPHQL_MAX_QUERY_COST / max(cost, 1),
+            2.0
+        )
+        self.batch_size = self.clamp(batch_size * scale)
+
+    def record_failure(self, batch_size: int) -> None:
+        self.batch_size = self.clamp(min(self.batch_size, batch_size // 2))
+
+    def record_oversized(self, batch_size: int) -> None:
+        self.max_batch_size = max(min(self.max_batch_size, batch_size - 1), GRAPHQL_MIN_BATCH_SIZE)
+        self.batch_size = self.clamp(self.batch_size)
+
+
+def encode_graphql_query_identity(query: Dict[str, str]) -> List[str]:
+    """
+    Return the identity of an aliased query, ie. the repo owner and name (case-insensitive, like
+    GitHub itself), plus the workflow filename if the query is for a specific workflow file.
+    """
+    identity = [query['owner'].lower(), query['name'].lower()]
+    if 'filename' in query:
+        identity.append(query['filename'])
+    return identity
+
+
+def import_legacy_graphql_responses(legacy_output_prefix: str, queries: List[Dict[str, str]],
+                                    cache_kind: str) -> None:
+    """
+    Populate the GraphQL cache for a given query kind from responses previously written to
+    `{legacy_output_prefix}_split{i}.json` files, so that their queries need not be executed again.
+    Only aliases matching one of the given queries can be imported. Legacy responses do not record
+    the query behind each alias, so only query kinds whose aliases identify their query (ie. by
+    repo_id alone) can be imported. The `repo{id}workflow{idx}` aliases of `workflow_file` queries
+    refer to a position in the workflow filename list of the legacy run, which may have changed
+    since, so these are never imported.
+    """
+    if cache_kind == 'workflow_file':
+        return
+    if os.path.isfile(encode_graphql_cache_path(cache_kind)):
+        return
+    legacy_filenames = glob.glob(f"{glob.escape(legacy_output_prefix)}_split*.json")
+    if len(legacy_filenames) == 0:
+        return
+
+    print(f"Importing {len(legacy_filenames)} previous responses into the GraphQL cache...")
+    queries_by_alias = {q['id']: q for q in queries}
+    for filename in legacy_filenames:
+        res = read_dict_from_json_file(filename)
+        if 'data' in res and res['data'] is not None:
+            append_to_graphql_cache(cache_kind, {
+                encode_graphql_cache_key(
+                    cache_kind, encode_graphql_query_identity(queries_by_alias[alias])): result
+                for alias, result in res['data'].items() if alias in queries_by_alias
+            })
+
+
+def cache_graphql_queries_batched(queries: List[Dict[str, str]],
+                                  build_alias_query: Callable[[Dict[str, str]], str],
+                                  initial_batch_size: int,
+                                  cache_kind: str) -> Tuple[Dict[str, str], GraphQLCacheOffsets]:
+    """
+    Execute a list of aliased GraphQL queries (each dict must contain the query alias as `id`, the
+    repo `owner` and `name`, and optionally a workflow `filename`), combining as many queries into
+    each request as the API will tolerate. The batch size adapts to the observed latency and cost
+    of each request (see `AdaptiveBatchSizer`). Rather than retrying a failed request as-is, its
+    batch is split in half, and each half is executed separately. If a single query still fails,
+    its alias is given a `null` result (and will be executed again next time).
+
+    The result for each query is cached by its identity (see `graphql_cache.py`) as soon as it is
+    received, and only queries without a cached result are executed. Results are not kept in
+    memory; instead, a tuple is returned, containing a dict mapping each query alias to its cache
+    key, and the offsets of all cached results (see `graphql_cache.iter_graphql_cache_results`).
+    """
+    offsets = load_graphql_cache_offsets(cache_kind)
+    cache_keys = {
+        q['id']: encode_graphql_cache_key(cache_kind, encode_graphql_query_identity(q))
+        for q in queries
+    }
+
+    pending_queries = deque(q for q in queries if cache_keys[q['id']] not in offsets)
+    num_total, sizer = len(pending_queries), AdaptiveBatchSizer(initial_batch_size)
+    print(
+        f"Executing {num_total}/{len(queries)} queries not already cached (batch size {sizer.batch_size})")
+
+    def execute_batch(batch: List[Dict[str, str]]) -> bool:
+        auth = select_github_auth('graphql')
+        query = build_graphql_query([build_alias_query(q) for q in batch])
+
+        # Only retry single queries, since a failed batch will instead be split and retried
+        retry_count = RETRY_COUNT if len(batch) == 1 else 1
+        start_time = time.time()
+        try:
+            res = run_graphql_query(query, None, auth, retry_count)
+        except ApiRequestError as e:
+            sizer.record_failure(len(batch))
+            if len(batch) == 1:
+                print(f"WARNING: Query {batch[0]['id']} failed, skipping... ({e})")
+            else:
+                print(
+                    f"WARNING: Batch of {len(batch)} queries failed, splitting (batch size {sizer.batch_size})...")
+                mid = len(batch) // 2
+                first_half_ok = execute_batch(batch[:mid])
+                second_half_ok = execute_batch(batch[mid:])
+                if first_half_ok and second_half_ok:
+                    sizer.record_oversized(len(batch))
+            return False
+
+        latency_secs = time.time() - start_time
+        cost = get_rate_limit_budget(GITHUB_GRAPHQL_URL, auth, 'graphql').last_cost
+        sizer.record_success(len(batch), latency_secs, cost)
+
+        # Cache the result of every query in the batch (missing aliases are cached as null)
+        batch_results = {cache_keys[q['id']]: res['data'].get(q['id']) for q in batch}
+        offsets.update(append_to_graphql_cache(cache_kind, batch_results))
+        return True
+
+    while len(pending_queries) > 0:
+        batch = [pending_queries.popleft()
+                 for _ in range(min(sizer.batch_size, len(pending_queries)))]
+        execute_batch(batch)
+        print(
+            f"Executed {num_total - len(pending_queries)}/{num_total} queries (batch size {sizer.batch_size})")
+
+    return cache_keys, offsets
+
+
+def run_graphql_queries_batched(queries: List[Dict[str, str]],
+                                build_alias_query: Callable[[Dict[str, str]], str],
+                                initial_batch_size: int, cache_kind: str) -> Dict[str, Any]:
+    """
+    Execute a list of aliased GraphQL queries, in adaptively sized batches, skipping those with a
+    cached result (see `cache_graphql_queries_batched`). A combined response containing the
+    results for all queries is returned, in the same format as a single response:
+    ```
+    {
+        'data': {
+            'repo123': { ... },
+            ...
+        }
+    }
+    ```
+    """
+    cache_keys, offsets = cache_graphql_queries_batched(
+        queries, build_alias_query, initial_batch_size, cache_kind)
+    results = iter_graphql_cache_results(
+        cache_kind, offsets, (cache_keys[q['id']] for q in queries))
+    return {'data': {q['id']: result for q, result in zip(queries, results)}}
+
+
 def get_user(username):
     return get_from_github(f"/users/{username}")
 
@@ -197,6 +428,14 @@ def build_graphql_query_workflow_file(id: str, owner: str, name: str, filename:
     """
 
 
+def build_graphql_query(queries: List[str]) -> str:
+    """
+    Combine aliased GitHub API GraphQL queries into a single query. The `rateLimit` field is also
+    requested, so that the rate limit budget can be tracked (it is removed from the response).
+    """
+    return f"{{ rateLimit {{ cost remaining resetAt }} {' '.join(queries)} }}"
+
+
 def parse_graphql_query_default_branch(res: Dict[str, Any]) -> Dict[str, str]:
     """
     Parse the response to a GitHub API GraphQL query getting the default branch name for given
@@ -313,156 +552,38 @@ def parse_graphql_query_workflow_file(res: str, old_project_workflows_dict: Work
     return new_project_workflows_dict
 
 
-def combine_partitioned_workflow_filenames(query_response_filenames: List[str]):
-    """
-    Given a list of filenames, each whose file is a response to a (partitioned) query to get repo
-    workflow filenames, parse and return the filenames ONLY for repos that had any. A dictionary
-    is returned, mapping each repo_id to a non-empty list of its workflow filenames, eg:
-    ```
-    {
-        '123': [
-            { "name": "build.yml" },
-            { "name": "release.yml" }
-        ]
-    }
-    ```
+def get_default_branch_for_repos_batched(projects: List[Dict[str, str]],
+                                         output_prefix: str) -> Dict[str, str]:
     """
-    all_project_workflows_dict = {}
-
-    for filename in query_response_filenames:
-        query = read_dict_from_json_file(filename)
-        project_workflows_dict = parse_graphql_query_workflow_filenames(
-            query)
-
-        # Merge the workflows from this response with all others
-        for repo_id, filenames in project_workflows_dict.items():
-            if repo_id in all_project_workflows_dict:
-                print(
-                    f"WARNING: Workflow files from repo with ID {repo_id} have already been parsed, will replace.")
-            all_project_workflows_dict[repo_id] = filenames
-
-    return all_project_workflows_dict
-
-
-def combine_partitioned_workflow_files(query_response_filenames: List[str],
-                                       old_project_workflows_dict: WorkflowFilenameDict) -> WorkflowInfoDict:
-    """
-    Given a list of filenames, each whose file is a response to a (partitioned) query to get the
-    content of all project workflows, combine the partitioned results into a single dictionary. A
-    dictionary is returned, mapping each repo_id to a dictionary, which itself maps workflow
-    filename indices (represented as str) to dictionaries containing workflow filename and YAML
-    content. Example return value:
-    ```
-    {
-        '123': {
-            '0': { "name": "build.yml", "text": "These are my YAML contents" },
-            '1': { "name": "release.yml", "text": "These are my YAML contents" },
-            ...
-        },
-        ...
-    }
-    ```
+    Get the default branch name for all projects / repos in a given list, using adaptively
+    batched and cached API requests (see `run_graphql_queries_batched`). Returns a dict mapping
+    repo ID str to default branch name.
     """
-    all_project_workflows_dict = {}
-
-    for filename in query_response_filenames:
-        query = read_dict_from_json_file(filename)
-        project_workflows_dict = parse_graphql_query_workflow_file(
-            query, old_project_workflows_dict)
-
-        # Merge the workflows from this response with all others
-        for repo_id, repo_workflows in project_workflows_dict.items():
-            for workflow_filename_idx, workflow in repo_workflows.items():
-
-                if repo_id in all_project_workflows_dict:
-                    if workflow_filename_idx in all_project_workflows_dict[repo_id]:
-                        print(build_dup_workflow_warning(
-                            repo_id, workflow_filename_idx)
-                        )
-                else:
-                    all_project_workflows_dict[repo_id] = {}
-
-                # NOTE: Workflow filename index is used as a key (treat it like a workflow id)
-                all_project_workflows_dict[repo_id][workflow_filename_idx] = {
-                    'name': workflow['name'],
-                    'text': workflow['text']
-                }
-
-    return all_project_workflows_dict
-
-
-def get_default_branch_for_repos(projects: List[Dict[str, str]],
-                                 output_filename: OutputFile = None) -> Dict:
-    """
-    Get the default branch name for all projects / repos in a given list. Returns the result
-    of the query in its original unparsed format.
-    """
-    queries = [build_graphql_query_default_branch(
-        p['id'], p['owner'], p['name']) for p in projects]
-    query = ' '.join(queries)
-    query = f"{{ {query} }}"
-    return run_graphql_query(query, output_filename)
-
-
-def get_default_branch_for_repos_partitioned(partitioned_projects: List[List[Dict[str, str]]],
-                                             num_partitions: int,
-                                             partition_output_prefix: str) -> Dict[str, str]:
-    """
-    Get the default branch name for all projects / repos (given in a partitioned list, to support
-    partitioned API requests). Returns a dict mapping repo ID str to default branch name.
-    """
-    branch_names = {}
-    for i, projects_partition in enumerate(partitioned_projects):
-        print(
-            f"Getting default branch names for projects in partition {i+1}/{num_partitions}...")
+    print(f"Getting default branch names for {len(projects)} projects...")
+    import_legacy_graphql_responses(output_prefix, projects, 'default_branch')
+    res = run_graphql_queries_batched(
+        projects,
+        lambda p: build_graphql_query_default_branch(p['id'], p['owner'], p['name']),
+        DEFAULT_BRANCH_BATCH_SIZE,
+        'default_branch'
+    )
+    branch_names = parse_graphql_query_default_branch(res)
 
-        # Get branch names for projects in this partition, if not already retrieved
-        partition_output_filename = f"{partition_output_prefix}_split{i}.json"
-        if not os.path.isfile(partition_output_filename):
-            new_branch_names_res = get_default_branch_for_repos(
-                projects_partition, partition_output_filename)
-        else:
-            new_branch_names_res = read_dict_from_json_file(
-                partition_output_filename)
-
-        # Combine all results with those from this partition
-        new_branch_names = parse_graphql_query_default_branch(
-            new_branch_names_res)
-        for repo_id_str, def_branch_name in new_branch_names.items():
-            if repo_id_str in branch_names:
-                print(build_dup_branch_name_warning(repo_id_str))
-            branch_names[repo_id_str] = def_branch_name
-
-    save_default_branches(branch_names, f"{partition_output_prefix}.json")
+    save_default_branches(branch_names, f"{output_prefix}.json")
     return branch_names
 
 
-def get_workflows_for_repos(repos: List[Dict[str, str]],
-                            output_filename: OutputFile = None) -> Any:
-    queries = [build_graphql_query_workflow_filenames(
-        r['id'], r['owner'], r['name']) for r in repos]
-    query = ' '.join(queries)
-    query = f"{{ {query} }}"
-    return run_graphql_query(query, output_filename)
-
-
-def get_workflow_files(workflow_queries: List[Dict[str, str]], output_filename: OutputFile = None) -> Any:
-    queries = [build_graphql_query_workflow_file(
-        r['id'], r['owner'], r['name'], r['filename']) for r in workflow_queries]
-    query = f"{{ {' '.join(queries)} }}"
-    return run_graphql_query(query, output_filename)
-
-
-def get_workflow_files_partitioned(projects_df: pd.DataFrame,
-                                   project_workflows_dict: WorkflowFilenameDict,
-                                   num_partitions: int,
-                                   partition_output_prefix: str) -> WorkflowInfoDict:
+def get_workflow_files_batched(projects_df: pd.DataFrame,
+                               project_workflows_dict: WorkflowFilenameDict,
+                               output_prefix: str) -> None:
     """
     Get the text (YAML) content of all workflow files in a given dict (`project_workflows_dict`).
-    More specifically, return an augmented version of `project_workflows_dict` that contains the
-    YAML content of each workflow file, in addition to the workflow filename already present.
-    Workflow file content is queried from the GitHub GraphQL API in multiple partitioned requests.
-    If a response for a given partition has already been written to JSON, it is skipped.
+    More specifically, write an augmented version of `project_workflows_dict` that contains the
+    YAML content of each workflow file, in addition to the workflow filename already present, to
+    `{output_prefix}.json`. Workflow file content is queried from the GitHub GraphQL API in
+    multiple adaptively batched requests (see `cache_graphql_queries_batched`), skipping any
+    previously cached workflow files. The output is written one project at a time, straight from
+    the cache, so the contents of all workflow files are never held in memory at once.
     Example `project_workflows_dict`:
     ```
     {
@@ -474,7 +595,7 @@ def get_workflow_files_partitioned(projects_df: pd.DataFrame,
         ...
     }
     ```
-    Example return value:
+    Example output file:
     ```
     {
         "123": {
@@ -500,25 +621,31 @@ def get_workflow_files_partitioned(projects_df: pd.DataFrame,
                 'filename': workflow_filename['name']
             })
 
-    # Partition the projects
-    query_partitions = np.array_split(queries, num_partitions)
-
-    # Execute a combined query for each partition
-    for i in range(0, num_partitions):
-        output_split_path = f"{partition_output_prefix}_split{i}.json"
-        print(
-            f"Getting workflow YAML for projects (partition {i+1}/{num_partitions})...")
-
-        if not os.path.isfile(output_split_path):
-            query_partition = query_partitions[i]
-            get_workflow_files(query_partition.tolist(), output_split_path)
-
-    # Combine the partitioned responses into a single dict
-    new_workflows_dict = combine_partitioned_workflow_files(
-        [f"{partition_output_prefix}_split{i}.json" for i in range(
-            num_partitions)],
-        project_workflows_dict
+    # Execute the queries in batches, caching their results
+    print(f"Getting workflow YAML for {len(queries)} workflows...")
+    cache_keys, offsets = cache_graphql_queries_batched(
+        queries,
+        lambda q: build_graphql_query_workflow_file(
+            q['id'], q['owner'], q['name'], q['filename']),
+        YAML_BATCH_SIZE,
+        'workflow_file'
     )
 
-    save_workflows(new_workflows_dict, f"{partition_output_prefix}.json")
-    return new_workflows_dict
+    # Parse the cached results of each project's queries (which are consecutive) in turn
+    num_projects_written = 0
+
+    def iter_project_workflows() -> Iterator[Tuple[str, Dict[str, Dict[str, str]]]]:
+        nonlocal num_projects_written
+        results = iter_graphql_cache_results(
+            'workflow_file', offsets, (cache_keys[q['id']] for q in queries))
+        for repo_id, repo_results in itertools.groupby(
+                zip(queries, results), key=lambda qr: decode_repo_and_workflow_key(qr[0]['id'])[0]):
+            res = {'data': {q['id']: result for q, result in repo_results}}
+            workflows = parse_graphql_query_workflow_file(res, project_workflows_dict).get(repo_id)
+            if workflows is not None:
+                num_projects_written += 1
+                yield repo_id, workflows
+
+    output_workflows_path = f"{output_prefix}.json"
+    write_items_to_json_file(iter_project_workflows(), output_workflows_path)
+    print(f"Wrote workflows for {num_projects_written} projects to {output_workflows_path}")
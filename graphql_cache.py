@@ -0,0 +1,87 @@
+"""
+Results of GitHub GraphQL queries are cached per repository, so that they can be reused no matter
+how queries are batched, or which other projects are queried alongside them. Each query kind
+(eg. `default_branch`) is cached in its own append-only file of JSON lines, where each line holds
+the hash of a query identity (ie. repo owner and name, plus workflow filename if applicable) and
+the result returned for that query's alias. Example `data/graphql_cache/default_branch.jsonl`:
+
+{"key": "3f2a...", "result": {"defaultBranchRef": {"name": "main"}}}
+{"key": "9bc0...", "result": null}
+...
+
+Some results are large (eg. the contents of every workflow file), so the cache is never loaded into
+memory as a whole. Instead, it is indexed by the byte offset of each key's line in the file, and
+results are read from the file one at a time, as they are needed.
+"""
+
+import hashlib
+import json
+import os
+from contextlib import nullcontext
+from typing import Any, Dict, Iterable, Iterator, List
+from config import GRAPHQL_CACHE_FOLDER
+
+GraphQLCache = Dict[str, Any]
+GraphQLCacheOffsets = Dict[str, int]
+
+
+def encode_graphql_cache_key(kind: str, identity: List[str]) -> str:
+    """
+    Encode the cache key for a query of a given kind, identified by the given list of strings
+    (eg. `['bob', 'myproject', 'build.yml']`). A hex digest str is returned.
+    """
+    return hashlib.sha256(json.dumps([kind] + identity).encode('utf-8')).hexdigest()
+
+
+def encode_graphql_cache_path(kind: str) -> str:
+    return f"{GRAPHQL_CACHE_FOLDER}/{kind}.jsonl"
+
+
+def load_graphql_cache_offsets(kind: str) -> GraphQLCacheOffsets:
+    """
+    Index all cached results for a given query kind, as a dict mapping cache key to the byte
+    offset of its (last) line in the cache file. Only one line is held in memory at a time. A
+    partially written last line (eg. if execution was interrupted) is ignored.
+    """
+    offsets = {}
+    cache_path = encode_graphql_cache_path(kind)
+    if os.path.isfile(cache_path):
+        with open(cache_path, 'rb') as infile:
+            offset = 0
+            for line in infile:
+                try:
+                    offsets[json.loads(line)['key']] = offset
+                except json.JSONDecodeError:
+                    print(f"WARNING: Ignoring incomplete entry in {cache_path}")
+                offset += len(line)
+    return offsets
+
+
+def iter_graphql_cache_results(kind: str, offsets: GraphQLCacheOffsets,
+                               keys: Iterable[str]) -> Iterator[Any]:
+    """
+    Yield the cached result for each of the given keys in order (or `None` for keys that are not
+    cached), reading each result from the cache file only once it is needed.
+    """
+    cache_path = encode_graphql_cache_path(kind)
+    with open(cache_path, 'rb') if os.path.isfile(cache_path) else nullcontext() as cache_file:
+        for key in keys:
+            if key not in offsets:
+                yield None
+                continue
+            cache_file.seek(offsets[key])
+            yield json.loads(cache_file.readline())['result']
+
+
+def append_to_graphql_cache(kind: str, results: GraphQLCache) -> GraphQLCacheOffsets:
+    """
+    Append results (a dict mapping cache key to result) to the cache for a given query kind.
+    Returns the offset of each appended result (see `load_graphql_cache_offsets`).
+    """
+    os.makedirs(GRAPHQL_CACHE_FOLDER, exist_ok=True)
+    offsets = {}
+    with open(encode_graphql_cache_path(kind), 'ab') as outfile:
+        for key, result in results.items():
+            offsets[key] = outfile.tell()
+            outfile.write((json.dumps({'key': key, 'result': result}) + '\n').encode('utf-8'))
+    return offsets
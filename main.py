@@ -1,5 +1,17 @@
+import os
+import time
 from augment import get_coveralls_info, get_default_branches_for_projects, get_workflow_runs
-from config import DATA_FOLDER, RESULTS_FOLDER, SUPPORTED_LANGUAGES
+from base_api_client import print_session_stats
+from config import (
+    DATA_FOLDER,
+    MAX_GITHUB_RESULTS_PER_PAGE,
+    NUM_MEMBER_PARTITIONS,
+    NUM_REQUIRED_WORKFLOW_RUNS,
+    NUM_WORKFLOW_RUNS,
+    PROJECTS_FILE_FORMAT,
+    RESULTS_FOLDER,
+    SUPPORTED_LANGUAGES
+)
 from filter_projects import (
     filter_by_default_branch_existence,
     filter_by_using_ci,
@@ -10,31 +22,38 @@ from filter_projects import (
     get_initial_projects
 )
 from analyze import (
-    analyze_broken_build_duration,
-    analyze_build_duration,
-    analyze_commit_frequency,
+    BrokenBuildDurationAnalysis,
+    BuildDurationAnalysis,
+    CommitFrequencyAnalysis,
     analyze_coverage,
-    analyze_project_member_count
+    analyze_project_member_count,
+    analyze_workflow_runs
 )
+from metrics import measure_stage, write_metrics_report
+from projects import PROJECT_MEMBERS_PATH, PROJECTS_SPLIT_PATHS
+from stages import Stage, run_stages
+from workflows import encode_workflow_runs_store_path
 
 # These filenamess / paths are declared in order of creation
-PROJECTS_STAGE_0_PATH = f"{DATA_FOLDER}/projects_stage_0.csv"
-PROJECTS_STAGE_1_PATH = f"{DATA_FOLDER}/projects_stage_1.csv"
-PROJECTS_STAGE_2_PATH = f"{DATA_FOLDER}/projects_stage_2.csv"
-PROJECTS_STAGE_3_PATH = f"{DATA_FOLDER}/projects_stage_3.csv"
+PROJECTS_STAGE_0_PATH = f"{DATA_FOLDER}/projects_stage_0.{PROJECTS_FILE_FORMAT}"
+PROJECTS_STAGE_1_PATH = f"{DATA_FOLDER}/projects_stage_1.{PROJECTS_FILE_FORMAT}"
+PROJECTS_STAGE_2_PATH = f"{DATA_FOLDER}/projects_stage_2.{PROJECTS_FILE_FORMAT}"
+PROJECTS_STAGE_3_PATH = f"{DATA_FOLDER}/projects_stage_3.{PROJECTS_FILE_FORMAT}"
 WORKFLOWS_STAGE_3_PREFIX = f"{DATA_FOLDER}/workflows_stage_3"
 WORKFLOWS_STAGE_3_PATH = f"{WORKFLOWS_STAGE_3_PREFIX}.json"
-PROJECTS_STAGE_4_PATH = f"{DATA_FOLDER}/projects_stage_4.csv"
+PROJECTS_STAGE_4_PATH = f"{DATA_FOLDER}/projects_stage_4.{PROJECTS_FILE_FORMAT}"
 WORKFLOWS_STAGE_4_PATH = f"{DATA_FOLDER}/workflows_stage_4.json"
 WORKFLOW_YAML_STAGE_4_PREFIX = f"{DATA_FOLDER}/workflow_yaml_stage_3"
 DEFAULT_BRANCHES_PREFIX = f"{DATA_FOLDER}/default_branches"
 DEFAULT_BRANCHES_PATH = f"{DEFAULT_BRANCHES_PREFIX}.json"
-PROJECTS_STAGE_5_PATH = f"{DATA_FOLDER}/projects_stage_5.csv"
+PROJECTS_STAGE_5_PATH = f"{DATA_FOLDER}/projects_stage_5.{PROJECTS_FILE_FORMAT}"
 WORKFLOW_RUNS_PREFIX = f"{DATA_FOLDER}/workflow_runs"
-PROJECTS_STAGE_6_PATH = f"{DATA_FOLDER}/projects_stage_6.csv"
+WORKFLOW_RUNS_STORE_PATH = encode_workflow_runs_store_path(WORKFLOW_RUNS_PREFIX)
+PROJECTS_STAGE_6_PATH = f"{DATA_FOLDER}/projects_stage_6.{PROJECTS_FILE_FORMAT}"
 WORKFLOWS_STAGE_6_PATH = f"{DATA_FOLDER}/workflows_stage_6.json"
 PROJECT_COVERAGE_PREFIX = f"{DATA_FOLDER}/project_coverage"
 LANGUAGE_COVERAGE_PATH = f"{DATA_FOLDER}/language_coverage.json"
+STAGES_MANIFEST_PATH = f"{DATA_FOLDER}/stages.json"
 
 ORIGINAL_PROJECTS_MEMBER_DIST_IMG_PATH = f"{RESULTS_FOLDER}/original_projects_member_dist.png"
 ORIGINAL_PROJECTS_MEMBER_DIST_JSON_PATH = f"{RESULTS_FOLDER}/original_projects_member_dist.json"
@@ -44,55 +63,129 @@ DAILY_COMMITS_IMG_PREFIX = f"{RESULTS_FOLDER}/daily_commits"
 PROJECT_COVERAGE_BY_LANG_IMG_PATH = f"{RESULTS_FOLDER}/project_coverage_by_language.png"
 BROKEN_BUILDS_IMG_PREFIX = f"{RESULTS_FOLDER}/broken_builds"
 BUILD_DURATION_IMG_PREFIX = f"{RESULTS_FOLDER}/build_duration"
+METRICS_REPORT_PATH = f"{RESULTS_FOLDER}/metrics_{time.strftime('%Y%m%d_%H%M%S')}.json"
+
+# The filtering and augmentation phases, declared as a DAG of stages (see `stages.py`)
+FILTER_STAGES = [
+    Stage(
+        'get_initial_projects',
+        lambda: get_initial_projects(PROJECTS_STAGE_0_PATH),
+        inputs=PROJECTS_SPLIT_PATHS + [PROJECT_MEMBERS_PATH],
+        outputs=[PROJECTS_STAGE_0_PATH],
+        config={'NUM_MEMBER_PARTITIONS': NUM_MEMBER_PARTITIONS}
+    ),
+    Stage(
+        'filter_forked_projects',
+        lambda: filter_forked_projects(PROJECTS_STAGE_0_PATH, PROJECTS_STAGE_1_PATH),
+        inputs=[PROJECTS_STAGE_0_PATH],
+        outputs=[PROJECTS_STAGE_1_PATH]
+    ),
+    Stage(
+        'filter_projects_by_lang',
+        lambda: filter_projects_by_lang(
+            SUPPORTED_LANGUAGES, PROJECTS_STAGE_1_PATH, PROJECTS_STAGE_2_PATH),
+        inputs=[PROJECTS_STAGE_1_PATH],
+        outputs=[PROJECTS_STAGE_2_PATH],
+        config={'SUPPORTED_LANGUAGES': SUPPORTED_LANGUAGES}
+    ),
+    Stage(
+        'filter_by_workflow_files',
+        lambda: filter_by_workflow_files(
+            PROJECTS_STAGE_2_PATH, PROJECTS_STAGE_3_PATH, WORKFLOWS_STAGE_3_PREFIX),
+        inputs=[PROJECTS_STAGE_2_PATH],
+        outputs=[PROJECTS_STAGE_3_PATH, WORKFLOWS_STAGE_3_PATH]
+    ),
+    Stage(
+        'filter_by_using_ci',
+        lambda: filter_by_using_ci(PROJECTS_STAGE_3_PATH, PROJECTS_STAGE_4_PATH,
+                                   WORKFLOWS_STAGE_3_PATH, WORKFLOWS_STAGE_4_PATH,
+                                   WORKFLOW_YAML_STAGE_4_PREFIX),
+        inputs=[PROJECTS_STAGE_3_PATH, WORKFLOWS_STAGE_3_PATH],
+        outputs=[PROJECTS_STAGE_4_PATH, WORKFLOWS_STAGE_4_PATH]
+    ),
+    Stage(
+        'get_default_branches_for_projects',
+        lambda: get_default_branches_for_projects(PROJECTS_STAGE_4_PATH, DEFAULT_BRANCHES_PREFIX),
+        inputs=[PROJECTS_STAGE_4_PATH],
+        outputs=[DEFAULT_BRANCHES_PATH]
+    ),
+    Stage(
+        'filter_by_default_branch_existence',
+        lambda: filter_by_default_branch_existence(
+            PROJECTS_STAGE_4_PATH, PROJECTS_STAGE_5_PATH, DEFAULT_BRANCHES_PATH),
+        inputs=[PROJECTS_STAGE_4_PATH, DEFAULT_BRANCHES_PATH],
+        outputs=[PROJECTS_STAGE_5_PATH]
+    ),
+    Stage(
+        'get_workflow_runs',
+        lambda: get_workflow_runs(PROJECTS_STAGE_5_PATH, WORKFLOWS_STAGE_4_PATH,
+                                  DEFAULT_BRANCHES_PATH, WORKFLOW_RUNS_PREFIX),
+        inputs=[PROJECTS_STAGE_5_PATH, WORKFLOWS_STAGE_4_PATH, DEFAULT_BRANCHES_PATH],
+        outputs=[WORKFLOW_RUNS_STORE_PATH],
+        config={
+            'NUM_WORKFLOW_RUNS': NUM_WORKFLOW_RUNS,
+            'MAX_GITHUB_RESULTS_PER_PAGE': MAX_GITHUB_RESULTS_PER_PAGE
+        },
+        resumable=True
+    ),
+    Stage(
+        'filter_by_workflow_run_history',
+        lambda: filter_by_workflow_run_history(PROJECTS_STAGE_5_PATH, PROJECTS_STAGE_6_PATH,
+                                               WORKFLOWS_STAGE_4_PATH, WORKFLOWS_STAGE_6_PATH,
+                                               WORKFLOW_RUNS_PREFIX),
+        inputs=[PROJECTS_STAGE_5_PATH, WORKFLOWS_STAGE_4_PATH, WORKFLOW_RUNS_STORE_PATH],
+        outputs=[PROJECTS_STAGE_6_PATH, WORKFLOWS_STAGE_6_PATH],
+        config={'NUM_REQUIRED_WORKFLOW_RUNS': NUM_REQUIRED_WORKFLOW_RUNS}
+    ),
+    Stage(
+        'get_coveralls_info',
+        lambda: get_coveralls_info(PROJECTS_STAGE_6_PATH, WORKFLOWS_STAGE_6_PATH,
+                                   DEFAULT_BRANCHES_PATH, WORKFLOW_RUNS_PREFIX,
+                                   PROJECT_COVERAGE_PREFIX, LANGUAGE_COVERAGE_PATH),
+        inputs=[PROJECTS_STAGE_6_PATH, WORKFLOWS_STAGE_6_PATH, DEFAULT_BRANCHES_PATH,
+                WORKFLOW_RUNS_STORE_PATH],
+        outputs=[LANGUAGE_COVERAGE_PATH]
+    )
+]
 
 if __name__ == '__main__':
     print('CI Theater (GitHub Actions edition)')
     print(
-        f"NOTE: Please delete any stale data in ./{DATA_FOLDER}/ before running")
+        f"NOTE: Only stages whose inputs, config or code changed since their outputs in ./{DATA_FOLDER}/ were written will be run")
     print('Starting the experiment...')
     print()
 
-    print('[!] Beginning filtering phase')
-    get_initial_projects(PROJECTS_STAGE_0_PATH)
-    filter_forked_projects(PROJECTS_STAGE_0_PATH, PROJECTS_STAGE_1_PATH)
-    filter_projects_by_lang(SUPPORTED_LANGUAGES,
-                            PROJECTS_STAGE_1_PATH, PROJECTS_STAGE_2_PATH)
-    filter_by_workflow_files(PROJECTS_STAGE_2_PATH,
-                             PROJECTS_STAGE_3_PATH, WORKFLOWS_STAGE_3_PREFIX)
-    filter_by_using_ci(PROJECTS_STAGE_3_PATH, PROJECTS_STAGE_4_PATH,
-                       WORKFLOWS_STAGE_3_PATH, WORKFLOWS_STAGE_4_PATH,
-                       WORKFLOW_YAML_STAGE_4_PREFIX)
-
-    print('[!] Beginning augmentation phase')
-    get_default_branches_for_projects(
-        PROJECTS_STAGE_4_PATH, DEFAULT_BRANCHES_PREFIX)
-    filter_by_default_branch_existence(
-        PROJECTS_STAGE_4_PATH, PROJECTS_STAGE_5_PATH, DEFAULT_BRANCHES_PATH)
-    get_workflow_runs(PROJECTS_STAGE_5_PATH, WORKFLOWS_STAGE_4_PATH,
-                      DEFAULT_BRANCHES_PATH, WORKFLOW_RUNS_PREFIX)
-    filter_by_workflow_run_history(PROJECTS_STAGE_5_PATH, PROJECTS_STAGE_6_PATH,
-                                   WORKFLOWS_STAGE_4_PATH, WORKFLOWS_STAGE_6_PATH,
-                                   WORKFLOW_RUNS_PREFIX)
-    get_coveralls_info(PROJECTS_STAGE_6_PATH, WORKFLOWS_STAGE_6_PATH, DEFAULT_BRANCHES_PATH,
-                       WORKFLOW_RUNS_PREFIX, PROJECT_COVERAGE_PREFIX, LANGUAGE_COVERAGE_PATH)
+    print('[!] Beginning filtering and augmentation phases')
+    os.makedirs(DATA_FOLDER, exist_ok=True)
+    os.makedirs(RESULTS_FOLDER, exist_ok=True)
+    run_stages(FILTER_STAGES, STAGES_MANIFEST_PATH)
 
     print('[!] Beginning analysis phase')
-    analyze_project_member_count(
-        PROJECTS_STAGE_0_PATH,
-        ORIGINAL_PROJECTS_MEMBER_DIST_IMG_PATH,
-        ORIGINAL_PROJECTS_MEMBER_DIST_JSON_PATH
-    )
-    analyze_project_member_count(
-        PROJECTS_STAGE_6_PATH,
-        FINAL_PROJECTS_MEMBER_DIST_IMG_PATH,
-        FINAL_PROJECTS_MEMBER_DIST_JSON_PATH
-    )
-    analyze_coverage(LANGUAGE_COVERAGE_PATH, PROJECT_COVERAGE_BY_LANG_IMG_PATH)
-    analyze_commit_frequency(PROJECTS_STAGE_6_PATH, WORKFLOWS_STAGE_6_PATH,
-                             WORKFLOW_RUNS_PREFIX, DAILY_COMMITS_IMG_PREFIX)
-    analyze_broken_build_duration(PROJECTS_STAGE_6_PATH, WORKFLOWS_STAGE_6_PATH,
-                                  WORKFLOW_RUNS_PREFIX, BROKEN_BUILDS_IMG_PREFIX)
-    analyze_build_duration(PROJECTS_STAGE_6_PATH, WORKFLOWS_STAGE_6_PATH,
-                           WORKFLOW_RUNS_PREFIX, BUILD_DURATION_IMG_PREFIX)
+    with measure_stage('analyze_original_project_member_count'):
+        analyze_project_member_count(
+            PROJECTS_STAGE_0_PATH,
+            ORIGINAL_PROJECTS_MEMBER_DIST_IMG_PATH,
+            ORIGINAL_PROJECTS_MEMBER_DIST_JSON_PATH
+        )
+    with measure_stage('analyze_final_project_member_count'):
+        analyze_project_member_count(
+            PROJECTS_STAGE_6_PATH,
+            FINAL_PROJECTS_MEMBER_DIST_IMG_PATH,
+            FINAL_PROJECTS_MEMBER_DIST_JSON_PATH
+        )
+    with measure_stage('analyze_coverage'):
+        analyze_coverage(LANGUAGE_COVERAGE_PATH, PROJECT_COVERAGE_BY_LANG_IMG_PATH)
+    with measure_stage('analyze_workflow_runs'):
+        analyze_workflow_runs(PROJECTS_STAGE_6_PATH, WORKFLOWS_STAGE_6_PATH, WORKFLOW_RUNS_PREFIX, [
+            CommitFrequencyAnalysis(DAILY_COMMITS_IMG_PREFIX),
+            BrokenBuildDurationAnalysis(BROKEN_BUILDS_IMG_PREFIX),
+            BuildDurationAnalysis(BUILD_DURATION_IMG_PREFIX)
+        ])
+
+    print('[!] HTTP connection reuse')
+    print_session_stats()
+
+    print('[!] Performance metrics')
+    write_metrics_report(METRICS_REPORT_PATH)
 
     print('Done')
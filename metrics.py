@@ -0,0 +1,172 @@
+"""
+Performance metrics are collected for each stage of the experiment (see `measure_stage`), namely
+its wall and CPU time (including any worker processes), the number of rows (eg. projects) it read
+and wrote, and the API requests it made. Requests are counted by endpoint, along with the bytes
+downloaded, the GraphQL cost, and the REST rate limit budget spent. Once the experiment is done,
+all metrics are written to a JSON report (see `write_metrics_report`), so that runs can be
+compared. Example report:
+
+{
+    "started_at": "2022-03-06T12:00:00Z",
+    "stages": [
+        {
+            "name": "filter_by_workflow_files",
+            "wall_secs": 812.4,
+            "cpu_secs": 95.1,
+            "rows_in": 120000,
+            "rows_out": 20000,
+            "requests": {
+                "POST api.github.com/graphql": { "count": 410, "bytes": 31200000, "errors": 2 },
+                ...
+            },
+            "bytes_downloaded": 31200000,
+            "graphql_cost": 410,
+            "rest_rate_limit_spent": 0
+        },
+        ...
+    ]
+}
+"""
+
+import os
+import re
+import time
+from contextlib import contextmanager
+from threading import Lock
+from typing import Any, Dict, Iterator, List, Optional
+from urllib.parse import urlparse
+from data_io import write_dict_to_json_file
+
+# Parts of request paths which identify a particular resource, replaced to group requests by endpoint
+ENDPOINT_PATH_PATTERNS = [
+    (re.compile(r"^/repos/[^/]+/[^/]+"), '/repos/{owner}/{repo}'),
+    (re.compile(r"/actions/workflows/[^/]+"), '/actions/workflows/{workflow}'),
+    (re.compile(r"^/users/[^/]+"), '/users/{username}'),
+    (re.compile(r"^/github/[^/]+/[^/]+\.json$"), '/github/{owner}/{repo}.json'),
+    (re.compile(r"^/builds/[^/]+\.json$"), '/builds/{sha}.json')
+]
+
+
+class StageMetrics:
+    """Metrics collected while running a single stage."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.wall_secs = 0.0
+        self.cpu_secs = 0.0
+        self.rows_in: Optional[int] = None
+        self.rows_out: Optional[int] = None
+        self.requests: Dict[str, Dict[str, int]] = {}
+        self.graphql_cost = 0
+        self.rest_rate_limit_spent = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'wall_secs': round(self.wall_secs, 3),
+            'cpu_secs': round(self.cpu_secs, 3),
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'requests': self.requests,
+            'bytes_downloaded': sum(r['bytes'] for r in self.requests.values()),
+            'graphql_cost': self.graphql_cost,
+            'rest_rate_limit_spent': self.rest_rate_limit_spent
+        }
+
+
+_metrics_lock = Lock()
+_started_at = time.time()
+_all_stage_metrics: List[StageMetrics] = []
+_current_stage_metrics: Optional[StageMetrics] = None
+
+
+def get_current_stage_metrics() -> StageMetrics:
+    """
+    Return the metrics of the stage currently running. Metrics recorded outside of any stage are
+    collected under a stage named `other`. Must be called while holding `_metrics_lock`.
+    """
+    global _current_stage_metrics
+    if _current_stage_metrics is None:
+        _current_stage_metrics = StageMetrics('other')
+        _all_stage_metrics.append(_current_stage_metrics)
+    return _current_stage_metrics
+
+
+def get_cpu_secs() -> float:
+    """Return the CPU time used by this process and all of its terminated child processes."""
+    cpu_times = os.times()
+    return cpu_times.user + cpu_times.system + cpu_times.children_user + cpu_times.children_system
+
+
+@contextmanager
+def measure_stage(name: str) -> Iterator[StageMetrics]:
+    """Collect metrics for a stage (with the given name) while the context is active."""
+    global _current_stage_metrics
+    stage_metrics = StageMetrics(name)
+    with _metrics_lock:
+        previous_stage_metrics = _current_stage_metrics
+        _current_stage_metrics = stage_metrics
+        _all_stage_metrics.append(stage_metrics)
+
+    start_wall_secs, start_cpu_secs = time.perf_counter(), get_cpu_secs()
+    try:
+        yield stage_metrics
+    finally:
+        stage_metrics.wall_secs = time.perf_counter() - start_wall_secs
+        stage_metrics.cpu_secs = get_cpu_secs() - start_cpu_secs
+        with _metrics_lock:
+            _current_stage_metrics = previous_stage_metrics
+
+
+def encode_endpoint(method: str, url: str) -> str:
+    """
+    Encode the endpoint of a request, eg. `GET api.github.com/repos/{owner}/{repo}/actions/runs`,
+    so that requests for different resources of the same kind are counted together.
+    """
+    parsed_url = urlparse(url)
+    path = parsed_url.path
+    for pattern, replacement in ENDPOINT_PATH_PATTERNS:
+        path = pattern.sub(replacement, path)
+    return f"{method} {parsed_url.netloc}{path}"
+
+
+def record_request(method: str, url: str, num_bytes: int, is_error: bool = False,
+                   rest_rate_limit_spent: int = 0) -> None:
+    """Record a completed API request (and the REST rate limit it spent) for the current stage."""
+    endpoint = encode_endpoint(method, url)
+    with _metrics_lock:
+        stage_metrics = get_current_stage_metrics()
+        if endpoint not in stage_metrics.requests:
+            stage_metrics.requests[endpoint] = {'count': 0, 'bytes': 0, 'errors': 0}
+        endpoint_metrics = stage_metrics.requests[endpoint]
+        endpoint_metrics['count'] += 1
+        endpoint_metrics['bytes'] += num_bytes
+        endpoint_metrics['errors'] += int(is_error)
+        stage_metrics.rest_rate_limit_spent += rest_rate_limit_spent
+
+
+def record_graphql_cost(graphql_cost: int) -> None:
+    """Record the cost of a GraphQL query (as reported in its `rateLimit` field) for the current stage."""
+    with _metrics_lock:
+        get_current_stage_metrics().graphql_cost += graphql_cost
+
+
+def record_rows(rows_in: int, rows_out: int) -> None:
+    """Record the number of rows (eg. projects) read and written by the current stage."""
+    with _metrics_lock:
+        stage_metrics = get_current_stage_metrics()
+        stage_metrics.rows_in, stage_metrics.rows_out = rows_in, rows_out
+
+
+def build_metrics_report() -> Dict[str, Any]:
+    with _metrics_lock:
+        return {
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(_started_at)),
+            'stages': [stage_metrics.to_dict() for stage_metrics in _all_stage_metrics]
+        }
+
+
+def write_metrics_report(output_path: str) -> None:
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    write_dict_to_json_file(build_metrics_report(), output_path)
+    print(f"Wrote performance metrics for {len(_all_stage_metrics)} stages to {output_path}")
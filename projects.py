@@ -1,19 +1,49 @@
 import os
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Tuple
-from config import MEMBER_COUNT_SIZES_MAP
-from data_io import read_df_from_csv_file, write_df_to_csv_file
+from typing import Dict, List, Optional, Tuple
+from config import (
+    MEMBER_COUNT_SIZES_MAP,
+    NUM_MEMBER_PARTITIONS,
+    PROJECT_MEMBER_COUNTS_PATH,
+    PROJECT_MEMBER_COUNTS_SOURCE_PATH,
+    PROJECT_MEMBERS_CHUNK_SIZE
+)
+from data_io import (
+    read_df_from_csv_file,
+    read_df_from_feather_file,
+    read_df_from_parquet_file,
+    read_dict_from_json_file,
+    write_df_to_csv_file,
+    write_df_to_feather_file,
+    write_df_to_parquet_file,
+    write_dict_to_json_file
+)
 
 GHTORRENT_PATH = os.environ['ghtorrent_path']
 PROJECT_MEMBERS_PATH = f"{GHTORRENT_PATH}project_members.csv"
+PROJECTS_SPLIT_PATHS = [
+    f"{GHTORRENT_PATH}projects_split{i}.csv" for i in range(NUM_MEMBER_PARTITIONS)
+]
 PROJECT_COLS = ['repo_id', 'url', 'owner_id', 'name', 'descriptor',
                 'language', 'created_at', 'forked_from', 'deleted', 'updated_at', 'dummy']
+PROJECT_DTYPES = {
+    'repo_id': 'int64',
+    'url': 'string',
+    'owner_id': 'int64',
+    'name': 'string',
+    'descriptor': 'string',
+    'language': 'category',
+    'created_at': 'string',
+    'forked_from': 'string',
+    'deleted': 'int64',
+    'updated_at': 'string',
+    'dummy': 'string'
+}
 PROJECT_MEMBERS_COLS = ['repo_id', 'user_id', 'created_at']
 NULL_SYMBOL = "\\N"
 
 Projects = List[Dict[str, str]]
-PartitionedProjects = List[Projects]
 
 
 def encode_repo_key(repo_id: str) -> str:
@@ -58,26 +88,143 @@ def decode_repo_and_workflow_key(graphql_key: str) -> Tuple[str, int]:
     return str(repo_id), int(workflow_idx)
 
 
-def load_original_project_members(quiet: bool = False) -> pd.DataFrame:
+def count_project_members(quiet: bool = False) -> np.ndarray:
     """
-    Read GHTorrent GitHub project member associations into a `pd.DataFrame`. Note that all
-    original columns are maintained ('repo_id', 'user_id', and 'created_at').
+    Count the number of unique GHTorrent GitHub project members for each project. Since
+    `project_members.csv` is far too large to load all at once, it is streamed in chunks of
+    `PROJECT_MEMBERS_CHUNK_SIZE` rows, retaining only the repo_id and user_id columns. Both ids
+    must fit in a uint32, so that each (repo_id, user_id) pair can be packed into a single uint64
+    (`repo_id << 32 | user_id`), and duplicate memberships removed by sorting. The unique pairs of
+    each chunk are merged into the unique pairs of all previous chunks as they are read, so only
+    one chunk and the running result are held in memory. An int64 array of shape
+    (num_projects, 2) is returned, where each row holds a repo_id and its member count, sorted by
+    repo_id.
     """
     if not quiet:
         print('Loading project-member associations...')
-    project_members_df = read_df_from_csv_file(
-        PROJECT_MEMBERS_PATH, PROJECT_MEMBERS_COLS)
 
-    # Remove any potential duplicate memberships
-    project_members_df.drop_duplicates(
-        subset=['repo_id', 'user_id'], inplace=True)
+    # NOTE: Ids are parsed as int64, since pandas silently wraps ids that overflow narrower dtypes
+    unique_pairs = np.empty(0, dtype=np.uint64)
+    chunks = pd.read_csv(
+        PROJECT_MEMBERS_PATH,
+        names=PROJECT_MEMBERS_COLS,
+        usecols=['repo_id', 'user_id'],
+        dtype={'repo_id': np.int64, 'user_id': np.int64},
+        chunksize=PROJECT_MEMBERS_CHUNK_SIZE
+    )
+    for chunk in chunks:
+        ids = chunk[['repo_id', 'user_id']].to_numpy()
+        del chunk
+        if len(ids) > 0 and (ids.min() < 0 or ids.max() > np.iinfo(np.uint32).max):
+            raise ValueError(
+                f"{PROJECT_MEMBERS_PATH} holds ids outside of the uint32 range "
+                f"[{ids.min()}, {ids.max()}]")
+        ids = ids.astype(np.uint64)
+        pairs = np.unique((ids[:, 0] << np.uint64(32)) | ids[:, 1])
+        del ids
+
+        # Both arrays are sorted, so a stable sort merges them in linear time
+        merged_pairs = np.concatenate((unique_pairs, pairs))
+        merged_pairs.sort(kind='stable')
+        is_first = np.empty(len(merged_pairs), dtype=bool)
+        is_first[:1] = True
+        np.not_equal(merged_pairs[1:], merged_pairs[:-1], out=is_first[1:])
+        unique_pairs = merged_pairs[is_first]
+
+    # Count members per repo
+    repo_ids, member_counts = np.unique(unique_pairs >> np.uint64(32), return_counts=True)
 
-    num_associations = project_members_df.shape[0]
-    num_projects = project_members_df['repo_id'].nunique()
     if not quiet:
         print(
-            f"Loaded {num_associations} unique member associations to {num_projects} projects")
-    return project_members_df
+            f"Loaded {len(unique_pairs)} unique member associations to {len(repo_ids)} projects")
+    return np.column_stack((repo_ids.astype(np.int64), member_counts.astype(np.int64)))
+
+
+def stat_project_members_file() -> Optional[Dict[str, int]]:
+    """
+    Identify the current version of `project_members.csv` by its size and modification time
+    (it is far too large to hash), or return `None` if it does not exist.
+    """
+    if not os.path.isfile(PROJECT_MEMBERS_PATH):
+        return None
+    stat = os.stat(PROJECT_MEMBERS_PATH)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def is_project_member_count_index_stale() -> bool:
+    """
+    Return `True` if the member count index is missing, or was computed from a different version
+    of `project_members.csv` (eg. from a previous GHTorrent snapshot) than the current one, as
+    recorded in `PROJECT_MEMBER_COUNTS_SOURCE_PATH`. If `project_members.csv` is unavailable, an
+    existing index is used as-is.
+    """
+    if not os.path.isfile(PROJECT_MEMBER_COUNTS_PATH):
+        return True
+    source_stat = stat_project_members_file()
+    if source_stat is None:
+        return False
+    if not os.path.isfile(PROJECT_MEMBER_COUNTS_SOURCE_PATH):
+        return True
+    return read_dict_from_json_file(PROJECT_MEMBER_COUNTS_SOURCE_PATH) != source_stat
+
+
+def load_project_member_count_index(quiet: bool = False) -> np.ndarray:
+    """
+    Load the index of member counts for all GHTorrent GitHub projects (see
+    `count_project_members`). The index is only computed from `project_members.csv` once (or
+    again once the file changes), and saved to `PROJECT_MEMBER_COUNTS_PATH`, which is
+    memory-mapped by subsequent calls.
+    """
+    if is_project_member_count_index_stale():
+        source_stat = stat_project_members_file()
+        member_count_index = count_project_members(quiet)
+
+        # NOTE: Write to a temporary file first, so an interrupted write is never mistaken for
+        # a complete index
+        temp_path = f"{PROJECT_MEMBER_COUNTS_PATH}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as outfile:
+            np.save(outfile, member_count_index)
+        os.replace(temp_path, PROJECT_MEMBER_COUNTS_PATH)
+        write_dict_to_json_file(source_stat, PROJECT_MEMBER_COUNTS_SOURCE_PATH)
+        if not quiet:
+            print(f"Wrote project member counts to {PROJECT_MEMBER_COUNTS_PATH}")
+
+    return np.load(PROJECT_MEMBER_COUNTS_PATH, mmap_mode='r')
+
+
+def load_project_member_counts(quiet: bool = False) -> pd.Series:
+    """
+    Get the number of unique members of every GHTorrent GitHub project, as a `pd.Series` mapping
+    repo_id to member count. Example return value:
+    ```
+    repo_id
+    123    4
+    456    2
+    ...
+    ```
+    """
+    member_count_index = load_project_member_count_index(quiet)
+    return pd.Series(
+        member_count_index[:, 1],
+        index=pd.Index(member_count_index[:, 0], name='repo_id'),
+        name='count'
+    )
+
+
+def get_member_counts_for_repos(repo_ids: np.ndarray) -> np.ndarray:
+    """
+    Look up the member count of each repo_id in a given int array, using the member count index.
+    Repos without any members in GHTorrent are given a count of 0.
+    """
+    member_count_index = load_project_member_count_index(True)
+    indexed_repo_ids = member_count_index[:, 0]
+    if len(indexed_repo_ids) == 0:
+        return np.zeros(len(repo_ids), dtype=np.int64)
+
+    positions = np.searchsorted(indexed_repo_ids, repo_ids)
+    positions = np.minimum(positions, len(indexed_repo_ids) - 1)
+    found = indexed_repo_ids[positions] == repo_ids
+    return np.where(found, member_count_index[positions, 1], 0)
 
 
 def get_member_count_sizes_for_projects(unencoded_projects: Projects) -> Dict[str, str]:
@@ -92,44 +239,65 @@ def get_member_count_sizes_for_projects(unencoded_projects: Projects) -> Dict[st
     }
     ```
     """
-    def get_size_for_num_members(num_members: int) -> str:
-        for size, size_range in MEMBER_COUNT_SIZES_MAP.items():
-            if num_members >= size_range[0] and num_members <= size_range[1]:
-                return size
-        return 'Unknown'
+    repo_ids = sorted(set([proj['id'] for proj in unencoded_projects]))
+    member_counts = get_member_counts_for_repos(np.array(repo_ids, dtype=np.int64))
 
-    project_members_df = load_original_project_members(True)
-    member_counts = project_members_df['repo_id'].value_counts()
-    repo_ids = set([proj['id'] for proj in unencoded_projects])
+    # Bin member counts into size categories, by the lower bound of each size range
+    sizes = np.array(['Unknown'] + list(MEMBER_COUNT_SIZES_MAP.keys()), dtype=object)
+    lower_bounds = np.array([size_range[0] for size_range in MEMBER_COUNT_SIZES_MAP.values()])
+    upper_bounds = np.array([size_range[1] for size_range in MEMBER_COUNT_SIZES_MAP.values()])
+    size_idxs = np.digitize(member_counts, lower_bounds)
+    in_range = (size_idxs > 0) & (member_counts <= upper_bounds[np.maximum(size_idxs - 1, 0)])
+    size_idxs = np.where(in_range, size_idxs, 0)
 
-    # Extract member count for specified projects, bin these numbers into size categories
-    return {repo_id: get_size_for_num_members(member_counts[int(repo_id)]) for repo_id in repo_ids}
+    return dict(zip(repo_ids, sizes[size_idxs]))
 
 
-def load_full_projects(input_projects_path: str, quiet: bool = False) -> pd.DataFrame:
+def load_full_projects(input_projects_path: str, quiet: bool = False,
+                       columns: Optional[List[str]] = None) -> pd.DataFrame:
     """
-    Read GitHub projects from the specified CSV file (ie. in GHTorrent format) into a
-    pd.DataFrame, without modifying the data in any way.
+    Read GitHub projects from the specified file (ie. with GHTorrent columns) into a
+    pd.DataFrame, without modifying the data in any way. The file format is determined by the
+    file extension (`.parquet`, `.feather`, or otherwise GHTorrent-style header-less CSV), and
+    the columns are typed according to `PROJECT_DTYPES`. Optionally, only the specified columns
+    are read.
     """
     if not quiet:
         print(f"Loading projects from {input_projects_path}...")
-    projects_df = read_df_from_csv_file(input_projects_path, PROJECT_COLS)
+    if input_projects_path.endswith('.parquet'):
+        projects_df = read_df_from_parquet_file(input_projects_path, columns)
+    elif input_projects_path.endswith('.feather'):
+        projects_df = read_df_from_feather_file(input_projects_path, columns)
+    else:
+        projects_df = read_df_from_csv_file(
+            input_projects_path, PROJECT_COLS, columns=columns, dtype=PROJECT_DTYPES)
+    projects_df = projects_df.astype(
+        {col: PROJECT_DTYPES[col] for col in projects_df.columns})
     if not quiet:
         print(f"Loaded {projects_df.shape[0]} projects")
     return projects_df
 
 
 def save_full_projects_df(projects_df: pd.DataFrame, output_projects_path: str) -> None:
-    """Write a pd.DataFrame containing full projects to CSV file."""
-    write_df_to_csv_file(projects_df, output_projects_path)
+    """
+    Write a pd.DataFrame containing full projects to file, in the format determined by the file
+    extension (see `load_full_projects`).
+    """
+    projects_df = projects_df.astype(PROJECT_DTYPES)
+    if output_projects_path.endswith('.parquet'):
+        write_df_to_parquet_file(projects_df, output_projects_path)
+    elif output_projects_path.endswith('.feather'):
+        write_df_to_feather_file(projects_df, output_projects_path)
+    else:
+        write_df_to_csv_file(projects_df, output_projects_path)
     print(f"Wrote {projects_df.shape[0]} projects to {output_projects_path}")
 
 
 def load_projects(input_projects_path: str,
                   should_encode_repo_key: bool = True) -> Projects:
     """
-    Read GitHub projects from the specified CSV file (ie. in GHTorrent format) into a list of
-    dictionaries. Note that only certain columns are retained from the CSV. Example return value:
+    Read GitHub projects from the specified file (see `load_full_projects`) into a list of
+    dictionaries. Note that only certain columns are read from the file. Example return value:
     ```
     [
         {
@@ -142,7 +310,8 @@ def load_projects(input_projects_path: str,
     ]
     ```
     """
-    projects_df = load_full_projects(input_projects_path)
+    projects_df = load_full_projects(
+        input_projects_path, columns=['repo_id', 'url', 'language'])
     return [
         {
             'id': encode_repo_key(r['repo_id']) if should_encode_repo_key else str(r['repo_id']),
@@ -152,31 +321,3 @@ def load_projects(input_projects_path: str,
         }
         for r in projects_df.to_dict(orient="records")
     ]
-
-
-def load_projects_and_partition(input_projects_path: str, num_partitions: int,
-                                should_encode_repo_key: bool = True) -> PartitionedProjects:
-    """
-    Read GitHub projects from the specified CSV file (ie. in GHTorrent format) into a list of
-    dictionaries, then partition the dictionaries to form a list of lists of dictionaries.
-    Note that only certain columns are retained from the CSV. Example return value:
-    ```
-    [
-        [
-            {
-                'id': 'repo123', # Use param to decide whether to encode this
-                'owner': 'bob',
-                'name': 'myproject',
-                'language': 'Java'
-            },
-            ...
-        ],
-        ...
-    ]
-    ```
-    """
-    repos = load_projects(input_projects_path, should_encode_repo_key)
-
-    # Return a partitioning of the loaded projects
-    repos_partitions = np.array_split(repos, num_partitions)
-    return repos_partitions
@@ -1,13 +1,39 @@
 import re
 from typing import List
 
-JS_BUILD_REGEX = ".*(^|\s|\/)(npm\s+(install|ci|test|build)|npm\s+run\s+(build|test|ci))($|\s)"
-GRADLE_BUILD_REGEX = ".*(^|\s|\/)gradlew?((?=\s).*\s)(build|test)($|\s)"
-MAVEN_BUILD_REGEX = ".*(^|\s|\/)mvn((?=\s).*\s)(install|package|compile|test|verify)($|\s)"
-MAKE_BUILD_REGEX = ".*(^|\s|\/)c?make($|\s)"
-JAVAC_BUILD_REGEX = ".*(^|\s|\/)javac($|\s)"
-RUBY_BUILD_REGEX = ".*(^|\s|\/)rake($|\s)|.*(^|\s|\/)bundle((?=\s).*\s)(install|exec)($|\s)"
-PYTHON_BUILD_REGEX = ".*(^|\s|\/)(python(2|3)?|pip\s+install|pytest)($|\s)"
+# Command patterns for each build tool. A command only matches if it begins at the start of the
+# run command, after whitespace or after a path separator (ie. `/mypath/npm install`), and ends
+# at the end of the run command or before whitespace.
+JS_BUILD_CMD = r"npm\s+(install|ci|test|build)|npm\s+run\s+(build|test|ci)"
+GRADLE_BUILD_CMD = r"gradlew?((?=\s).*\s)(build|test)"
+MAVEN_BUILD_CMD = r"mvn((?=\s).*\s)(install|package|compile|test|verify)"
+MAKE_BUILD_CMD = r"c?make"
+JAVAC_BUILD_CMD = r"javac"
+RUBY_BUILD_CMD = r"rake|bundle((?=\s).*\s)(install|exec)"
+PYTHON_BUILD_CMD = r"python(2|3)?|pip\s+install|pytest"
+BUILD_TOOL_CMDS = {
+    'npm': JS_BUILD_CMD,
+    'gradle': GRADLE_BUILD_CMD,
+    'maven': MAVEN_BUILD_CMD,
+    'make': MAKE_BUILD_CMD,
+    'javac': JAVAC_BUILD_CMD,
+    'ruby': RUBY_BUILD_CMD,
+    'python': PYTHON_BUILD_CMD
+}
+
+
+def encode_build_cmd_regex(build_cmd: str) -> str:
+    """Encode a regex matching the given build command pattern anywhere in a run command."""
+    return f".*(^|\\s|\\/)({build_cmd})($|\\s)"
+
+
+JS_BUILD_REGEX = encode_build_cmd_regex(JS_BUILD_CMD)
+GRADLE_BUILD_REGEX = encode_build_cmd_regex(GRADLE_BUILD_CMD)
+MAVEN_BUILD_REGEX = encode_build_cmd_regex(MAVEN_BUILD_CMD)
+MAKE_BUILD_REGEX = encode_build_cmd_regex(MAKE_BUILD_CMD)
+JAVAC_BUILD_REGEX = encode_build_cmd_regex(JAVAC_BUILD_CMD)
+RUBY_BUILD_REGEX = encode_build_cmd_regex(RUBY_BUILD_CMD)
+PYTHON_BUILD_REGEX = encode_build_cmd_regex(PYTHON_BUILD_CMD)
 ALL_BUILD_REGEX = [
     JS_BUILD_REGEX,
     GRADLE_BUILD_REGEX,
@@ -18,6 +44,15 @@ ALL_BUILD_REGEX = [
     PYTHON_BUILD_REGEX
 ]
 
+# All build tool commands, combined into one regex which is tested once at each position of a run
+# command. The match is zero-width (ie. a lookahead), so that every position where a build command
+# begins is found, and its named group (ie. `lastgroup`) identifies the matching build tool.
+BUILD_CMD_MATCHER = re.compile(
+    r"(?<![^\s/])(?=" +
+    '|'.join(f"(?P<{tool}>{build_cmd})(?:$|\\s)" for tool, build_cmd in BUILD_TOOL_CMDS.items()) +
+    ')'
+)
+
 
 def match_cmd_regex(cmd_regex: str, test_cmd: str) -> bool:
     """Return `True` if the given command matches the given regex, and `False` otherwise."""
@@ -29,6 +64,14 @@ def match_any_cmd_regex(all_regex: List[str], test_cmd: str) -> bool:
     return any(match_cmd_regex(r, test_cmd) for r in all_regex)
 
 
+def match_build_tools(test_cmd: str) -> List[str]:
+    """
+    Return the build tools (see `BUILD_TOOL_CMDS`) whose build commands appear in the given
+    command, in order of first appearance. The list is empty if no build command appears.
+    """
+    return list(dict.fromkeys(match.lastgroup for match in BUILD_CMD_MATCHER.finditer(test_cmd)))
+
+
 def match_any_build_cmd_regex(test_cmd: str) -> bool:
     """Return `True` if the given command matches any of the build regex, and `False` otherwise."""
-    return match_any_cmd_regex(ALL_BUILD_REGEX, test_cmd)
+    return BUILD_CMD_MATCHER.search(test_cmd) is not None
@@ -0,0 +1,269 @@
+"""
+The experiment is declared as a DAG of stages (see `main.py`), each of which reads some input
+files and writes some output files. A stage is only run if its outputs are stale, ie. if any of
+its outputs are missing or have been modified, or if its fingerprint has changed since they were
+written. The fingerprint of a stage is a hash of its input files, the config values it depends on,
+and the source code of the modules it depends on. These modules are found automatically: the
+modules defining the functions a stage runs, along with every module of this package they
+(transitively) import, except for the modules that only instrument stages (see
+`INSTRUMENTATION_MODULES`). Since a stage's inputs are the outputs of
+upstream stages, re-running a stale stage only causes those downstream stages whose inputs
+actually changed to be re-run as well.
+
+Fingerprints are recorded in a JSON manifest (`data/stages.json`), along with the hash of every
+output file. Files outside of `data` (ie. GHTorrent) are too large to hash, and are identified by
+their size and modification time instead. A stage is marked as in progress in the manifest before
+it is run, so that the outputs of an interrupted stage are never mistaken for complete ones. When
+the manifest is first created, the stage outputs that already exist (ie. written by previous
+versions) are listed under `legacy_outputs`, and only these are ever assumed to be up to date
+without running their stage. Example manifest:
+
+{
+    "stages": {
+        "filter_forked_projects": {
+            "fingerprint": "3f2a...",
+            "outputs": { "data/projects_stage_1.parquet": "9bc0..." }
+        },
+        "get_workflow_runs": { "fingerprint": "77e1...", "in_progress": true, "outputs": {} },
+        ...
+    },
+    "files": {
+        "data/projects_stage_1.parquet": { "size": 1234, "mtime_ns": 1646580000000000000, "hash": "9bc0..." },
+        ...
+    },
+    "legacy_outputs": ["data/projects_stage_0.parquet", ...]
+}
+"""
+
+import ast
+import hashlib
+import json
+import os
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Set
+from config import DATA_FOLDER
+from data_io import read_dict_from_json_file, write_dict_to_json_file
+from metrics import measure_stage
+
+StageManifest = Dict[str, Dict[str, Any]]
+
+FILE_HASH_CHUNK_SIZE = 1 << 20
+
+PACKAGE_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+# Modules that only instrument stages (ie. measure them, or record / replay their API traffic),
+# and never affect their outputs, so editing them doesn't make any stage stale
+INSTRUMENTATION_MODULES = {'api_traffic', 'metrics'}
+
+
+class Stage:
+    """
+    A single stage of the experiment, which is run by calling `run` (with no arguments), reads the
+    files in `inputs`, and writes the files in `outputs`. The stage must be re-run whenever any of
+    the given `config` values (a dict mapping config variable name to value) or the source of any
+    module it depends on changes (see `find_stage_modules`). Modules that can't be found
+    automatically may also be given as `modules` (names of modules, eg. `'filter_projects'`). The
+    outputs of a `resumable` stage are never deleted before it is re-run, since it only adds whatever is missing
+    from them (eg. the workflow runs store, which takes days of API requests to fill).
+    """
+
+    def __init__(self, name: str, run: Callable[[], None], inputs: List[str], outputs: List[str],
+                 config: Optional[Dict[str, Any]] = None, modules: Optional[List[str]] = None,
+                 resumable: bool = False):
+        self.name = name
+        self.run = run
+        self.inputs = inputs
+        self.outputs = outputs
+        self.config = config if config is not None else {}
+        self.modules = modules if modules is not None else []
+        self.resumable = resumable
+
+
+def load_stage_manifest(manifest_path: str, stages: List[Stage]) -> StageManifest:
+    """
+    Load the manifest, or create (and immediately write) a new one if none exists yet, listing
+    the outputs of the given stages that already exist as legacy outputs.
+    """
+    if os.path.isfile(manifest_path):
+        manifest = read_dict_from_json_file(manifest_path)
+        manifest.setdefault('legacy_outputs', [])
+        return manifest
+
+    manifest = {
+        'stages': {},
+        'files': {},
+        'legacy_outputs': [
+            path for stage in stages for path in stage.outputs if os.path.isfile(path)
+        ]
+    }
+    write_dict_to_json_file(manifest, manifest_path)
+    return manifest
+
+
+def hash_file(path: str) -> str:
+    file_hash = hashlib.sha256()
+    with open(path, 'rb') as infile:
+        for chunk in iter(lambda: infile.read(FILE_HASH_CHUNK_SIZE), b''):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def fingerprint_file(path: str, manifest: StageManifest) -> str:
+    """
+    Return a str identifying the current contents of a file. Files in the data folder are hashed,
+    and the hash is cached in the manifest until the file's size or modification time changes.
+    Any other file is identified by its size and modification time alone.
+    """
+    stat = os.stat(path)
+    data_folder = os.path.abspath(DATA_FOLDER)
+    if os.path.commonpath([os.path.abspath(path), data_folder]) != data_folder:
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+    cached = manifest['files'].get(path)
+    if cached is None or cached['size'] != stat.st_size or cached['mtime_ns'] != stat.st_mtime_ns:
+        cached = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'hash': hash_file(path)}
+        manifest['files'][path] = cached
+    return cached['hash']
+
+
+def encode_package_module_path(module: str) -> str:
+    return os.path.join(PACKAGE_FOLDER, f"{module}.py")
+
+
+@lru_cache(maxsize=None)
+def find_imported_package_modules(module: str) -> List[str]:
+    """Return the names of the modules of this package that a given package module imports."""
+    with open(encode_package_module_path(module)) as infile:
+        tree = ast.parse(infile.read())
+
+    imported_modules = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            imported_modules.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module is not None and node.level == 0:
+            imported_modules.add(node.module)
+    return sorted(m for m in imported_modules if os.path.isfile(encode_package_module_path(m)))
+
+
+def find_stage_modules(stage: Stage) -> List[str]:
+    """
+    Return the names of every module of this package that a stage depends on, ie. the modules
+    defining the functions referenced by its `run` callable (and any extra `modules` given), along
+    with every package module they transitively import. Instrumentation modules (and whatever only
+    they import) are left out.
+    """
+    modules: Set[str] = set()
+    pending = list(stage.modules)
+    for name in stage.run.__code__.co_names:
+        module = getattr(stage.run.__globals__.get(name), '__module__', None)
+        if module is not None and os.path.isfile(encode_package_module_path(module)):
+            pending.append(module)
+
+    while len(pending) > 0:
+        module = pending.pop()
+        if module not in modules and module not in INSTRUMENTATION_MODULES:
+            modules.add(module)
+            pending.extend(find_imported_package_modules(module))
+    return sorted(modules)
+
+
+def fingerprint_stage(stage: Stage, manifest: StageManifest) -> str:
+    """Hash the inputs, config values, and module source code of a stage into a single str."""
+    fingerprint = {
+        'inputs': {path: fingerprint_file(path, manifest) for path in stage.inputs},
+        'config': {name: repr(val) for name, val in stage.config.items()},
+        'modules': {
+            module: hash_file(encode_package_module_path(module))
+            for module in find_stage_modules(stage)
+        }
+    }
+    return hashlib.sha256(json.dumps(fingerprint, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def order_stages(stages: List[Stage]) -> List[Stage]:
+    """
+    Order stages such that every stage comes after the stages producing its inputs (keeping the
+    given order otherwise). Inputs that are not the output of any stage must already exist.
+    """
+    producers = {}
+    for stage in stages:
+        for path in stage.outputs:
+            if path in producers:
+                raise ValueError(
+                    f"Stages {producers[path].name} and {stage.name} both write {path}")
+            producers[path] = stage
+
+    ordered_stages, visiting = [], set()
+
+    def visit(stage: Stage) -> None:
+        if stage in ordered_stages:
+            return
+        if stage in visiting:
+            raise ValueError(f"Stage {stage.name} depends on its own outputs")
+        visiting.add(stage)
+        for path in stage.inputs:
+            if path in producers:
+                visit(producers[path])
+        visiting.remove(stage)
+        ordered_stages.append(stage)
+
+    for stage in stages:
+        visit(stage)
+    return ordered_stages
+
+
+def is_stage_up_to_date(stage: Stage, fingerprint: str, manifest: StageManifest) -> bool:
+    """
+    Return `True` if a stage was last run with the given fingerprint, and all of its outputs still
+    exist, unmodified since that run.
+    """
+    record = manifest['stages'].get(stage.name)
+    if record is None or record.get('in_progress') or record['fingerprint'] != fingerprint:
+        return False
+    return all(
+        os.path.isfile(path) and fingerprint_file(path, manifest) == record['outputs'].get(path)
+        for path in stage.outputs
+    )
+
+
+def run_stages(stages: List[Stage], manifest_path: str) -> None:
+    """
+    Run every stale stage (in dependency order), recording the fingerprint and output hashes of
+    each stage in the manifest as soon as it completes. Before a stale stage is run, it is marked
+    as in progress, and its existing outputs are deleted (unless it is resumable, in which case it
+    picks up where its outputs left off). Stages that have never been recorded in the manifest, and
+    whose outputs are all legacy outputs (see `load_stage_manifest`), are assumed to be up to date,
+    and their outputs are recorded as-is (except resumable stages, which are cheap to resume).
+    """
+    ordered_stages = order_stages(stages)
+    manifest = load_stage_manifest(manifest_path, ordered_stages)
+    legacy_outputs = set(manifest['legacy_outputs'])
+
+    for stage in ordered_stages:
+        fingerprint = fingerprint_stage(stage, manifest)
+        if is_stage_up_to_date(stage, fingerprint, manifest):
+            print(f"[!] Stage {stage.name} is up to date, skipping...")
+            continue
+        elif not stage.resumable and stage.name not in manifest['stages'] and all(
+                path in legacy_outputs and os.path.isfile(path) for path in stage.outputs):
+            print(f"[!] Recording existing outputs of stage {stage.name}")
+        else:
+            print(f"[!] Stage {stage.name} is stale, {'resuming' if stage.resumable else 'running'}...")
+            manifest['stages'][stage.name] = {
+                'fingerprint': fingerprint, 'in_progress': True, 'outputs': {}
+            }
+            write_dict_to_json_file(manifest, manifest_path)
+            for path in stage.outputs:
+                if os.path.isfile(path) and not stage.resumable:
+                    os.remove(path)
+            with measure_stage(stage.name):
+                stage.run()
+            if not all(os.path.isfile(path) for path in stage.outputs):
+                print(f"ERROR: Stage {stage.name} did not write all of its outputs, aborting!")
+                exit()
+
+        manifest['stages'][stage.name] = {
+            'fingerprint': fingerprint,
+            'outputs': {path: fingerprint_file(path, manifest) for path in stage.outputs}
+        }
+        write_dict_to_json_file(manifest, manifest_path)
@@ -0,0 +1,204 @@
+"""
+A local stand-in for the GitHub and Coveralls APIs, serving the synthetic projects of a fixture
+(see `fixtures.py`). Point both `github_base_url` and `coveralls_base_url` at it to run the
+experiment offline. Only the endpoints used by the experiment are served:
+
+- `POST /graphql`: aliased `repository(owner, name)` queries for the default branch, workflow
+  filenames, or a workflow file (see `github_api_client.build_graphql_query_*`)
+- `GET /repos/{owner}/{repo}/actions/workflows/{filename}/runs`: paged workflow runs
+- `GET /github/{owner}/{repo}.json`: paged Coveralls builds (an HTML 404 page for unknown repos)
+
+Every response is delayed to mimic the latency of the real API (see `STUB_LATENCY_SECS`), scaled by
+a given factor. Rate limits are reported, but are so large that requests are never paced (see
+`base_api_client.RateLimitBudget`), so that only the experiment itself is measured. Usage:
+```
+python stub_server.py --port 8800 --seed 0 --latency-scale 1.0
+```
+"""
+
+import argparse
+import json
+import math
+import random
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+from fixtures import (
+    FIXTURE_WORKFLOW_TEXTS,
+    encode_fixture_date,
+    get_fixture_coveralls_builds,
+    get_fixture_repo,
+    get_fixture_workflow_runs
+)
+
+# Latency of each kind of request, as (fixed secs, secs per aliased GraphQL query)
+STUB_LATENCY_SECS = {
+    'graphql': (0.3, 0.002),
+    'workflow_runs': (0.15, 0),
+    'coveralls': (0.25, 0)
+}
+STUB_RATE_LIMIT = 1_000_000_000
+STUB_COVERALLS_BUILDS_PER_PAGE = 10
+
+GRAPHQL_ALIAS_QUERY_REGEX = re.compile(
+    r'(\w+): repository\(owner: "([^"]*)", name: "([^"]*)"\) \{\s*'
+    r'(?:(defaultBranchRef)|object\(expression: "HEAD:\.github/workflows(?:/([^"]*))?"\))'
+)
+WORKFLOW_RUNS_PATH_REGEX = re.compile(r"^/repos/[^/]+/([^/]+)/actions/workflows/([^/]+)/runs$")
+COVERALLS_PATH_REGEX = re.compile(r"^/github/[^/]+/([^/]+)\.json$")
+FIXTURE_REPO_NAME_REGEX = re.compile(r"^project(\d+)$")
+
+
+def decode_fixture_repo_id(name: str) -> Optional[int]:
+    """Decode the repo_id of a synthetic project from its name, or return `None` if invalid."""
+    match = FIXTURE_REPO_NAME_REGEX.match(name)
+    return int(match.group(1)) if match is not None else None
+
+
+def resolve_graphql_alias_query(seed: int, name: str, is_branch_query: bool,
+                                workflow_filename: Optional[str]) -> Tuple[Any, bool]:
+    """
+    Resolve a single aliased repository query. A tuple is returned, containing the result and
+    whether the repository was found.
+    """
+    repo_id = decode_fixture_repo_id(name)
+    repo = get_fixture_repo(seed, repo_id) if repo_id is not None else None
+    if repo is None:
+        return None, False
+
+    if is_branch_query:
+        branch = repo['default_branch']
+        return {'defaultBranchRef': {'name': branch} if branch is not None else None}, True
+    elif workflow_filename is None:
+        filenames = repo['workflow_filenames']
+        entries = [{'name': filename} for filename in filenames]
+        return {'object': {'entries': entries} if len(entries) > 0 else None}, True
+    elif workflow_filename in repo['workflow_filenames']:
+        return {'object': {'text': FIXTURE_WORKFLOW_TEXTS[workflow_filename]}}, True
+    return {'object': None}, True
+
+
+class StubApiRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    seed = 0
+    latency_scale = 1.0
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def delay(self, kind: str, num_queries: int = 0) -> None:
+        fixed_secs, secs_per_query = STUB_LATENCY_SECS[kind]
+        latency_secs = (fixed_secs + secs_per_query * num_queries) * random.uniform(0.8, 1.2)
+        time.sleep(latency_secs * self.latency_scale)
+
+    def send_body(self, status: int, body: bytes, content_type: str = 'application/json',
+                  headers: Optional[Dict[str, str]] = None) -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, val in (headers or {}).items():
+            self.send_header(key, val)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status: int, obj: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        self.send_body(status, json.dumps(obj).encode('utf-8'), headers=headers)
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if urlparse(self.path).path != '/graphql':
+            self.send_json(404, {'message': 'Not Found'})
+            return
+
+        query = json.loads(body)['query']
+        data, errors = {}, []
+        alias_queries = GRAPHQL_ALIAS_QUERY_REGEX.findall(query)
+        for alias, _, name, branch_query, workflow_filename in alias_queries:
+            # NOTE: Groups that did not participate in the match are empty strs
+            data[alias], found = resolve_graphql_alias_query(
+                self.seed, name, branch_query != '', workflow_filename or None)
+            if not found:
+                errors.append({
+                    'type': 'NOT_FOUND',
+                    'path': [alias],
+                    'message': f"Could not resolve to a Repository with the name '{name}'."
+                })
+
+        if 'rateLimit' in query:
+            data['rateLimit'] = {
+                'cost': max(1, math.ceil(len(alias_queries) / 100)),
+                'remaining': STUB_RATE_LIMIT,
+                'resetAt': encode_fixture_date(int(time.time()) + 3600)
+            }
+        self.delay('graphql', len(alias_queries))
+        self.send_json(200, {'data': data, 'errors': errors} if errors else {'data': data})
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        params = {key: vals[0] for key, vals in parse_qs(url.query).items()}
+        page = int(params.get('page', 1))
+
+        workflow_runs_match = WORKFLOW_RUNS_PATH_REGEX.match(url.path)
+        if workflow_runs_match is not None:
+            self.delay('workflow_runs')
+            repo_id = decode_fixture_repo_id(workflow_runs_match.group(1))
+            repo = get_fixture_repo(self.seed, repo_id) if repo_id is not None else None
+            headers = {
+                'X-RateLimit-Limit': str(STUB_RATE_LIMIT),
+                'X-RateLimit-Remaining': str(STUB_RATE_LIMIT),
+                'X-RateLimit-Reset': str(int(time.time()) + 3600)
+            }
+            if repo is None:
+                self.send_json(404, {'message': 'Not Found'}, headers)
+                return
+
+            runs = get_fixture_workflow_runs(self.seed, repo_id, workflow_runs_match.group(2))
+            if params.get('branch') != repo['default_branch']:
+                runs = []
+            per_page = int(params.get('per_page', 30))
+            self.send_json(200, {
+                'total_count': len(runs),
+                'workflow_runs': runs[(page - 1) * per_page:page * per_page]
+            }, headers)
+            return
+
+        coveralls_match = COVERALLS_PATH_REGEX.match(url.path)
+        if coveralls_match is not None:
+            self.delay('coveralls')
+            repo_id = decode_fixture_repo_id(coveralls_match.group(1))
+            builds = get_fixture_coveralls_builds(self.seed, repo_id) if repo_id is not None else []
+            if len(builds) == 0:
+                self.send_body(404, b'<html><body>Not Found</body></html>', 'text/html')
+                return
+
+            per_page = STUB_COVERALLS_BUILDS_PER_PAGE
+            self.send_json(200, {
+                'page': page,
+                'pages': math.ceil(len(builds) / per_page),
+                'total': len(builds),
+                'builds': builds[(page - 1) * per_page:page * per_page]
+            })
+            return
+
+        self.send_json(404, {'message': 'Not Found'})
+
+
+def serve_stub_api(port: int, seed: int = 0, latency_scale: float = 1.0) -> None:
+    """Serve the stub API for the fixture with the given seed on localhost, until interrupted."""
+    StubApiRequestHandler.seed = seed
+    StubApiRequestHandler.latency_scale = latency_scale
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubApiRequestHandler)
+    server.daemon_threads = True
+    print(f"Serving stub GitHub / Coveralls API on http://127.0.0.1:{port} (seed {seed})")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve a stub GitHub / Coveralls API')
+    parser.add_argument('--port', type=int, default=8800)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency-scale', type=float, default=1.0)
+    args = parser.parse_args()
+    serve_stub_api(args.port, args.seed, args.latency_scale)
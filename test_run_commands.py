@@ -1,4 +1,5 @@
 from run_commands import (
+    ALL_BUILD_REGEX,
     GRADLE_BUILD_REGEX,
     JAVAC_BUILD_REGEX,
     JS_BUILD_REGEX,
@@ -6,6 +7,9 @@ from run_commands import (
     MAVEN_BUILD_REGEX,
     PYTHON_BUILD_REGEX,
     RUBY_BUILD_REGEX,
+    match_any_build_cmd_regex,
+    match_any_cmd_regex,
+    match_build_tools,
     match_cmd_regex
 )
 
@@ -132,6 +136,26 @@ TESTS = {
     }
 }
 
+BUILD_TOOLS_BY_REGEX = {
+    JS_BUILD_REGEX: 'npm',
+    GRADLE_BUILD_REGEX: 'gradle',
+    MAVEN_BUILD_REGEX: 'maven',
+    MAKE_BUILD_REGEX: 'make',
+    JAVAC_BUILD_REGEX: 'javac',
+    RUBY_BUILD_REGEX: 'ruby',
+    PYTHON_BUILD_REGEX: 'python'
+}
+
+BUILD_TOOL_TESTS = {
+    'cmake .. && make && ctest': ['make'],
+    'pip install -r requirements.txt\npython setup.py test': ['python'],
+    'npm ci\nnpm run build': ['npm'],
+    './gradlew build\nmvn -B package': ['gradle', 'maven'],
+    'bundle exec rake\nnpm test': ['ruby', 'npm'],
+    'mkdir build; cd build; cmake ..; make; javac Main.java': ['make', 'javac'],
+    'echo "Nothing to build"': []
+}
+
 
 def run_tests():
     print('Running tests for run_commands...')
@@ -145,6 +169,19 @@ def run_tests():
                     print(f"Should be {validity}: {cmd}")
                     num_failed += 1
 
+                # The combined matcher must agree with testing each regex separately
+                if match_any_build_cmd_regex(cmd) != match_any_cmd_regex(ALL_BUILD_REGEX, cmd):
+                    print(f"Combined matcher disagrees with build regex: {cmd}")
+                    num_failed += 1
+                if should_be_match and BUILD_TOOLS_BY_REGEX[regexp] not in match_build_tools(cmd):
+                    print(f"Should be attributed to {BUILD_TOOLS_BY_REGEX[regexp]}: {cmd}")
+                    num_failed += 1
+
+    for cmd, build_tools in BUILD_TOOL_TESTS.items():
+        if match_build_tools(cmd) != build_tools:
+            print(f"Should be attributed to {build_tools}: {cmd}")
+            num_failed += 1
+
     if num_failed == 0:
         print('Test summary: All tests passed!')
     else:
@@ -0,0 +1,94 @@
+"""
+The GitHub and Coveralls APIs report times as ISO-8601 strs, usually in UTC (eg.
+`2021-03-06T12:00:00Z`), however commit timestamps sometimes carry a UTC offset instead (eg.
+`2021-03-06T07:00:00-05:00`). All timestamps are normalized to int64 epoch seconds (ie. seconds
+since 1970-01-01T00:00:00Z) as soon as they are retrieved, so that all downstream code can simply
+compare and subtract integers.
+"""
+
+import numpy as np
+from typing import Sequence
+
+SECS_PER_DAY = 86400
+
+# Length of the `YYYY-MM-DDTHH:MM:SS` prefix of every timestamp
+DATE_TIME_LEN = 19
+
+
+def parse_iso8601_timestamps(date_strs: Sequence[str]) -> np.ndarray:
+    """
+    Convert a sequence of ISO-8601 timestamp strs (each ending in either `Z` or a `±HH:MM`
+    offset, optionally preceded by fractional seconds) to an int64 array of epoch seconds.
+    Fractional seconds are truncated. All strs are parsed at once, using array arithmetic on their
+    characters, rather than one at a time. Raises `ValueError` if any str is malformed.
+    """
+    if len(date_strs) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    # View each str as a row of (zero-padded) unicode code points, as wide as the longest str
+    strs = np.asarray(date_strs, dtype=str)
+    width = max(strs.dtype.itemsize // 4, DATE_TIME_LEN + 1)
+    strs = strs.astype(f"U{width}")
+    chars = strs.view(np.uint32).reshape(len(strs), width)
+    rows, lengths = np.arange(len(strs)), np.char.str_len(strs)
+    is_digit = (chars >= ord('0')) & (chars <= ord('9'))
+
+    def chars_from_end(n: int) -> np.ndarray:
+        return chars[rows, np.maximum(lengths - n, 0)].astype(np.int64)
+
+    # Check that each str is `YYYY-MM-DDTHH:MM:SS`, then optional `.` and digits, then a suffix
+    positions = np.arange(width)
+    date_time_digits = [i for i in range(DATE_TIME_LEN) if i not in (4, 7, 10, 13, 16)]
+    is_valid = (chars[:, [4, 7, 10, 13, 16]] == [ord(c) for c in '--T::']).all(axis=1) & \
+        is_digit[:, date_time_digits].all(axis=1)
+
+    offset_signs = chars_from_end(6)
+    has_offset = ((offset_signs == ord('+')) | (offset_signs == ord('-'))) & \
+        (chars_from_end(3) == ord(':')) & \
+        is_digit[rows[:, None], np.maximum(lengths[:, None] - [5, 4, 2, 1], 0)].all(axis=1)
+    has_utc_suffix = chars_from_end(1) == ord('Z')
+    suffix_lengths = np.where(has_offset, 6, 1)
+    is_valid &= (has_offset | has_utc_suffix) & (lengths >= DATE_TIME_LEN + suffix_lengths)
+
+    fraction_lengths = lengths - suffix_lengths - DATE_TIME_LEN
+    in_fraction = (positions > DATE_TIME_LEN) & \
+        (positions < (lengths - suffix_lengths)[:, None])
+    is_valid &= ((fraction_lengths == 0) |
+                 ((fraction_lengths >= 2) & (chars[:, DATE_TIME_LEN] == ord('.')))) & \
+        (is_digit | ~in_fraction).all(axis=1)
+    if not is_valid.all():
+        raise ValueError(
+            "Timestamps must be of the form YYYY-MM-DDTHH:MM:SS[.fff](Z|±HH:MM): "
+            f"{strs[~is_valid][:5].tolist()}")
+
+    def number_at(start: int, num_digits: int) -> np.ndarray:
+        number = np.zeros(len(strs), dtype=np.int64)
+        for i in range(start, start + num_digits):
+            number = number * 10 + chars[:, i].astype(np.int64) - ord('0')
+        return number
+
+    # Convert the local date to days since epoch (see http://howardhinnant.github.io/date_algorithms.html)
+    year, month, day = number_at(0, 4), number_at(5, 2), number_at(8, 2)
+    year = year - (month <= 2)
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * ((month + 9) % 12) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    days = era * 146097 + day_of_era - 719468
+    local_secs = days * SECS_PER_DAY + \
+        number_at(11, 2) * 3600 + number_at(14, 2) * 60 + number_at(17, 2)
+
+    # Subtract any `±HH:MM` offset at the end of the str
+    if not has_offset.any():
+        return local_secs
+
+    offset_digits = [chars_from_end(n) - ord('0') for n in (5, 4, 2, 1)]
+    offset_secs = (offset_digits[0] * 10 + offset_digits[1]) * 3600 + \
+        (offset_digits[2] * 10 + offset_digits[3]) * 60
+    offset_secs = np.where(has_offset, offset_secs, 0)
+    return local_secs - np.where(offset_signs == ord('-'), -offset_secs, offset_secs)
+
+
+def parse_iso8601_timestamp(date_str: str) -> int:
+    """Convert a single ISO-8601 timestamp str to epoch seconds (see `parse_iso8601_timestamps`)."""
+    return int(parse_iso8601_timestamps([date_str])[0])
@@ -25,18 +25,64 @@ After stage 4 filter (checking for actual CI usage, retrieving workflow YAML con
 }
 """
 
-from typing import Any, Dict, List, Union
-from run_commands import match_any_build_cmd_regex
+import os
+import sqlite3
+import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+from ci_check_cache import (
+    CICheckCache,
+    append_to_ci_check_cache,
+    encode_ci_check_cache_key,
+    load_ci_check_cache
+)
+from config import CI_CHECK_SHARD_SIZE, NUM_CI_CHECK_WORKERS
+from run_commands import match_build_tools
+from timestamps import parse_iso8601_timestamps
 from data_io import (
+    iter_items_from_json_file,
     read_dict_from_json_file,
     read_dict_from_yaml_str,
-    write_dict_to_json_file
+    write_dict_to_json_file,
+    write_items_to_json_file
 )
 
 WorkflowFilenameDict = Dict[str, List[Dict[str, str]]]
 WorkflowInfoDict = Dict[str, Dict[str, Dict[str, str]]]
 AnyWorkflowDict = Union[WorkflowFilenameDict, WorkflowInfoDict]
 WorkflowRuns = List[Dict[str, Any]]
+WorkflowRunArrays = Dict[str, np.ndarray]
+WorkflowRunCounts = Dict[Tuple[str, str], int]
+WorkflowFetchParams = Dict[str, Any]
+StoredWorkflowFetchParams = Dict[Tuple[str, str], WorkflowFetchParams]
+
+# Only these fields of each workflow run are used by the analyses, so only these are stored
+WORKFLOW_RUN_COLS = ['id', 'status', 'conclusion', 'created_at', 'updated_at', 'head_sha',
+                     'head_commit_id', 'head_commit_timestamp']
+
+# These fields are stored as int epoch seconds (see `timestamps.py`) rather than ISO-8601 strs
+WORKFLOW_RUN_TIMESTAMP_COLS = ['created_at', 'updated_at', 'head_commit_timestamp']
+
+# Workflow run conclusions are encoded as small ints for array computations (None is -1)
+WORKFLOW_RUN_CONCLUSION_CODES = {
+    'success': 0,
+    'failure': 1,
+    'cancelled': 2,
+    'skipped': 3,
+    'timed_out': 4,
+    'action_required': 5,
+    'neutral': 6,
+    'stale': 7
+}
+
+# The parameters each workflow's runs were retrieved with, as recorded in the `workflows` table
+WORKFLOW_FETCH_PARAM_COLS = ['workflow_name', 'branch', 'num_pages', 'per_page']
+
+# Stores written before timestamps were normalized to epoch seconds have version 0, those
+# written before workflow filenames were recorded have version 1, and those written before the
+# other fetch parameters were recorded have version 2
+WORKFLOW_RUNS_STORE_VERSION = 3
 
 
 def encode_workflow_runs_path(workflow_runs_prefix: str, repo_id: str,
@@ -44,7 +90,8 @@ def encode_workflow_runs_path(workflow_runs_prefix: str, repo_id: str,
     """
     Encode a filename for a JSON file containing all workflow runs for a given project / workflow.
     Produces a filename of the form `workflow_runs_repo123workflow456.json`, which indicates that
-    the file contains workflow runs for workflow 456 in repo 123.
+    the file contains workflow runs for workflow 456 in repo 123. These files are no longer
+    written (see `open_workflow_runs_store`), but are imported if found.
     """
     return f"{workflow_runs_prefix}_repo{repo_id}workflow{workflow_idx_str}.json"
 
@@ -70,126 +117,440 @@ def save_workflows(project_workflows_dict: Dict, output_workflows_path: str) ->
         f"Wrote workflows for {len(project_workflows_dict.keys())} projects to {output_workflows_path}")
 
 
-def load_workflow_runs(workflow_runs_path: str) -> WorkflowRuns:
+def encode_workflow_runs_store_path(workflow_runs_prefix: str) -> str:
     """
-    Read workflow runs for a given project / workflow from a JSON file, and write the data into
-    a list of dictionaries.
+    Encode the path of the SQLite database storing all workflow runs, of the form
+    `workflow_runs.db`.
     """
-    workflow_runs = read_dict_from_json_file(workflow_runs_path)
-    return workflow_runs
+    return f"{workflow_runs_prefix}.db"
 
 
-def check_workflow_jobs_for_cmd(workflow: Union[Dict[str, Any], List[Any]]) -> bool:
+def open_workflow_runs_store(workflow_runs_prefix: str) -> sqlite3.Connection:
     """
-    Traverse the provided portion of a workflow file (ie. DFS), testing all 'run' commands
-    for CI usage. Returns `True` if at least one run command matches a CI command regex, and
-    `False` otherwise. This function is called recursively, such that any match will bubble-up
-    and return `True`.
+    Open (creating if necessary) the SQLite database storing workflow runs for all projects /
+    workflows. The `runs` table holds a row for each run, containing only `WORKFLOW_RUN_COLS`,
+    keyed by repo_id, workflow index, and the run's position in the API results. The
+    `workflows` table records every workflow whose runs have been retrieved (even if it has no
+    runs), along with its number of runs and the parameters they were retrieved with (see
+    `WORKFLOW_FETCH_PARAM_COLS`, unknown for workflows stored by previous versions). Timestamps in stores written by previous versions are converted to epoch seconds
+    when first opened.
     """
-    if type(workflow) is dict:
-        for key, val in workflow.items():
-            # If this is a run cmd, and it matches the regex, return True
-            if key == 'run' and type(val) is str:
-                if match_any_build_cmd_regex(val):
-                    return True
-            else:
-                if check_workflow_jobs_for_cmd(val):
-                    return True
-    if type(workflow) is list:
-        for item in workflow:
-            if check_workflow_jobs_for_cmd(item):
-                return True
+    store = sqlite3.connect(encode_workflow_runs_store_path(workflow_runs_prefix))
+    store.executescript(f"""
+        CREATE TABLE IF NOT EXISTS workflows (
+            repo_id TEXT NOT NULL,
+            workflow_idx TEXT NOT NULL,
+            num_runs INTEGER NOT NULL,
+            workflow_name TEXT,
+            branch TEXT,
+            num_pages REAL,
+            per_page INTEGER,
+            PRIMARY KEY (repo_id, workflow_idx)
+        );
+        CREATE TABLE IF NOT EXISTS runs (
+            repo_id TEXT NOT NULL,
+            workflow_idx TEXT NOT NULL,
+            run_idx INTEGER NOT NULL,
+            {', '.join(WORKFLOW_RUN_COLS)},
+            PRIMARY KEY (repo_id, workflow_idx, run_idx)
+        ) WITHOUT ROWID;
+    """)
+
+    store_version = store.execute('PRAGMA user_version').fetchone()[0]
+    if store_version < 1:
+        migrate_workflow_run_timestamps(store)
+    if store_version < WORKFLOW_RUNS_STORE_VERSION:
+        migrate_workflow_fetch_params(store)
+    return store
+
+
+def migrate_workflow_run_timestamps(store: sqlite3.Connection) -> None:
+    """
+    Convert any timestamps stored as ISO-8601 strs to epoch seconds, in a single transaction.
+    """
+    with store:
+        for col in WORKFLOW_RUN_TIMESTAMP_COLS:
+            rows = store.execute(
+                f"SELECT repo_id, workflow_idx, run_idx, {col} FROM runs WHERE typeof({col}) = 'text'"
+            ).fetchall()
+            if len(rows) > 0:
+                print(f"Converting {len(rows)} stored workflow run {col} values to epoch seconds...")
+                epoch_secs = parse_iso8601_timestamps([row[3] for row in rows]).tolist()
+                store.executemany(
+                    f"UPDATE runs SET {col} = ? WHERE repo_id = ? AND workflow_idx = ? AND run_idx = ?",
+                    [(secs,) + row[:3] for secs, row in zip(epoch_secs, rows)]
+                )
+        store.execute('PRAGMA user_version = 1')
+
+
+def migrate_workflow_fetch_params(store: sqlite3.Connection) -> None:
+    """
+    Add the (initially unknown) fetch parameter columns (see `WORKFLOW_FETCH_PARAM_COLS`) to the
+    `workflows` table, if missing.
+    """
+    col_types = {
+        'workflow_name': 'TEXT', 'branch': 'TEXT', 'num_pages': 'REAL', 'per_page': 'INTEGER'}
+    with store:
+        cols = [row[1] for row in store.execute('PRAGMA table_info(workflows)')]
+        for col in WORKFLOW_FETCH_PARAM_COLS:
+            if col not in cols:
+                store.execute(f"ALTER TABLE workflows ADD COLUMN {col} {col_types[col]}")
+        store.execute(f"PRAGMA user_version = {WORKFLOW_RUNS_STORE_VERSION}")
+
 
-    return False
+def encode_workflow_run_row(run: Any) -> Tuple[Any, ...]:
+    """
+    Extract the stored fields (see `WORKFLOW_RUN_COLS`) from a workflow run returned by the
+    GitHub API. Empty runs are stored as a row of nulls. Timestamps are left as returned by the
+    API (see `encode_workflow_run_rows`).
+    """
+    if not run or not isinstance(run, dict):
+        return (None,) * len(WORKFLOW_RUN_COLS)
+    head_commit = run.get('head_commit')
+    if not isinstance(head_commit, dict):
+        head_commit = {}
+    return (
+        run.get('id'),
+        run.get('status'),
+        run.get('conclusion'),
+        run.get('created_at'),
+        run.get('updated_at'),
+        run.get('head_sha'),
+        head_commit.get('id'),
+        head_commit.get('timestamp')
+    )
+
+
+def encode_workflow_run_rows(workflow_runs: WorkflowRuns) -> List[List[Any]]:
+    """
+    Extract the stored fields from each of the given workflow runs (see `encode_workflow_run_row`),
+    converting all timestamps to epoch seconds at once.
+    """
+    rows = [list(encode_workflow_run_row(run)) for run in workflow_runs]
+    for col in WORKFLOW_RUN_TIMESTAMP_COLS:
+        col_idx = WORKFLOW_RUN_COLS.index(col)
+        str_rows = [row for row in rows if isinstance(row[col_idx], str)]
+        epoch_secs = parse_iso8601_timestamps([row[col_idx] for row in str_rows]).tolist()
+        for row, secs in zip(str_rows, epoch_secs):
+            row[col_idx] = secs
+    return rows
 
 
-def check_workflow_for_cmd(workflow: Dict[str, Any]) -> bool:
+def decode_workflow_run_row(row: Tuple[Any, ...]) -> Dict[str, Any]:
     """
-    Traverse the 'jobs' in a workflow file, testing all 'run' commands for CI usage. Returns
-    `True` if at least one run command matches a CI command regex, and `False` otherwise.
+    Rebuild a workflow run dict from its stored fields, in the same shape as the GitHub API
+    (including the nested `head_commit`), except that timestamps are int epoch seconds. A row
+    of nulls is decoded as an empty run.
     """
-    if 'jobs' in workflow and workflow['jobs'] is not None:
-        return check_workflow_jobs_for_cmd(workflow['jobs'])
+    if all(val is None for val in row):
+        return {}
+    id, status, conclusion, created_at, updated_at, head_sha, commit_id, commit_timestamp = row
+    head_commit = None
+    if commit_id is not None or commit_timestamp is not None:
+        head_commit = {'id': commit_id, 'timestamp': commit_timestamp}
+    return {
+        'id': id,
+        'status': status,
+        'conclusion': conclusion,
+        'created_at': created_at,
+        'updated_at': updated_at,
+        'head_sha': head_sha,
+        'head_commit': head_commit
+    }
 
-    return False
 
+def save_workflow_runs(store: sqlite3.Connection, repo_id: str, workflow_idx_str: str,
+                       workflow_runs: WorkflowRuns,
+                       fetch_params: Optional[WorkflowFetchParams] = None) -> None:
+    """
+    Write all workflow runs for a given project / workflow (and the parameters they were
+    retrieved with, ie. any of `WORKFLOW_FETCH_PARAM_COLS` that are known) to the store, replacing
+    any previously stored runs for it. The write is a single transaction, so a workflow is never
+    left partially stored. Raises `ValueError` (without writing anything) if any run has a
+    malformed timestamp.
+    """
+    fetch_params = fetch_params or {}
+    rows = encode_workflow_run_rows(workflow_runs)
+    with store:
+        store.execute(
+            'DELETE FROM runs WHERE repo_id = ? AND workflow_idx = ?', (repo_id, workflow_idx_str))
+        store.executemany(
+            f"INSERT INTO runs VALUES ({', '.join(['?'] * (3 + len(WORKFLOW_RUN_COLS)))})",
+            [
+                [repo_id, workflow_idx_str, run_idx] + row
+                for run_idx, row in enumerate(rows)
+            ]
+        )
+        workflow_cols = ['repo_id', 'workflow_idx', 'num_runs'] + WORKFLOW_FETCH_PARAM_COLS
+        store.execute(
+            f"INSERT OR REPLACE INTO workflows ({', '.join(workflow_cols)}) "
+            f"VALUES ({', '.join(['?'] * len(workflow_cols))})",
+            [repo_id, workflow_idx_str, len(workflow_runs)] +
+            [fetch_params.get(col) for col in WORKFLOW_FETCH_PARAM_COLS]
+        )
+
+
+def load_workflow_runs(store: sqlite3.Connection, repo_id: str,
+                       workflow_idx_str: str) -> WorkflowRuns:
+    """
+    Read workflow runs for a given project / workflow from the store, into a list of
+    dictionaries (in the order they were returned by the GitHub API). Timestamps are int epoch
+    seconds (see `decode_workflow_run_row`).
+    """
+    rows = store.execute(
+        f"SELECT {', '.join(WORKFLOW_RUN_COLS)} FROM runs "
+        'WHERE repo_id = ? AND workflow_idx = ? ORDER BY run_idx',
+        (repo_id, workflow_idx_str)
+    )
+    return [decode_workflow_run_row(row) for row in rows]
+
+
+def load_workflow_run_arrays(store: sqlite3.Connection, repo_id: str,
+                             workflow_idx_str: str) -> WorkflowRunArrays:
+    """
+    Read workflow runs for a given project / workflow from the store, into a dict of arrays with
+    one element per run (in the order they were returned by the GitHub API), without building a
+    dict for each run. Conclusions are encoded in SQL (see `WORKFLOW_RUN_CONCLUSION_CODES`), and
+    missing timestamps are stored as 0, alongside a mask of the runs that have them. Example
+    return value:
+    ```
+    {
+        'is_empty': array([False, ...]),
+        'is_completed': array([True, ...]),
+        'conclusion_code': array([0, ...], dtype=int8),
+        'has_run_timestamps': array([True, ...]),
+        'created_at': array([1614988800, ...]),
+        'updated_at': array([1614989100, ...]),
+        'has_commit_timestamp': array([True, ...]),
+        'commit_timestamp': array([1614988740, ...])
+    }
+    ```
+    """
+    conclusion_code_sql = 'CASE conclusion ' + ' '.join(
+        f"WHEN '{conclusion}' THEN {code}"
+        for conclusion, code in WORKFLOW_RUN_CONCLUSION_CODES.items()) + ' ELSE -1 END'
+    rows = store.execute(
+        f"""
+        SELECT
+            {' AND '.join(f"{col} IS NULL" for col in WORKFLOW_RUN_COLS)},
+            COALESCE(status = 'completed', 0),
+            {conclusion_code_sql},
+            created_at IS NOT NULL AND updated_at IS NOT NULL,
+            COALESCE(created_at, 0),
+            COALESCE(updated_at, 0),
+            head_commit_timestamp IS NOT NULL,
+            COALESCE(head_commit_timestamp, 0)
+        FROM runs WHERE repo_id = ? AND workflow_idx = ? ORDER BY run_idx
+        """,
+        (repo_id, workflow_idx_str)
+    ).fetchall()
+    cols = np.array(rows, dtype=np.int64).reshape(len(rows), 8).T
+    return {
+        'is_empty': cols[0].astype(bool),
+        'is_completed': cols[1].astype(bool),
+        'conclusion_code': cols[2].astype(np.int8),
+        'has_run_timestamps': cols[3].astype(bool),
+        'created_at': cols[4],
+        'updated_at': cols[5],
+        'has_commit_timestamp': cols[6].astype(bool),
+        'commit_timestamp': cols[7]
+    }
 
-def get_workflows_using_ci(workflows_filename: str) -> WorkflowInfoDict:
+
+def count_workflow_runs(store: sqlite3.Connection) -> WorkflowRunCounts:
+    """
+    Get the number of stored runs for every workflow whose runs have been retrieved, as a dict
+    mapping (repo_id, workflow index) to number of runs.
     """
-    Given the filename of a JSON file containing project YAML workflows, return the subset of
-    workflows that actually use CI. This definition of 'CI' is somewhat arbitrary, and is specific
-    to this study. We aim to avoid false positives (ie. returning `True` for a non-CI workflow),
-    and would prefer false negatives (ie. returning `False` for a CI workflow).
+    rows = store.execute('SELECT repo_id, workflow_idx, num_runs FROM workflows')
+    return {(repo_id, workflow_idx_str): num_runs for repo_id, workflow_idx_str, num_runs in rows}
 
-    Example input workflows file (returned dict will look the same):
+
+def get_stored_workflow_fetch_params(store: sqlite3.Connection) -> StoredWorkflowFetchParams:
+    """
+    Get the parameters (see `WORKFLOW_FETCH_PARAM_COLS`) that the runs of every stored workflow
+    were retrieved with, as a dict mapping (repo_id, workflow index) to a dict of parameters. A
+    parameter is `None` if the workflow was stored by a previous version (which did not record it). Example return value:
     ```
     {
-        '123': {
-            '0': { "name": "build.yml", "text": "These are my YAML contents" },
-            ...
-        },
+        ('123', '0'): {'workflow_name': 'build.yml', 'branch': 'main', 'num_pages': 5.0, 'per_page': 100},
         ...
     }
     ```
     """
+    rows = store.execute(
+        f"SELECT repo_id, workflow_idx, {', '.join(WORKFLOW_FETCH_PARAM_COLS)} FROM workflows")
+    return {
+        (row[0], row[1]): dict(zip(WORKFLOW_FETCH_PARAM_COLS, row[2:]))
+        for row in rows
+    }
 
-    # Read JSON containing all workflows for all projects
-    workflows_dict = read_dict_from_json_file(workflows_filename)
-    ci_workflows_dict = {}
 
-    # Iterate through each repo, and each workflow for each repo
-    for i, (repo_id, workflows) in enumerate(workflows_dict.items()):
-        if i % 100 == 0:
-            print(
-                f"Checking repo workflows for CI usage ({i}/{len(workflows_dict.keys())})...")
-        for workflow_id, workflow_obj in workflows.items():
-            # If workflow actually uses CI, populate the running dict
-            if does_workflow_use_ci(workflow_obj):
-                if repo_id not in ci_workflows_dict:
-                    ci_workflows_dict[repo_id] = {}
-                ci_workflows_dict[repo_id][workflow_id] = workflow_obj
+def are_workflow_fetch_params_current(stored_params: WorkflowFetchParams,
+                                      current_params: WorkflowFetchParams) -> bool:
+    """
+    Return `True` if a workflow's stored runs were retrieved with the current parameters. Runs
+    whose parameters are unknown (ie. stored by a previous version) are never current.
+    """
+    return all(
+        stored_params.get(col) == current_params[col] for col in WORKFLOW_FETCH_PARAM_COLS)
 
-    print(
-        f"Only {len(ci_workflows_dict.keys())}/{len(workflows_dict.keys())} projects actually use CI")
-    return ci_workflows_dict
 
+def import_legacy_workflow_runs(store: sqlite3.Connection, workflow_runs_prefix: str,
+                                repo_id: str, workflow_idx_str: str,
+                                fetch_params: Optional[WorkflowFetchParams] = None) -> Optional[int]:
+    """
+    Import the workflow runs for a given project / workflow from a JSON file written by previous
+    versions (see `encode_workflow_runs_path`), if one exists. These runs are assumed to have been
+    retrieved with the given (ie. current) parameters, which are not recorded in the file. Returns
+    the number of imported runs, or `None` if there was no file to import.
+    """
+    workflow_runs_path = encode_workflow_runs_path(
+        workflow_runs_prefix, repo_id, workflow_idx_str)
+    if not os.path.isfile(workflow_runs_path):
+        return None
+    workflow_runs = read_dict_from_json_file(workflow_runs_path)
+    save_workflow_runs(store, repo_id, workflow_idx_str, workflow_runs, fetch_params)
+    return len(workflow_runs)
 
-def does_workflow_use_ci(workflow_obj: Dict[str, str]) -> bool:
+
+def find_build_tools_in_workflow_jobs(workflow: Union[Dict[str, Any], List[Any]]) -> List[str]:
+    """
+    Traverse the provided portion of a workflow file (ie. DFS), testing every 'run' command for
+    CI usage. Returns the build tools used by all run commands (in order of first appearance), so
+    the workflow uses CI if any are found (see `run_commands.match_build_tools`).
     """
-    Return `True` if a GitHub Actions workflow YAML defines at least one CI action, or `False`
-    otherwise. This definition of 'CI' is somewhat arbitrary, and is specific to this study. We
-    aim to avoid false positives (ie. returning `True` for a non-CI workflow), and would prefer
-    false negatives (ie. returning `False` for a CI workflow). The workflow YAML parameter is a
-    dict representation of the YAML file.
-    https://docs.github.com/en/actions/using-workflows/workflow-syntax-for-github-actions.
+    build_tools = []
+    if type(workflow) is dict:
+        for key, val in workflow.items():
+            if key == 'run' and type(val) is str:
+                build_tools.extend(match_build_tools(val))
+            else:
+                build_tools.extend(find_build_tools_in_workflow_jobs(val))
+    if type(workflow) is list:
+        for item in workflow:
+            build_tools.extend(find_build_tools_in_workflow_jobs(item))
+
+    return list(dict.fromkeys(build_tools))
+
+
+def normalize_workflow_text(workflow_text: str) -> str:
+    """Normalize workflow YAML text before it is parsed (tabs are not valid YAML indentation)."""
+    return workflow_text.replace('\t', ' ')
+
 
-    Example workflow_obj:
+def uses_valid_yaml_filename(workflow_obj: Dict[str, str]) -> bool:
+    return workflow_obj['name'].endswith('.yml') or workflow_obj['name'].endswith('.yaml')
+
+
+def check_workflow_text_for_ci(workflow_text: str) -> Dict[str, Any]:
+    """
+    Check (normalized) workflow YAML text for CI usage. Returns a dict stating whether any run
+    command in its 'jobs' matches a CI command regex (see `find_build_tools_in_workflow_jobs`),
+    and which build tools these commands use. Example return value:
     ```
-    { "name": "build.yml", "text": "These are my YAML contents" }
+    { "uses_ci": true, "build_tools": ["gradle", "make"] }
     ```
     """
+    build_tools = []
+    workflow_yaml = read_dict_from_yaml_str(workflow_text)
+    if workflow_yaml is not None and 'jobs' in workflow_yaml and workflow_yaml['jobs'] is not None:
+        build_tools = find_build_tools_in_workflow_jobs(workflow_yaml['jobs'])
+
+    return {'uses_ci': len(build_tools) > 0, 'build_tools': build_tools}
+
 
-    def uses_valid_yaml_filename():
-        return workflow_obj['name'].endswith('.yml') or workflow_obj['name'].endswith('.yaml')
+def check_workflow_texts_for_ci(workflow_texts: Dict[str, str]) -> CICheckCache:
+    """
+    Check each of the given workflow texts (a dict mapping cache key to normalized text) for CI
+    usage, returning a dict mapping cache key to result. Runs in a worker process.
+    """
+    return {key: check_workflow_text_for_ci(text) for key, text in workflow_texts.items()}
 
-    def uses_on_push(workflow_yaml):
-        # NOTE: Will not use, since this filter will be applied when fetching build data
-        # Require that workflow runs 'on push'
-        if 'on' in workflow_yaml and workflow_yaml['on'] is not None:
-            on_dict_has_push = type(
-                workflow_yaml['on']) is dict and 'push' in workflow_yaml['on']
-            on_list_has_push = type(
-                workflow_yaml['on']) is list and 'push' in workflow_yaml['on']
-            if on_dict_has_push or on_list_has_push:
-                return True
 
-    if uses_valid_yaml_filename():
-        workflow_text = workflow_obj['text']
-        workflow_text = workflow_text.replace('\t', ' ')
-        workflow_yaml = read_dict_from_yaml_str(workflow_text)
+def encode_key_for_yaml_workflow(workflow_obj: Dict[str, str]) -> Optional[str]:
+    """
+    Return the CI check cache key of a workflow's normalized text, or `None` if the workflow is
+    not a YAML file (and so is never checked for CI usage).
+    """
+    if not uses_valid_yaml_filename(workflow_obj):
+        return None
+    return encode_ci_check_cache_key(normalize_workflow_text(workflow_obj['text']))
 
-        # If workflow actually uses CI, populate the running dict
-        if workflow_yaml is not None:
-            return check_workflow_for_cmd(workflow_yaml)
 
-    return False
+def get_workflows_using_ci(workflows_filename: str, output_workflows_path: str) -> List[str]:
+    """
+    Given the filename of a JSON file containing project YAML workflows, write the subset of
+    workflows that actually use CI to another JSON file, and return the repo IDs of the projects
+    having at least one such workflow. This definition of 'CI' is somewhat arbitrary, and is
+    specific to this study. We aim to avoid false positives (ie. returning `True` for a non-CI
+    workflow), and would prefer false negatives (ie. returning `False` for a CI workflow). Both
+    files are read / written one project at a time, so that memory usage does not grow with the
+    number of projects.
+
+    Example input workflows file (output file will look the same):
+    ```
+    {
+        '123': {
+            '0': { "name": "build.yml", "text": "These are my YAML contents" },
+            ...
+        },
+        ...
+    }
+    ```
+    """
+    ci_check_cache = load_ci_check_cache()
+    pending_keys = set()
+    num_projects, num_checked = 0, 0
+
+    def cache_results(results: CICheckCache) -> None:
+        nonlocal num_checked
+        append_to_ci_check_cache(results)
+        ci_check_cache.update(results)
+        pending_keys.difference_update(results.keys())
+        num_checked += len(results)
+        print(f"Checked {num_checked} new distinct workflows for CI usage ({num_projects} projects read)...")
+
+    # Find the YAML workflow texts which have never been checked before, and check them in shards
+    # in separate processes (limiting the number of shards waiting to be checked)
+    with ProcessPoolExecutor(max_workers=NUM_CI_CHECK_WORKERS) as executor:
+        futures = deque()
+        unchecked_workflow_texts = {}
+        for repo_id, workflows in iter_items_from_json_file(workflows_filename):
+            num_projects += 1
+            for workflow_obj in workflows.values():
+                key = encode_key_for_yaml_workflow(workflow_obj)
+                if key is not None and key not in ci_check_cache and key not in pending_keys:
+                    unchecked_workflow_texts[key] = normalize_workflow_text(workflow_obj['text'])
+                    pending_keys.add(key)
+
+            if len(unchecked_workflow_texts) >= CI_CHECK_SHARD_SIZE:
+                futures.append(executor.submit(
+                    check_workflow_texts_for_ci, unchecked_workflow_texts))
+                unchecked_workflow_texts = {}
+            while len(futures) > 2 * NUM_CI_CHECK_WORKERS:
+                cache_results(futures.popleft().result())
+
+        if len(unchecked_workflow_texts) > 0:
+            futures.append(executor.submit(check_workflow_texts_for_ci, unchecked_workflow_texts))
+        while len(futures) > 0:
+            cache_results(futures.popleft().result())
+
+    # Read the workflows again, writing those that actually use CI (in their original order)
+    ci_repo_ids = []
+
+    def iter_workflows_using_ci() -> Iterator[Tuple[str, Dict[str, Dict[str, str]]]]:
+        for repo_id, workflows in iter_items_from_json_file(workflows_filename):
+            ci_workflows = {}
+            for workflow_id, workflow_obj in workflows.items():
+                key = encode_key_for_yaml_workflow(workflow_obj)
+                if key is not None and ci_check_cache[key]['uses_ci']:
+                    ci_workflows[workflow_id] = workflow_obj
+            if len(ci_workflows) > 0:
+                ci_repo_ids.append(repo_id)
+                yield repo_id, ci_workflows
+
+    write_items_to_json_file(iter_workflows_using_ci(), output_workflows_path)
+    print(f"Wrote workflows for {len(ci_repo_ids)} projects to {output_workflows_path}")
+    print(f"Only {len(ci_repo_ids)}/{num_projects} projects actually use CI")
+    return ci_repo_ids